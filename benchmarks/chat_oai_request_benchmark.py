@@ -0,0 +1,107 @@
+"""
+Time to build the request of `ByzerLLM.chat_oai` (everything before the model is called)
+for long conversations with base64 images in the history. The "previous" pipeline deep
+copies the conversation, runs the Image and Audio tag extractors on every instruction and
+encodes with json; the current one copies only the changed message, skips the extractors
+for plain text and encodes with orjson when it is installed.
+
+    python benchmarks/chat_oai_request_benchmark.py --turns 100 --image-kb 256 --calls 20
+"""
+import argparse
+import base64
+import copy
+import json
+import os
+import time
+
+import byzerllm
+from byzerllm.utils.client import json_codec
+from byzerllm.utils.nontext import Audio, Image
+
+
+def make_conversation(turns: int, image_kb: int, image_every: int):
+    image = base64.b64encode(os.urandom(image_kb * 1024 * 3 // 4)).decode("ascii")
+    conversations = []
+    for i in range(turns):
+        content = f"turn {i}: " + "please look at the chart and explain the trend. " * 8
+        if image_kb and i % image_every == 0:
+            content += f"<_image_>data:image/png;base64,{image}</_image_>"
+        conversations.append(
+            {"role": "user" if i % 2 == 0 else "assistant", "content": content, "metadata": {"turn": i}}
+        )
+    conversations.append({"role": "user", "content": "summarize our conversation"})
+    return conversations
+
+
+def previous_request(conversations):
+    temp_conversations = copy.deepcopy(conversations)
+    history = []
+    for item in temp_conversations[:-1]:
+        if "metadata" in item:
+            del item["metadata"]
+        history.append(item)
+    v = [{"instruction": temp_conversations[-1]["content"], "history": history}]
+    for item in v:
+        s = item["instruction"]
+        image = Image(s)
+        if image.has_image():
+            item["instruction"] = json.dumps(image.to_content(), ensure_ascii=False)
+        audio = Audio(s)
+        if audio.has_audio():
+            item["instruction"] = json.dumps(audio.to_content(), ensure_ascii=False)
+    return [json.dumps(x, ensure_ascii=False) for x in v]
+
+
+def make_llm():
+    llm = byzerllm.ByzerLLM()
+    llm.setup_default_model_name("m")
+    llm.meta_cache["m"] = {"model_deploy_type": "saas", "message_format": True}
+    llm.skip_nontext_check = False
+    sent = []
+
+    def _query(model, v):
+        _, new_input_value, _ = llm._encode_query(model, v)
+        sent.append(new_input_value)
+        return [{"predict": "", "input": "", "metadata": {}}]
+
+    llm._query = _query
+    return llm, sent
+
+
+def bench(func, calls: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--image-kb", type=int, default=256)
+    parser.add_argument("--image-every", type=int, default=10)
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+
+    conversations = make_conversation(args.turns, args.image_kb, args.image_every)
+    size = len(json.dumps(conversations))
+    llm, sent = make_llm()
+
+    previous = bench(lambda: previous_request(conversations), args.calls)
+    current = bench(lambda: llm.chat_oai(conversations=conversations), args.calls)
+    # chat_oai also sends the generation params (max_length)
+    request = json.loads(sent[-1][0])
+    expected = json.loads(previous_request(conversations)[0])
+    assert {k: request[k] for k in expected} == expected
+
+    print(
+        f"turns={args.turns} conversation={size / 1024 / 1024:.1f}MB "
+        f"orjson={'yes' if json_codec.orjson is not None else 'no'}"
+    )
+    print(f"previous  {previous * 1000:8.2f} ms/call")
+    print(f"current   {current * 1000:8.2f} ms/call  ({previous / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Repair time of malformed LLM style JSON (unquoted keys, missing closing brackets)
+for growing payload sizes. The time per KB stays flat when the repair is linear.
+
+    python benchmarks/json_repair_benchmark.py --sizes 10,100,1000
+"""
+import argparse
+import time
+
+from byzerllm.utils.json_repaire import StreamingJSONParser, repair_json_str
+
+
+def payload(kb: int) -> str:
+    member = 'name{i}: "value {i} with a \\q bad escape", ok{i}: true'
+    members = []
+    size = 0
+    i = 0
+    while size < kb * 1024:
+        members.append(member.format(i=i))
+        size += len(members[-1]) + 2
+        i += 1
+    return '{"items": [{' + ", ".join(members)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,100,1000", help="payload sizes in KB")
+    parser.add_argument("--chunk", type=int, default=8, help="chars per streamed chunk")
+    args = parser.parse_args()
+
+    for kb in [int(s) for s in args.sizes.split(",")]:
+        text = payload(kb)
+        start = time.perf_counter()
+        repair_json_str(text)
+        repair = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stream = StreamingJSONParser()
+        for i in range(0, len(text), args.chunk):
+            stream.feed(text[i : i + args.chunk])
+        stream.value()
+        streaming = time.perf_counter() - start
+        print(
+            f"{kb:>6} KB: repair {repair * 1e3:9.1f} ms ({repair * 1e3 / kb:6.3f} ms/KB), "
+            f"streamed {streaming * 1e3:9.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Puts per second of the agent MemoryStore against the number of live conversations.
+The "scan" store is the previous implementation, which looked at every conversation on
+every put; the expiry index only touches the entries that expired.
+
+    python benchmarks/memory_store_benchmark.py --conversations 100,1000,10000 --puts 20000
+"""
+import argparse
+import random
+import time
+
+from byzerllm.apps.agent.store import Message
+from byzerllm.apps.agent.store.memory_store import MemoryStore
+
+
+class ScanMemoryStore(MemoryStore):
+    def __init__(self):
+        self.messages = {}
+
+    def put(self, message: Message):
+        if message.id not in self.messages:
+            self.messages[message.id] = []
+        v = self.messages[message.id]
+        v.append(message)
+        target = -1
+        for idx, item in enumerate(v):
+            if time.monotonic() - item.timestamp > 24 * 60 * 60:
+                target = idx
+                break
+        if target >= 0:
+            self.messages[message.id] = v[target:]
+        remove_keys = []
+        for key in list(self.messages.keys()):
+            if time.monotonic() - self.messages[key][-1].timestamp > 24 * 60 * 60:
+                remove_keys.append(key)
+        for key in remove_keys:
+            del self.messages[key]
+        return self
+
+
+def bench(store, conversations: int, puts: int) -> float:
+    messages = [
+        Message(id=f"conv-{i}", m={"content": "hi"}, sender="a", receiver="b", timestamp=time.monotonic())
+        for i in range(conversations)
+    ]
+    for message in messages:
+        store.put(message)
+    picks = [random.choice(messages) for _ in range(puts)]
+    start = time.perf_counter()
+    for message in picks:
+        store.put(message)
+    return puts / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", default="100,1000,10000")
+    parser.add_argument("--puts", type=int, default=20000)
+    args = parser.parse_args()
+
+    for conversations in [int(c) for c in args.conversations.split(",")]:
+        scan = bench(ScanMemoryStore(), conversations, min(args.puts, 2000))
+        indexed = bench(MemoryStore(), conversations, args.puts)
+        print(
+            f"{conversations:>7} conversations: scan {scan:12,.0f} puts/s, "
+            f"expiry index {indexed:12,.0f} puts/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Non-text detection on large RAG style prompts (retrieved documents with code, html and
+`a < b` comparisons), with and without an image tag. The "char" extractor is the previous
+`TagExtractor.extract`, which walks the prompt with `peek`/`next`; "previous" is what
+`_encode_query` did per request (an Image and an Audio extraction), "current" is the
+substring check plus one extraction for all media.
+
+    python benchmarks/nontext_benchmark.py --sizes 10,100,500
+"""
+import argparse
+import time
+
+from byzerllm.utils.nontext import Audio, Image, TagExtractor, may_have_nontext
+
+DOC = (
+    "## Document {i}\n"
+    "The service returns <b>200</b> when latency < 50ms and retries otherwise.\n"
+    "```python\nif a < b and c > d:\n    items = [x for x in range(10) if x < 5]\n```\n"
+    "<table><tr><td>p99</td><td>120ms</td></tr></table>\n\n"
+)
+
+
+class CharTagExtractor(TagExtractor):
+    def extract(self):
+        if self.is_extracted:
+            return self.root_tag
+        while True:
+            if self.pos == self.len - 1:
+                break
+            if self.is_start_tag():
+                self.extract_start_tag()
+            elif self.is_end_tag():
+                self.extract_end_tag()
+            elif self.is_in_tag():
+                if self.is_tag_content():
+                    self.consume_blank()
+                    continue
+                else:
+                    self.extract_str_content()
+            elif self.is_not_in_tag_str():
+                self.extract_content_not_in_tag()
+        self.is_extracted = True
+        return self.root_tag
+
+
+class CharImage(CharTagExtractor, Image):
+    pass
+
+
+class CharAudio(CharTagExtractor, Audio):
+    pass
+
+
+def prompt(kb: int, with_image: bool) -> str:
+    docs = []
+    size = 0
+    i = 0
+    while size < kb * 1024:
+        docs.append(DOC.format(i=i))
+        size += len(docs[-1])
+        i += 1
+    text = "Answer with the documents below.\n\n" + "".join(docs) + "Question: why is p99 high?"
+    if with_image:
+        text = "<_image_>data:image/png;base64,iVBORw0KGgo=</_image_>\n" + text
+    return text
+
+
+def previous(text: str):
+    return CharImage(text).has_image(), CharAudio(text).has_audio()
+
+
+def current(text: str):
+    if not may_have_nontext(text):
+        return False, False
+    media = TagExtractor(text).media_types()
+    return "image" in media, "audio" in media
+
+
+def bench(func, text: str, min_time: float = 0.5) -> float:
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        func(text)
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,100,500", help="prompt sizes in KB")
+    args = parser.parse_args()
+
+    print(f"{'prompt':>14} {'char x2 ms':>11} {'extract ms':>11} {'current ms':>11} {'speedup':>8}")
+    for kb in [int(x) for x in args.sizes.split(",")]:
+        for with_image in [False, True]:
+            text = prompt(kb, with_image)
+            assert previous(text) == current(text) == (with_image, False)
+            t_previous = bench(previous, text)
+            t_extract = bench(lambda s: TagExtractor(s).media_types(), text)
+            t_current = bench(current, text)
+            label = f"{kb}KB{' +image' if with_image else ''}"
+            print(
+                f"{label:>14} {t_previous * 1000:11.2f} {t_extract * 1000:11.3f} "
+                f"{t_current * 1000:11.3f} {t_previous / t_current:7.0f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Render cost of a `@byzerllm.prompt` function with and without the template/signature cache.
+The uncached numbers clear the caches before every render, which is what every call
+used to pay (dedent the docstring, compile the template, inspect the signature).
+
+    python benchmarks/prompt_render_benchmark.py --n 5000
+"""
+import argparse
+import time
+
+import byzerllm
+from byzerllm import utils
+
+
+@byzerllm.prompt()
+def summarize(context: str, questions: list, lang: str = "en") -> str:
+    """
+    You are a helpful assistant, answer in {{ lang }}.
+
+    Context:
+    {{ context }}
+
+    {% for q in questions %}
+    Question {{ loop.index }}: {{ q }}
+    {% endfor %}
+
+    Answer every question, one paragraph per question.
+    """
+
+
+class Agent:
+    @byzerllm.prompt()
+    def plan(self, goal: str) -> str:
+        """
+        Make a plan for: {{ goal }}
+        """
+
+
+def bench(n: int, render, cached: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        if not cached:
+            utils._prompt_template_cache.clear()
+            utils._signature_cache.clear()
+        render()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=5000)
+    args = parser.parse_args()
+
+    agent = Agent()
+    cases = {
+        "function": lambda: summarize.prompt("some context " * 20, ["why?", "how?"], lang="zh"),
+        "method": lambda: agent.plan.prompt("ship the release"),
+    }
+    for name, render in cases.items():
+        render()
+        uncached = bench(args.n, render, cached=False)
+        cached = bench(args.n, render, cached=True)
+        print(
+            f"{name:>8}: uncached {uncached:8.1f} us/render, cached {cached:8.1f} us/render, "
+            f"{uncached / cached:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
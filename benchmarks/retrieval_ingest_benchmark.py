@@ -0,0 +1,101 @@
+"""
+Rows per second of `build_from_dicts` against the block size, with a stand-in retrieval
+cluster which spends `--index-us` per row on a build. "previous" puts every row first and
+sends one build with all the object ids; the block path builds a block while the next one
+is put. With `--pure-client` the rows go through a ByzerRetrievalProxy actor as in
+`ByzerRetrieval(pure_client=True)`.
+
+    python benchmarks/retrieval_ingest_benchmark.py --rows 10000 --block-rows 500,2000,10000 --index-us 500
+"""
+import argparse
+import json
+import sys
+import time
+
+import ray
+
+from byzerllm.utils.retrieval import ByzerRetrieval, ByzerRetrievalProxy
+
+
+class FakeCluster:
+    def __init__(self, index_us: float):
+        self.index_us = index_us
+        self.rows = 0
+
+    def clusterInfo(self):
+        return json.dumps(
+            {
+                "tableSettingsList": [
+                    {"database": "db", "table": "t", "schema": "", "location": "", "num_shards": 1}
+                ]
+            }
+        )
+
+    def buildFromRayObjectStore(self, database, table, data_ids, locations):
+        time.sleep(len(data_ids) * self.index_us / 1e6)
+        self.rows += len(data_ids)
+        return True
+
+    def num_rows(self):
+        return self.rows
+
+
+class BenchProxy(ByzerRetrievalProxy):
+    def __init__(self, cluster):
+        super().__init__()
+        self.launched = True
+        self.clusters["bench"] = cluster
+
+    def previous_build_from_dicts(self, cluster_name, database, table, data):
+        data_refs = [ray.put(json.dumps(item, ensure_ascii=False)) for item in data]
+        return self.build(cluster_name, database, table, data_refs)
+
+
+def make_rows(n: int):
+    return [
+        {
+            "_id": f"doc-{i}",
+            "file_path": f"/data/docs/{i // 100}.md",
+            "raw_content": f"chunk {i} " + "retrieval augmented generation " * 12,
+            "created_time": 1700000000 + i,
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--block-rows", default="500,2000,10000")
+    parser.add_argument("--index-us", type=float, default=500, help="build time per row of the stand-in cluster")
+    parser.add_argument("--pure-client", action="store_true")
+    args = parser.parse_args()
+
+    ray.cloudpickle.register_pickle_by_value(sys.modules[__name__])
+    ray.init(ignore_reinit_error=True, include_dashboard=False)
+    rows = make_rows(args.rows)
+
+    def run(label, build):
+        cluster = ray.remote(FakeCluster).options(num_cpus=0).remote(args.index_us)
+        if args.pure_client:
+            retrieval = ByzerRetrieval(pure_client=True)
+            retrieval.retrieval_proxy = ray.remote(BenchProxy).options(num_cpus=0).remote(cluster)
+        else:
+            retrieval = BenchProxy(cluster)
+        start = time.perf_counter()
+        assert build(retrieval)
+        elapsed = time.perf_counter() - start
+        assert ray.get(cluster.num_rows.remote()) == args.rows
+        print(f"{label:>18} {elapsed:8.2f}s {args.rows / elapsed:12,.0f} rows/s")
+
+    print(f"rows={args.rows} index_us={args.index_us} pure_client={args.pure_client}")
+    if args.pure_client:
+        run("previous", lambda r: ray.get(r.retrieval_proxy.previous_build_from_dicts.remote("bench", "db", "t", rows)))
+    else:
+        run("previous", lambda r: r.previous_build_from_dicts("bench", "db", "t", rows))
+    for block_rows in [int(x) for x in args.block_rows.split(",")]:
+        run(f"block_rows={block_rows}", lambda r: r.build_from_dicts("bench", "db", "t", rows, block_rows=block_rows))
+
+
+if __name__ == "__main__":
+    main()
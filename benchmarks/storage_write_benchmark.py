@@ -0,0 +1,91 @@
+"""
+Per stage throughput of `ByzerStorage.write_builder()` with a stand-in embedding model
+which takes `--request-ms` per request plus `--text-ms` per text (spread over the
+concurrent requests it serves, like a pool of embedding workers). "previous" embeds and
+tokenizes one item at a time, as `add_items` did.
+
+    python benchmarks/storage_write_benchmark.py --items 2000 --batch-sizes 16,64,256
+"""
+import argparse
+import threading
+import time
+
+from byzerllm.apps.byzer_storage.simple_api import ByzerStorage
+from byzerllm.utils.client import LLMResponse
+
+
+class StandInLLM:
+    default_emb_model_name = "emb"
+
+    def __init__(self, request_ms: float, text_ms: float, workers: int):
+        self.request_ms = request_ms
+        self.text_ms = text_ms
+        self.workers = threading.Semaphore(workers)
+
+    def emb(self, model, request):
+        texts = request.instruction if isinstance(request.instruction, list) else [request.instruction]
+        with self.workers:
+            time.sleep((self.request_ms + self.text_ms * len(texts)) / 1000)
+        return [LLMResponse(output=[0.1] * 768, metadata={}, input=s) for s in texts]
+
+
+class NullRetrieval:
+    def build_from_dicts(self, cluster_name, database, table, data):
+        return True
+
+
+def make_storage(args):
+    storage = ByzerStorage.__new__(ByzerStorage)
+    storage.cluster_name, storage.database, storage.table = "bench", "db", "t"
+    storage.llm = StandInLLM(args.request_ms, args.text_ms, args.emb_workers)
+    storage.retrieval = NullRetrieval()
+    return storage
+
+
+def make_items(n: int):
+    return [
+        {"_id": i, "content": f"第{i}段 向量检索把文本切成块并写入存储。" * 4, "raw_content": f"第{i}段 全文检索需要分词。" * 4}
+        for i in range(n)
+    ]
+
+
+def previous(storage, items):
+    start = time.monotonic()
+    for item in items:
+        item["content"] = storage.emb(item["content"])
+        item["raw_content"] = storage.tokenize(item["raw_content"])
+    storage._add(items)
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--batch-sizes", default="16,64,256")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--emb-workers", type=int, default=4)
+    parser.add_argument("--request-ms", type=float, default=5)
+    parser.add_argument("--text-ms", type=float, default=0.5)
+    parser.add_argument("--tokenize-workers", type=int, default=1)
+    args = parser.parse_args()
+
+    elapsed = previous(make_storage(args), make_items(args.items))
+    print(f"{'previous':>16} total {args.items / elapsed:9.0f} items/s")
+    for batch_size in [int(x) for x in args.batch_sizes.split(",")]:
+        builder = (
+            make_storage(args)
+            .write_builder()
+            .set_emb_batch_size(batch_size)
+            .set_emb_concurrency(args.concurrency)
+            .set_tokenize_workers(args.tokenize_workers)
+        )
+        start = time.monotonic()
+        builder.add_items(make_items(args.items), vector_fields=["content"], search_fields=["raw_content"])
+        builder.execute()
+        elapsed = time.monotonic() - start
+        stages = "  ".join(f"{stage} {s['items_per_second']:9.0f}/s" for stage, s in builder.stats.items())
+        print(f"batch_size={batch_size:>5} total {args.items / elapsed:9.0f} items/s  {stages}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compare how many stream server actor calls a client needs per generated token
+with the old `get_item` polling loop and the `get_items_since` long poll.
+
+    python benchmarks/stream_server_benchmark.py --tokens 200 --interval 0.02
+"""
+import argparse
+import threading
+import time
+import uuid
+
+import ray
+
+from byzerllm.utils.types import (
+    BlockVLLMStreamServer,
+    StreamOutputs,
+    SingleOutput,
+    SingleOutputMeta,
+)
+
+
+def produce(server, request_id: str, tokens: int, interval: float):
+    text = ""
+    for i in range(tokens):
+        time.sleep(interval)
+        text += f"t{i} "
+        ray.get(
+            server.add_item.remote(
+                request_id,
+                StreamOutputs(
+                    outputs=[
+                        SingleOutput(
+                            text=text,
+                            metadata=SingleOutputMeta(generated_tokens_count=i + 1),
+                        )
+                    ]
+                ),
+            )
+        )
+    ray.get(server.mark_done.remote(request_id))
+
+
+def consume_polling(server, request_id: str):
+    calls = 0
+    first_token = None
+    while True:
+        calls += 1
+        v = ray.get(server.get_item.remote(request_id))
+        if isinstance(v, str):
+            time.sleep(0.01)
+            continue
+        if v is None:
+            break
+        if first_token is None:
+            first_token = time.monotonic()
+    return calls, first_token
+
+
+def consume_long_poll(server, request_id: str):
+    calls = 0
+    first_token = None
+    offset = 0
+    while True:
+        calls += 1
+        offset, items, done = ray.get(
+            server.get_items_since.remote(request_id, offset, 1.0)
+        )
+        if items and first_token is None:
+            first_token = time.monotonic()
+        if done:
+            break
+    return calls, first_token
+
+
+def run(server, consumer, tokens: int, interval: float):
+    request_id = str(uuid.uuid4())
+    ray.get(server.add_item.remote(request_id, "RUNNING"))
+    producer = threading.Thread(
+        target=produce, args=(server, request_id, tokens, interval), daemon=True
+    )
+    start = time.monotonic()
+    producer.start()
+    calls, first_token = consumer(server, request_id)
+    producer.join()
+    return calls, (first_token or time.monotonic()) - start, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.02)
+    args = parser.parse_args()
+
+    ray.init(ignore_reinit_error=True, include_dashboard=False)
+    server = ray.remote(BlockVLLMStreamServer).options(max_concurrency=1000).remote()
+
+    for name, consumer in [
+        ("get_item polling", consume_polling),
+        ("get_items_since long poll", consume_long_poll),
+    ]:
+        calls, ttft, total = run(server, consumer, args.tokens, args.interval)
+        print(
+            f"{name:<28} actor calls: {calls:>5}  calls/token: {calls/args.tokens:.2f}  "
+            f"first token: {ttft*1000:.1f}ms  total: {total:.2f}s",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
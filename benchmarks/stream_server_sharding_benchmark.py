@@ -0,0 +1,84 @@
+"""
+Load test for sharded stream servers: many concurrent streams, each producing
+`--tokens` delta chunks which are read back with the long poll. Reports finished
+streams per second for every shard count. Run it on a machine with more cores
+than shards, otherwise every shard competes for the same CPU.
+
+    python benchmarks/stream_server_sharding_benchmark.py --streams 400 --clients 8
+"""
+import argparse
+import time
+import uuid
+
+import ray
+
+from byzerllm.utils.types import (
+    BlockVLLMStreamServer,
+    StreamOutputs,
+    SingleOutput,
+    create_stream_server,
+    get_stream_server,
+    stream_server_shard_name,
+)
+
+
+@ray.remote
+def run_streams(server_name: str, num_shards: int, streams: int, tokens: int):
+    server = get_stream_server(server_name, num_shards)
+    for _ in range(streams):
+        request_id = str(uuid.uuid4())
+        ray.get(server.add_item.remote(request_id, "RUNNING"))
+        for i in range(tokens):
+            ray.get(
+                server.add_item.remote(
+                    request_id,
+                    StreamOutputs(outputs=[SingleOutput(text=f"t{i}")], delta=True),
+                )
+            )
+        ray.get(server.mark_done.remote(request_id))
+
+        reader = ray.get_actor(stream_server_shard_name(server_name, request_id, num_shards))
+        offset, done = 0, False
+        while not done:
+            offset, items, done = ray.get(
+                reader.get_items_since.remote(request_id, offset, 1.0)
+            )
+    return streams
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=400)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--shards", type=str, default="1,2,4")
+    args = parser.parse_args()
+
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="byzerllm_bench")
+    per_client = args.streams // args.clients
+
+    for num_shards in [int(i) for i in args.shards.split(",")]:
+        server_name = f"BENCH_STREAM_SERVER_{num_shards}"
+        create_stream_server(BlockVLLMStreamServer, server_name, num_shards)
+        start = time.monotonic()
+        done = sum(
+            ray.get(
+                [
+                    run_streams.remote(server_name, num_shards, per_client, args.tokens)
+                    for _ in range(args.clients)
+                ]
+            )
+        )
+        cost = time.monotonic() - start
+        print(
+            f"shards: {num_shards:>2}  streams: {done}  cost: {cost:.2f}s  "
+            f"streams/s: {done / cost:.1f}",
+            flush=True,
+        )
+        for shard in range(num_shards):
+            name = server_name if shard == 0 else f"{server_name}_{shard}"
+            ray.kill(ray.get_actor(name))
+
+
+if __name__ == "__main__":
+    main()
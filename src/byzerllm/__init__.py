@@ -15,6 +15,7 @@ from byzerllm.utils import (
     format_prompt,
     format_prompt_jinja2,
     format_str_jinja2,
+    get_func_signature,
 )
 from .store import transfer_from_ob
 
@@ -69,7 +70,17 @@ def common_init_model(
                 f"MODEL[{udf_name}] Normal mode: restore model from ray object store to {model_dir}"
             )
             if not os.path.exists(model_dir):
-                transfer_from_ob(udf_name, model_refs, model_dir)
+                if "modelCacheKey" in conf:
+                    # the caller identifies the model version, workers on this node share one copy
+                    from .model_cache import ModelCache
+
+                    cached_dir = ModelCache(conf.get("modelCacheDir")).restore_from_ob(
+                        conf["modelCacheKey"], udf_name, model_refs
+                    )
+                    os.makedirs(os.path.dirname(os.path.abspath(model_dir)), exist_ok=True)
+                    os.symlink(cached_dir, model_dir)
+                else:
+                    transfer_from_ob(udf_name, model_refs, model_dir)
     else:
         print_flush(
             f"MODEL[{udf_name}]  Local mode: Load model from local path ({model_dir}), consume the model server to prevent socket server leak."
@@ -107,7 +118,7 @@ import inspect
 
 
 def check_param_exists(func, name):
-    return name in inspect.signature(func).parameters
+    return name in get_func_signature(func).parameters
 
 
 # add a log funcition to log the string to a specified file
@@ -143,7 +154,7 @@ class _PromptWraper:
         args = self.args
         kwargs = self.kwargs
 
-        signature = inspect.signature(func)
+        signature = get_func_signature(func)
         arguments = signature.bind(*args, **kwargs)
         arguments.apply_defaults()
         input_dict = {}
@@ -169,7 +180,7 @@ class _PromptWraper:
         args = self.args
         kwargs = self.kwargs
 
-        signature = inspect.signature(func)
+        signature = get_func_signature(func)
         arguments = signature.bind(*args, **kwargs)
         arguments.apply_defaults()
         input_dict = {}
@@ -196,9 +207,7 @@ class _PromptWraper:
                 )(func)(**input_dict)
 
         if isinstance(llm, str):
-            _llm = ByzerLLM()
-            _llm.setup_default_model_name(llm)
-            _llm.setup_template(llm, "auto")
+            _llm = get_llm_client(llm)
 
             if "self" in input_dict:
                 instance = input_dict.pop("self")
@@ -312,7 +321,7 @@ class _PrompRunner:
         return self
 
     def prompt(self, *args, **kwargs):
-        signature = inspect.signature(self.func)
+        signature = get_func_signature(self.func)
         if self.instance:
             arguments = signature.bind(self.instance, *args, **kwargs)
         else:
@@ -468,7 +477,7 @@ class _PrompRunner:
         render = self.render
         check_result = self.check_result
 
-        signature = inspect.signature(func)
+        signature = get_func_signature(func)
         if self.instance:
             arguments = signature.bind(self.instance, *args, **kwargs)
         else:
@@ -562,9 +571,7 @@ class _PrompRunner:
             return v
 
         if isinstance(llm, str):
-            _llm = ByzerLLM()
-            _llm.setup_default_model_name(llm)
-            _llm.setup_template(llm, "auto")
+            _llm = get_llm_client(llm)
             return_origin_response = True if self.response_markers else False
             marker = None
 
@@ -747,7 +754,8 @@ class prompt:
         )
 
 
-from byzerllm.utils.client import ByzerLLM
+from byzerllm.utils.client import ByzerLLM, AsyncByzerLLM
+from byzerllm.utils.client.client_registry import get_llm_client
 from byzerllm.utils.retrieval import ByzerRetrieval
 from byzerllm.utils.connect_ray import connect_cluster
 from byzerllm.apps.agent.registry import reply as agent_reply
@@ -755,6 +763,7 @@ from byzerllm.utils.nontext import Image
 
 __all__ = [
     "ByzerLLM",
+    "AsyncByzerLLM",
     "ByzerRetrieval",
     "connect_cluster",
     "prompt",
@@ -14,7 +14,7 @@ from byzerllm.apps.agent.user_proxy_agent import UserProxyAgent
 from byzerllm.apps.agent.extensions.data_analysis_pipeline_agent import DataAnalysisPipeline,DataAnalysisPipelineManager
 from byzerllm.apps.agent.extensions.simple_retrieval_client import SimpleRetrievalClient
 from byzerllm.apps.agent.store.memory_store import  MessageStore,MemoryStore,Message as ChatStoreMessage
-from byzerllm.apps.agent.store.stores import Stores
+from byzerllm.apps.agent.store.stores import Stores, start_message_store
 try:
     from termcolor import colored
 except ImportError:
@@ -61,10 +61,7 @@ class DataAnalysis:
 
         if self.message_store:
             if isinstance(self.message_store,str):
-                try:
-                    ray.get_actor(self.message_store)
-                except:
-                    ray.remote(MemoryStore).options(num_cpus=0.1,name=self.message_store, lifetime="detached").remote()
+                start_message_store(self.message_store, MemoryStore)
 
 
         if not ray.get(self.manager.check_pipeline_exists.remote(self.name)):
@@ -1,6 +1,6 @@
 
 import pydantic
-from typing import Any, Dict
+from typing import Any, Dict, List
 from abc import ABC, abstractmethod
 
 
@@ -16,6 +16,11 @@ class MessageStore(ABC):
     @abstractmethod
     def put(self, message: Message):
         pass
+
+    def put_many(self, messages: List[Message]):
+        # returns nothing, the result of an actor call is sent back to the caller
+        for message in messages:
+            self.put(message)
     
     @abstractmethod
     def get(self, id: str):
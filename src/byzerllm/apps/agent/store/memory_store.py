@@ -1,48 +1,86 @@
 from . import Message, MessageStore
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 import time
 
+
 class MemoryStore(MessageStore):
-    def __init__(self):
-        self.messages = {}
+    """
+    Keeps the messages of every conversation in memory.
+
+    A message expires `ttl` seconds after it was put, a conversation goes away together with
+    its last message. Expiry is driven by an index of (put time, conversation id, put number) in put order,
+    so a put only looks at the entries that actually expired instead of scanning every
+    conversation. With `max_messages` the oldest messages are evicted first once the store holds
+    more than that.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 24 * 60 * 60,
+        max_messages: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.clock = clock
+        # conversation id -> (put number, put time, message) in put order
+        self.messages: Dict[str, Deque[Tuple[int, float, Message]]] = {}
+        # (put time, conversation id, put number) of every put, entries of cleared conversations
+        # are dropped lazily
+        self.expiry_index: Deque[Tuple[float, str, int]] = deque()
+        self.size = 0
+        # numbers the puts, the put time can repeat on a coarse clock
+        self.seq = 0
 
     def put(self, message: Message):
+        now = self.clock()
+        self.seq += 1
         if message.id not in self.messages:
-            self.messages[message.id] = []
-        v = self.messages[message.id]
-        v.append(message)
-        if message.m is None:
-            return self
-    
-        # clean up old messages
-        target = -1 
-        for idx,item in enumerate(v):
-            if time.monotonic() - item.timestamp > 24*60*60:
-                target = idx
-                break
-        if target >= 0:
-            v = v[target:]
-            self.messages[message.id] = v
-        
-        # clean up message groups
-        remove_keys = []
-        for key in list(self.messages.keys()):
-            if time.monotonic() -  self.messages[key][-1].timestamp  > 24*60*60:
-                remove_keys.append(key)
-
-        for key in remove_keys:
-            del self.messages[key]        
-
+            self.messages[message.id] = deque()
+        self.messages[message.id].append((self.seq, now, message))
+        self.expiry_index.append((now, message.id, self.seq))
+        self.size += 1
+        self._expire(now)
         return self
-    
+
     def get(self, id: str):
-        v = self.messages.get(id,[])
-        if len(v)>0 and v[-1].m is None:
-            del self.messages[id]
-            return v
+        self._expire(self.clock())
+        v = [message for _, _, message in self.messages.get(id, [])]
+        if len(v) > 0 and v[-1].m is None:
+            self.clear(id)
         return v
-    
+
     def clear(self, id: str):
         if id in self.messages:
+            self.size -= len(self.messages.pop(id))
+            self._compact()
+
+    def _pop_oldest(self) -> None:
+        _, id, seq = self.expiry_index.popleft()
+        v = self.messages.get(id)
+        # the entry is stale when its conversation was cleared in the meantime
+        if not v or v[0][0] != seq:
+            return
+        v.popleft()
+        self.size -= 1
+        if not v:
             del self.messages[id]
-        
-    
\ No newline at end of file
+
+    def _expire(self, now: float) -> None:
+        deadline = now - self.ttl
+        while self.expiry_index and self.expiry_index[0][0] < deadline:
+            self._pop_oldest()
+        if self.max_messages is not None:
+            while self.size > self.max_messages and self.expiry_index:
+                self._pop_oldest()
+
+    def _compact(self) -> None:
+        # cleared conversations leave their entries behind, rebuild once they dominate the index
+        if len(self.expiry_index) <= 2 * self.size + 1024:
+            return
+        entries: List[Tuple[float, str, int]] = [
+            (timestamp, id, seq) for id, v in self.messages.items() for seq, timestamp, _ in v
+        ]
+        entries.sort(key=lambda entry: entry[2])
+        self.expiry_index = deque(entries)
@@ -0,0 +1,166 @@
+from . import Message, MessageStore
+from collections import OrderedDict
+from typing import List
+import json
+import os
+import sqlite3
+import threading
+
+
+class SqliteStore(MessageStore):
+    """
+    Keeps the messages of every conversation in a sqlite file, so they survive restarts.
+
+    Puts are group committed: they are queued and a background thread writes everything that
+    arrived within `flush_interval_ms` (or `max_batch` messages) in one transaction. Reads of a
+    conversation are served from an in-memory cache of the last `max_cached_conversations`
+    conversations that were read, a miss flushes the queue and loads the conversation from the file.
+
+    Call `flush` to make the queued puts durable, `close` flushes and stops the writer.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval_ms: float = 50,
+        max_batch: int = 512,
+        max_cached_conversations: int = 1024,
+    ):
+        self.path = path
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+        self.max_cached_conversations = max_cached_conversations
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS agent_messages ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, conversation TEXT NOT NULL, "
+            "sender TEXT, receiver TEXT, timestamp REAL, m TEXT)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS agent_messages_conversation ON agent_messages (conversation, seq)"
+        )
+        self.conn.commit()
+
+        # `lock` guards the queue and the cache, `db_lock` serializes the use of the connection.
+        # When both are needed `db_lock` is taken first.
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.has_pending = threading.Condition(self.lock)
+        self.pending: List[Message] = []
+        # conversation id -> all of its messages, only for conversations that were loaded completely
+        self.cache: "OrderedDict[str, List[Message]]" = OrderedDict()
+        self.commits = 0
+
+        self.closed = False
+        self.writer = threading.Thread(target=self._write_loop, name="sqlite-message-store", daemon=True)
+        self.writer.start()
+
+    def put(self, message: Message):
+        self.put_many([message])
+
+    def put_many(self, messages: List[Message]):
+        with self.lock:
+            wake_writer = not self.pending
+            for message in messages:
+                self.pending.append(message)
+                if message.id in self.cache:
+                    self.cache[message.id].append(message)
+            if wake_writer or len(self.pending) >= self.max_batch:
+                self.has_pending.notify()
+
+    def get(self, id: str):
+        with self.lock:
+            v = self.cache.get(id)
+            if v is not None:
+                self.cache.move_to_end(id)
+                v = list(v)
+        if v is None:
+            with self.db_lock:
+                self._write(self._take_pending())
+                rows = self.conn.execute(
+                    "SELECT conversation, sender, receiver, timestamp, m FROM agent_messages "
+                    "WHERE conversation = ? ORDER BY seq",
+                    (id,),
+                ).fetchall()
+                v = [self._to_message(row) for row in rows]
+                with self.lock:
+                    # puts that arrived after the flush above are still queued
+                    v.extend(message for message in self.pending if message.id == id)
+                    self.cache[id] = list(v)
+                    while len(self.cache) > self.max_cached_conversations:
+                        self.cache.popitem(last=False)
+        if len(v) > 0 and v[-1].m is None:
+            self.clear(id)
+        return v
+
+    def clear(self, id: str):
+        with self.db_lock:
+            with self.lock:
+                self.pending = [message for message in self.pending if message.id != id]
+                self.cache.pop(id, None)
+            self.conn.execute("DELETE FROM agent_messages WHERE conversation = ?", (id,))
+            self.conn.commit()
+
+    def flush(self):
+        with self.db_lock:
+            self._write(self._take_pending())
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.has_pending.notify()
+        self.writer.join()
+        with self.db_lock:
+            self._write(self._take_pending())
+            self.conn.close()
+
+    def _take_pending(self) -> List[Message]:
+        with self.lock:
+            batch, self.pending = self.pending, []
+        return batch
+
+    def _write(self, batch: List[Message]):
+        if not batch:
+            return
+        self.conn.executemany(
+            "INSERT INTO agent_messages (conversation, sender, receiver, timestamp, m) VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    message.id,
+                    message.sender,
+                    message.receiver,
+                    message.timestamp,
+                    json.dumps(message.m, ensure_ascii=False, default=str),
+                )
+                for message in batch
+            ],
+        )
+        self.conn.commit()
+        self.commits += 1
+
+    def _write_loop(self):
+        while True:
+            with self.lock:
+                if not self.pending and not self.closed:
+                    self.has_pending.wait()
+                if self.closed:
+                    return
+            # let the puts of the next few milliseconds join this commit
+            with self.lock:
+                if len(self.pending) < self.max_batch and not self.closed:
+                    self.has_pending.wait(self.flush_interval_ms / 1000)
+            with self.db_lock:
+                self._write(self._take_pending())
+
+    @staticmethod
+    def _to_message(row) -> Message:
+        conversation, sender, receiver, timestamp, m = row
+        # `m` is None for the end marker of a conversation, which the model does not validate
+        return Message.model_construct(
+            id=conversation, m=json.loads(m), sender=sender, receiver=receiver, timestamp=timestamp
+        )
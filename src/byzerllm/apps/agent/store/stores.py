@@ -1,10 +1,49 @@
-from typing import Union
-from . import MessageStore
+from typing import List, Union
+from . import Message, MessageStore
+import logging
+import threading
 import ray
 from ray.util.client.common import ClientActorHandle
 
+logger = logging.getLogger(__name__)
+
+
+def start_message_store(name: str, store_cls: type = None, num_cpus: float = 0.1, **kwargs):
+    """
+    Returns the named message store actor, the actor is created (detached) with
+    `store_cls(**kwargs)` if it does not exist yet, e.g.
+    `start_message_store("MESSAGE_STORE", SqliteStore, path="/data/agent_messages.db")`.
+    """
+    if store_cls is None:
+        from .memory_store import MemoryStore
+
+        store_cls = MemoryStore
+    return (
+        ray.remote(store_cls)
+        .options(num_cpus=num_cpus, name=name, lifetime="detached", get_if_exists=True)
+        .remote(**kwargs)
+    )
+
+
 class Stores:
-    def __init__(self,store:Union[str,MessageStore,ClientActorHandle]):        
+    """
+    Client of a message store, which is either a `MessageStore` in this process or a
+    Ray actor (handle or name) wrapping one.
+
+    With `batch_wait_ms > 0`, puts to an actor are buffered and sent as one `put_many` call
+    when `batch_size` messages are buffered or `batch_wait_ms` after the first one, so many
+    agents putting to a shared store do not pay an actor call per message. Buffered messages
+    are not visible to other clients until they are sent; `get` and `clear` of this client
+    send the buffer first, the actor sees the calls of one client in order. By default
+    (`batch_wait_ms=0`) every put is sent right away.
+    """
+
+    def __init__(
+        self,
+        store: Union[str, MessageStore, ClientActorHandle],
+        batch_size: int = 64,
+        batch_wait_ms: float = 0,
+    ):
         if isinstance(store,str):
             try:
                 self.store = ray.get_actor(store)
@@ -14,20 +53,58 @@ class Stores:
         else:
             self.store = store
 
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self.lock = threading.Lock()
+        self.buffer: List[Message] = []
+        self.timer = None
+
     def put(self, message):
         if isinstance(self.store,MessageStore):
             return self.store.put(message)
-        else:
+        if self.batch_wait_ms <= 0:
             return self.store.put.remote(message)
+        with self.lock:
+            self.buffer.append(message)
+            if len(self.buffer) >= self.batch_size:
+                return self._send()
+            if self.timer is None:
+                self.timer = threading.Timer(self.batch_wait_ms / 1000, self._timed_flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _timed_flush(self):
+        # nobody waits for the result of a timed flush, report its errors here
+        try:
+            ref = self.flush()
+            if ref is not None:
+                ray.get(ref)
+        except Exception:
+            logger.exception("Failed to put the buffered messages to the message store")
+
+    def flush(self):
+        with self.lock:
+            return self._send()
+
+    def _send(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.buffer:
+            return None
+        messages, self.buffer = self.buffer, []
+        return self.store.put_many.remote(messages)
 
     def get(self, id):
         if isinstance(self.store,MessageStore):
             return self.store.get(id)
         else:
+            self.flush()
             return ray.get(self.store.get.remote(id))
-        
+
     def clear(self,id):
         if isinstance(self.store,MessageStore):
             return self.store.clear(id)
         else:
-            return ray.get(self.store.clear.remote(id))     
\ No newline at end of file
+            self.flush()
+            return ray.get(self.store.clear.remote(id))
@@ -1,4 +1,5 @@
 from byzerllm.utils.retrieval import ByzerRetrieval
+from byzerllm.utils.retrieval.fusion import reciprocal_rank_fusion
 from byzerllm.utils.client import ByzerLLM, InferBackend, LLMRequest
 from byzerllm.utils.client.byzerllm_client import Templates
 from byzerllm.records import (
@@ -10,8 +11,10 @@ from byzerllm.records import (
     ResourceRequirementSettings,
     ResourceRequirement,
 )
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Tuple, Union, Optional
 from enum import Enum, auto
+import concurrent.futures
+import multiprocessing
 import os
 import jieba
 from loguru import logger
@@ -23,6 +26,27 @@ from byzerllm.utils.client.byzerllm_client import Template
 from langchain.prompts import PromptTemplate
 
 
+# below this many texts the process pool costs more than it saves
+TOKENIZE_MIN_PARALLEL = 256
+
+_tokenize_pools: Dict[int, concurrent.futures.ProcessPoolExecutor] = {}
+_tokenize_pools_lock = threading.Lock()
+
+
+def _tokenize(s: str) -> str:
+    return " ".join(jieba.cut(s, cut_all=False))
+
+
+def _tokenize_pool(workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    # spawn: forking a process which runs Ray is not safe
+    with _tokenize_pools_lock:
+        if workers not in _tokenize_pools:
+            _tokenize_pools[workers] = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _tokenize_pools[workers]
+
+
 def generate_md5_hash(input_string: str) -> str:
     md5_hash = hashlib.md5()
     md5_hash.update(input_string.encode("utf-8"))
@@ -88,9 +112,17 @@ class QueryBuilder:
         self.fields = []
         self.limit = 10
         self.sorts = []
+        # variants of the query, see `execute`
+        self.keywords = []
+        self.vectors = []
 
-    def set_search_query(self, query: str, fields: Union[List[str], str]):
-        self.keyword = self.storage.tokenize(query)
+    def set_search_query(
+        self, query: Union[str, List[str]], fields: Union[List[str], str]
+    ):
+        if isinstance(query, str):
+            self.keyword = self.storage.tokenize(query)
+        else:
+            self.keywords = [self.storage.tokenize(q) for q in query]
         if isinstance(fields, str):
             self.fields = fields.split(",")
         else:
@@ -98,10 +130,14 @@ class QueryBuilder:
         return self
 
     def set_vector_query(
-        self, query: Union[List[float], str], fields: Union[List[str], str]
+        self,
+        query: Union[List[float], str, List[str]],
+        fields: Union[List[str], str],
     ):
         if isinstance(query, str):
             self.vector = self.storage.emb(query)
+        elif query and isinstance(query[0], str):
+            self.vectors = self.storage.emb_batch(query)
         else:
             self.vector = query
 
@@ -130,6 +166,28 @@ class QueryBuilder:
         return self
 
     def execute(self) -> List[Dict[str, Any]]:
+        """
+        With a list of queries given to `set_search_query` or `set_vector_query`, each
+        variant is searched in one request and the results are merged by reciprocal
+        rank fusion, each document once.
+        """
+        if self.keywords or self.vectors:
+            keywords = self.keywords or [self.keyword]
+            vectors = self.vectors or [self.vector]
+            n = max(len(keywords), len(vectors))
+            if len(keywords) not in (1, n) or len(vectors) not in (1, n):
+                raise ValueError(
+                    "The search and vector queries should have the same number of variants."
+                )
+            return self.storage._query_many(
+                keywords=keywords * n if len(keywords) == 1 else keywords,
+                vectors=vectors * n if len(vectors) == 1 else vectors,
+                vector_field=self.vector_field,
+                filters=self.filters,
+                fields=self.fields,
+                sorts=self.sorts,
+                limit=self.limit,
+            )
         return self.storage._query(
             keyword=self.keyword,
             vector=self.vector,
@@ -157,9 +215,34 @@ class QueryBuilder:
 
 
 class WriteBuilder:
+    """
+    Collects the items to write. The vector fields are embedded and the search fields
+    tokenized in `execute`, for all the items at once: the texts are embedded in batches
+    of `emb_batch_size` with up to `emb_concurrency` requests in flight, and tokenized in
+    a process pool of `tokenize_workers`. `stats` holds the throughput of each stage
+    of the last `execute`.
+    """
+
     def __init__(self, storage: "ByzerStorage"):
         self.storage = storage
         self.data = []
+        self.pending: List[Tuple[Dict[str, Any], List[str], List[str]]] = []
+        self.emb_batch_size = 64
+        self.emb_concurrency = 4
+        self.tokenize_workers = min(os.cpu_count() or 1, 8)
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def set_emb_batch_size(self, emb_batch_size: int):
+        self.emb_batch_size = emb_batch_size
+        return self
+
+    def set_emb_concurrency(self, emb_concurrency: int):
+        self.emb_concurrency = emb_concurrency
+        return self
+
+    def set_tokenize_workers(self, tokenize_workers: int):
+        self.tokenize_workers = tokenize_workers
+        return self
 
     def add_item(
         self,
@@ -167,16 +250,7 @@ class WriteBuilder:
         vector_fields: List[str] = [],
         search_fields: List[str] = [],
     ):
-        if not vector_fields and not search_fields:
-            raise ValueError(
-                "At least one of vector_fields or search_fields is required."
-            )
-        for field in vector_fields:
-            item[field] = self.storage.emb(item[field])
-        for field in search_fields:
-            item[field] = self.storage.tokenize(item[field])
-        self.data.append(item)
-        return self
+        return self.add_items([item], vector_fields, search_fields)
 
     def add_items(
         self,
@@ -189,15 +263,60 @@ class WriteBuilder:
                 "At least one of vector_fields or search_fields is required."
             )
         for item in items:
-            for field in vector_fields:
-                item[field] = self.storage.emb(item[field])
-            for field in search_fields:
-                item[field] = self.storage.tokenize(item[field])
+            self.pending.append((item, vector_fields, search_fields))
             self.data.append(item)
         return self
 
+    def _record(self, stage: str, items: int, start: float):
+        seconds = time.monotonic() - start
+        self.stats[stage] = {
+            "items": items,
+            "seconds": seconds,
+            "items_per_second": items / seconds if seconds > 0 else float("inf"),
+        }
+
+    def _prepare(self):
+        pending, self.pending = self.pending, []
+        emb_fields = [(item, f) for item, fields, _ in pending for f in fields]
+        search_fields = [(item, f) for item, _, fields in pending for f in fields]
+
+        start = time.monotonic()
+        # the same text is embedded once
+        texts = list(dict.fromkeys(item[f] for item, f in emb_fields))
+        vectors = dict(
+            zip(
+                texts,
+                self.storage.emb_batch(
+                    texts, self.emb_batch_size, self.emb_concurrency
+                ),
+            )
+        )
+        for item, f in emb_fields:
+            item[f] = vectors[item[f]]
+        self._record("emb", len(texts), start)
+
+        start = time.monotonic()
+        tokens = self.storage.tokenize_batch(
+            [item[f] for item, f in search_fields], self.tokenize_workers
+        )
+        for (item, f), v in zip(search_fields, tokens):
+            item[f] = v
+        self._record("tokenize", len(search_fields), start)
+
     def execute(self) -> bool:
-        return self.storage._add(self.data)
+        self.stats = {}
+        self._prepare()
+        start = time.monotonic()
+        v = self.storage._add(self.data)
+        self._record("write", len(self.data), start)
+        logger.info(
+            "WriteBuilder "
+            + ", ".join(
+                f"{stage}: {s['items']} in {s['seconds']:.2f}s ({s['items_per_second']:.0f}/s)"
+                for stage, s in self.stats.items()
+            )
+        )
+        return v
 
 
 class SchemaBuilder:
@@ -455,6 +574,38 @@ class ByzerStorage:
             return self.retrieval.filter(self.cluster_name, search_query)
         return self.retrieval.search(self.cluster_name, search_query)
 
+    def _query_many(
+        self,
+        keywords: List[Optional[str]],
+        vectors: List[List[float]],
+        vector_field: str = None,
+        filters: Dict[str, Any] = None,
+        fields: List[str] = None,
+        sorts: List[Dict[str, str]] = [],
+        limit: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """
+        Searches every (keyword, vector) variant in one request, the results are merged
+        by reciprocal rank fusion.
+        """
+        search_queries = [
+            SearchQuery(
+                database=self.database,
+                table=self.table,
+                keyword=keyword,
+                vector=vector or [],
+                vectorField=vector_field,
+                filters=filters or {},
+                fields=fields or [],
+                sorts=sorts,
+                limit=limit,
+            )
+            for keyword, vector in zip(keywords, vectors)
+        ]
+        return reciprocal_rank_fusion(
+            self.retrieval.search_many(self.cluster_name, search_queries), limit=limit
+        )
+
     def _add(self, data: List[Dict[str, Any]]) -> bool:
         """
         Build index from a list of dictionaries.
@@ -585,16 +736,46 @@ class ByzerStorage:
         return [v[0].output]
 
     def tokenize(self, s: str):
-        seg_list = jieba.cut(s, cut_all=False)
         # return self.llm.apply_sql_func("select mkString(' ',parse(value)) as value",[
         # {"value":s}],url=self.byzer_engine_url)["value"]
-        return " ".join(seg_list)
+        return _tokenize(s)
+
+    def tokenize_batch(self, texts: List[str], workers: int = 1) -> List[str]:
+        """Tokenizes `texts` in a process pool of `workers`, small batches in this process."""
+        if workers <= 1 or len(texts) < TOKENIZE_MIN_PARALLEL:
+            return [self.tokenize(s) for s in texts]
+        chunksize = max(1, len(texts) // (workers * 4))
+        return list(_tokenize_pool(workers).map(_tokenize, texts, chunksize=chunksize))
 
     def emb(self, s: str):
         return self.llm.emb(self.llm.default_emb_model_name, LLMRequest(instruction=s))[
             0
         ].output
 
+    def emb_batch(
+        self, texts: List[str], batch_size: int = 64, concurrency: int = 4
+    ) -> List[List[float]]:
+        """
+        Embeds `texts` with one request per `batch_size` texts, up to `concurrency`
+        requests run at the same time (on different embedding workers).
+        """
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        def run(batch: List[str]) -> List[List[float]]:
+            responses = self.llm.emb(
+                self.llm.default_emb_model_name, LLMRequest(instruction=batch)
+            )
+            return [r.output for r in responses]
+
+        if concurrency <= 1 or len(batches) <= 1:
+            results = [run(batch) for batch in batches]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(concurrency, len(batches))
+            ) as executor:
+                results = list(executor.map(run, batches))
+        return [vector for result in results for vector in result]
+
     def commit(self) -> bool:
         """
         Commit changes to the storage.
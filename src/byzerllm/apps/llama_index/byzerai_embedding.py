@@ -11,7 +11,7 @@ try:
 except ImportError:
     from pydantic import Field, PrivateAttr
 
-from byzerllm.utils.client import ByzerLLM
+from byzerllm.utils.client import ByzerLLM, LLMRequest
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 
 
@@ -47,4 +47,8 @@ class ByzerAIEmbedding(BaseEmbedding):
 
     def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Get text embeddings."""
-        return [self._get_text_embedding(text) for text in texts]
+        # one request for the whole batch, with an emb cache only the misses reach the model
+        responses = self._llm.emb(
+            self._llm.default_emb_model_name, LLMRequest(instruction=list(texts))
+        )
+        return [response.output[0:1024] for response in responses]
@@ -9,20 +9,49 @@ from llama_index.core.storage.kvstore.types import (
 
 from byzerllm.utils.client import ByzerLLM
 from byzerllm.utils.retrieval import ByzerRetrieval
+from byzerllm.utils.retrieval.write_buffer import (
+    DEFAULT_MAX_DELAY,
+    DEFAULT_MAX_ITEMS,
+    DELETED,
+    WriteBehindBuffer,
+)
 from byzerllm.apps.llama_index.simple_retrieval import SimpleRetrieval
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 
 class ByzerAIKVStore(BaseKVStore):
-   
+    """
+    Puts and deletes are buffered and written with one `commit_doc()` per group,
+    when `flush_size` keys are pending, `flush_interval` seconds after the first
+    pending write or on `flush()`. Reads see the buffered writes.
+    """
 
     def __init__(
         self,
         llm:ByzerLLM,
         retrieval:ByzerRetrieval,                
+        flush_size: int = DEFAULT_MAX_ITEMS,
+        flush_interval: float = DEFAULT_MAX_DELAY,
         **kwargs: Any,
     ) -> None:
         self._llm = llm
         self._retrieval = SimpleRetrieval(llm=llm, retrieval=retrieval, **kwargs)
+        self._buffer = WriteBehindBuffer(
+            self._write, max_items=flush_size, max_delay=flush_interval
+        )
+
+    def _write(self, puts: Dict[Tuple[str, str], dict], deletes: List[Tuple[str, str]]) -> None:
+        if puts:
+            self._retrieval.save_doc(data=list(puts.values()), owner=None)
+        keys_by_collection: Dict[str, List[str]] = {}
+        for collection, key in deletes:
+            keys_by_collection.setdefault(collection, []).append(key)
+        for collection, keys in keys_by_collection.items():
+            self._retrieval.delete_docs(keys, collection)
+        self._retrieval.commit_doc()
+
+    def flush(self) -> None:
+        """Write the buffered puts and deletes now."""
+        self._buffer.flush()
 
     def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
         """Put a key-value pair into the store.
@@ -33,13 +62,12 @@ class ByzerAIKVStore(BaseKVStore):
             collection (str): collection name
 
         """             
-        self._retrieval.save_doc(data=[{            
+        self._buffer.put((collection, key), {
             "doc_id":key,
             "json_data":json.dumps(val,ensure_ascii=False),
             "collection":collection,
             "content":"",
-        }],owner=None)
-        self._retrieval.commit_doc()
+        })
 
     async def aput(
         self, key: str, val: dict, collection: str = DEFAULT_COLLECTION
@@ -52,7 +80,7 @@ class ByzerAIKVStore(BaseKVStore):
             collection (str): collection name
 
         """
-        raise asyncfy_with_semaphore(self.put)(key, val, collection)
+        await asyncfy_with_semaphore(self.put)(key, val, collection)
 
     def put_all(
         self,
@@ -67,27 +95,12 @@ class ByzerAIKVStore(BaseKVStore):
             collection (str): collection name
 
         """
-        cur_batch = 0
-        v = []        
-        for key, val in kv_pairs:
-            v.append({            
+        self._buffer.put_many(((collection, key), {
             "doc_id":key,
             "json_data":json.dumps(val,ensure_ascii=False),
             "collection":collection,
             "content":val.get("text",""),
-        })
-            cur_batch += 1
-
-            if cur_batch >= batch_size:
-                cur_batch = 0
-                self._retrieval.save_doc(data=v,owner=None)
-                v.clear()
-
-        if cur_batch > 0:
-            self._retrieval.save_doc(data=v,owner=None)
-
-        self._retrieval.commit_doc()    
-            
+        }) for key, val in kv_pairs)
 
     def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
         """Get a value from the store.
@@ -97,6 +110,9 @@ class ByzerAIKVStore(BaseKVStore):
             collection (str): collection name
 
         """
+        buffered, doc = self._buffer.lookup((collection, key))
+        if buffered:
+            return None if doc is DELETED else json.loads(doc["json_data"])
         doc = self._retrieval.get_doc(doc_id=key,collection = collection)
         val_str = doc["json_data"] if doc else None
         if val_str is None:
@@ -116,11 +132,28 @@ class ByzerAIKVStore(BaseKVStore):
         return asyncfy_with_semaphore(self.get)(key, collection)
 
     def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
-        raise NotImplementedError
+        """Get all values from the store.
+
+        Args:
+            collection (str): collection name
+
+        """
+        result = {
+            doc["doc_id"]: json.loads(doc["json_data"])
+            for doc in self._retrieval.get_docs_by_collection(collection)
+        }
+        for (doc_collection, key), doc in self._buffer.items():
+            if doc_collection != collection:
+                continue
+            if doc is DELETED:
+                result.pop(key, None)
+            else:
+                result[key] = json.loads(doc["json_data"])
+        return result
 
     async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
         """Get all values from the store."""
-        raise NotImplementedError
+        return await asyncfy_with_semaphore(self.get_all)(collection)
 
     def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
         """Delete a value from the store.
@@ -130,7 +163,7 @@ class ByzerAIKVStore(BaseKVStore):
             collection (str): collection name
 
         """
-        self._retrieval.delete_doc(doc_id=key,collection = collection)
+        self._buffer.delete((collection, key))
         return True
 
     async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
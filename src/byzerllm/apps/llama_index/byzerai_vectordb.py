@@ -20,6 +20,12 @@ from llama_index.core.schema import (
 from llama_index.core.vector_stores.utils import node_to_metadata_dict
 from byzerllm.utils.client import ByzerLLM
 from byzerllm.utils.retrieval import ByzerRetrieval
+from byzerllm.utils.retrieval.write_buffer import (
+    DEFAULT_MAX_DELAY,
+    DEFAULT_MAX_ITEMS,
+    DELETED,
+    WriteBehindBuffer,
+)
 from byzerllm.apps.llama_index.simple_retrieval import SimpleRetrieval
 
 logger = logging.getLogger(__name__)
@@ -71,6 +77,12 @@ def metadata_dict_to_node(metadata: dict, text: Optional[str] = None) -> BaseNod
     return node
 
 class ByzerAIVectorStore(VectorStore):    
+    """
+    Added and deleted chunks are buffered and written with one `commit_chunk()` per
+    group, when `flush_size` chunks are pending, `flush_interval` seconds after the
+    first pending write or on `flush()`. `get` sees the buffered chunks and `query`
+    flushes first.
+    """
     
     stores_text: bool = True       
 
@@ -79,10 +91,30 @@ class ByzerAIVectorStore(VectorStore):
         llm:ByzerLLM,
         retrieval:ByzerRetrieval,
         chunk_collection: Optional[str] = "default",                                                   
+        flush_size: int = DEFAULT_MAX_ITEMS,
+        flush_interval: float = DEFAULT_MAX_DELAY,
         **kwargs: Any,
     ) -> None:        
         self._llm = llm
         self._retrieval = SimpleRetrieval(llm=llm, retrieval=retrieval,chunk_collection=chunk_collection,**kwargs)        
+        # keyed by the chunk `_id` in the store
+        self._buffer = WriteBehindBuffer(
+            self._write, max_items=flush_size, max_delay=flush_interval
+        )
+
+    def _chunk_id(self, node_id: str) -> str:
+        return f"{self._retrieval.chunk_collection}/{node_id}"
+
+    def _write(self, puts: Dict[str, dict], deletes: List[str]) -> None:
+        if puts:
+            self._retrieval.save_chunks(list(puts.values()))
+        if deletes:
+            self._retrieval.delete_chunk_by_ids(deletes, commit=False)
+        self._retrieval.commit_chunk()
+
+    def flush(self) -> None:
+        """Write the buffered chunks and deletes now."""
+        self._buffer.flush()
         
 
     @property
@@ -92,6 +124,10 @@ class ByzerAIVectorStore(VectorStore):
 
     def get(self, text_id: str) -> List[float]:
         """Get embedding."""
+        for chunk_id in (text_id, self._chunk_id(text_id)):
+            buffered, chunk = self._buffer.lookup(chunk_id)
+            if buffered:
+                return [] if chunk is DELETED else chunk["chunk_embedding"]
         v = self._retrieval.get_chunk_by_id(text_id)
         if len(v) == 0:
             return []
@@ -105,7 +141,6 @@ class ByzerAIVectorStore(VectorStore):
     ) -> List[str]:
         """Add nodes to index."""
         v = []
-        count = 0
         for node in nodes:                        
             metadata = node_to_metadata_dict(
                 node, remove_text=True, flat_metadata=False
@@ -119,9 +154,8 @@ class ByzerAIVectorStore(VectorStore):
                 "chunk_content": node.get_content(),
                 "owner":""                
             }
-            v.append(m)          
-        self._retrieval.save_chunks(v) 
-        self._retrieval.commit_chunk()
+            v.append((self._chunk_id(node.node_id), m))          
+        self._buffer.put_many(v)
         
         return [node.node_id for node in nodes]
 
@@ -132,9 +166,13 @@ class ByzerAIVectorStore(VectorStore):
             ref_doc_id (str): The doc_id of the document to delete.
 
         """        
+        buffered = [
+            chunk_id
+            for chunk_id, chunk in self._buffer.items()
+            if chunk is not DELETED and chunk["ref_doc_id"] == ref_doc_id
+        ]
         chunks = self._retrieval.get_chunks_by_docid(ref_doc_id)        
-        self._retrieval.delete_by_ids([chunk["_id"] for chunk in chunks])
-        self._retrieval.commit_chunk()    
+        self._buffer.delete_many(buffered + [chunk["_id"] for chunk in chunks])
         
 
     def query(
@@ -143,7 +181,7 @@ class ByzerAIVectorStore(VectorStore):
         **kwargs: Any,
     ) -> VectorStoreQueryResult:
         """Get nodes for response."""
-             
+        self.flush()
         
         query_embedding = cast(List[float], query.query_embedding)
         chunks = self._retrieval.search_content_chunks(owner="default",
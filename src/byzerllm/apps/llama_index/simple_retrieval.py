@@ -6,6 +6,7 @@ from byzerllm.utils.retrieval import ByzerRetrieval
 import time
 from byzerllm.utils.client import LLMHistoryItem, LLMRequest
 from byzerllm.utils.retrieval import TableSettings, SearchQuery
+from byzerllm.utils.retrieval.fusion import reciprocal_rank_fusion
 import uuid
 import json
 from langchain_core.prompts import PromptTemplate
@@ -151,6 +152,58 @@ field(created_time,long,sort)
         limit: int = 4,
         return_json: bool = True,
     ):
+        query = self._content_chunks_query(query_str, query_embedding, doc_ids, limit)
+        docs = self.retrieval.search(self.retrieval_cluster, [query])
+
+        if return_json:
+            context = json.dumps(
+                [{"content": x["raw_chunk"]} for x in docs],
+                ensure_ascii=False,
+                indent=4,
+            )
+            return context
+        else:
+            return docs
+
+    def search_content_chunks_many(
+        self,
+        owner: str,
+        query_strs: List[str],
+        doc_ids: Optional[List[str]] = None,
+        limit: int = 4,
+        return_json: bool = True,
+    ):
+        """
+        Searches the chunks with several variants of a query (e.g. rewrites or sub
+        questions): the variants are embedded in one call, searched in one request and
+        their results merged by reciprocal rank fusion, each chunk once.
+        """
+        embeddings = self.emb_many(query_strs)
+        queries = [
+            self._content_chunks_query(q, embedding or None, doc_ids, limit)
+            for q, embedding in zip(query_strs, embeddings)
+        ]
+        docs = reciprocal_rank_fusion(
+            self.retrieval.search_many(self.retrieval_cluster, queries), limit=limit
+        )
+
+        if return_json:
+            context = json.dumps(
+                [{"content": x["raw_chunk"]} for x in docs],
+                ensure_ascii=False,
+                indent=4,
+            )
+            return context
+        else:
+            return docs
+
+    def _content_chunks_query(
+        self,
+        query_str: Optional[str],
+        query_embedding: Optional[List[float]],
+        doc_ids: Optional[List[str]],
+        limit: int,
+    ) -> SearchQuery:
         keyword = None
         fields = []
         vector = []
@@ -172,7 +225,7 @@ field(created_time,long,sort)
                 {"or": [{"field": "doc_id", "value": x} for x in doc_ids]}
             )
 
-        query = SearchQuery(
+        return SearchQuery(
             self.retrieval_db,
             "text_content_chunk",
             filters=filters,
@@ -183,18 +236,6 @@ field(created_time,long,sort)
             limit=limit,
         )
 
-        docs = self.retrieval.search(self.retrieval_cluster, [query])
-
-        if return_json:
-            context = json.dumps(
-                [{"content": x["raw_chunk"]} for x in docs],
-                ensure_ascii=False,
-                indent=4,
-            )
-            return context
-        else:
-            return docs
-
     def search_content_by_filename(self, filename: str, collection: str):
         filters = [{"field": "chunk_collection", "value": collection}]
         docs = self.retrieval.search(
@@ -223,6 +264,59 @@ field(created_time,long,sort)
         limit: int = 4,
         return_json: bool = True,
     ):
+        query = self._content_query(
+            q, self.emb(q) if q else [], owner, url, auth_tag, limit
+        )
+        docs = self.retrieval.search(self.retrieval_cluster, [query])
+
+        if return_json:
+            context = json.dumps(
+                [{"content": x["raw_content"]} for x in docs],
+                ensure_ascii=False,
+                indent=4,
+            )
+            return context
+        else:
+            return docs
+
+    def search_content_many(
+        self,
+        qs: List[str],
+        owner: str,
+        url: str,
+        auth_tag: str = None,
+        limit: int = 4,
+        return_json: bool = True,
+    ):
+        """`search_content` with several variants of a query, see `search_content_chunks_many`."""
+        embeddings = self.emb_many(qs)
+        queries = [
+            self._content_query(q, embedding, owner, url, auth_tag, limit)
+            for q, embedding in zip(qs, embeddings)
+        ]
+        docs = reciprocal_rank_fusion(
+            self.retrieval.search_many(self.retrieval_cluster, queries), limit=limit
+        )
+
+        if return_json:
+            context = json.dumps(
+                [{"content": x["raw_content"]} for x in docs],
+                ensure_ascii=False,
+                indent=4,
+            )
+            return context
+        else:
+            return docs
+
+    def _content_query(
+        self,
+        q: Optional[str],
+        vector: List[float],
+        owner: str,
+        url: str,
+        auth_tag: Optional[str],
+        limit: int,
+    ) -> SearchQuery:
         filters = [self._owner_filter(owner)]
 
         if auth_tag:
@@ -235,7 +329,6 @@ field(created_time,long,sort)
 
         if q:
             keyword = self.search_tokenize(q)
-            vector = self.emb(q)
             vectorField = "content_vector"
             fields = ["content"]
         else:
@@ -244,32 +337,17 @@ field(created_time,long,sort)
             vectorField = None
             fields = []
 
-        docs = self.retrieval.search(
-            self.retrieval_cluster,
-            [
-                SearchQuery(
-                    self.retrieval_db,
-                    "text_content",
-                    filters={"and": filters},
-                    keyword=keyword,
-                    fields=fields,
-                    vector=vector,
-                    vectorField=vectorField,
-                    limit=limit,
-                )
-            ],
+        return SearchQuery(
+            self.retrieval_db,
+            "text_content",
+            filters={"and": filters},
+            keyword=keyword,
+            fields=fields,
+            vector=vector,
+            vectorField=vectorField,
+            limit=limit,
         )
 
-        if return_json:
-            context = json.dumps(
-                [{"content": x["raw_content"]} for x in docs],
-                ensure_ascii=False,
-                indent=4,
-            )
-            return context
-        else:
-            return docs
-
     def get_chunk_by_id(self, chunk_id: str):
         filters = {"and": [{"field": "_id", "value": chunk_id}]}
         docs = self.retrieval.filter(
@@ -307,11 +385,12 @@ field(created_time,long,sort)
         )
         return docs
 
-    def delete_chunk_by_ids(self, chunk_ids: List[str]):
+    def delete_chunk_by_ids(self, chunk_ids: List[str], commit: bool = True):
         self.retrieval.delete_by_ids(
             self.retrieval_cluster, self.retrieval_db, "text_content_chunk", chunk_ids
         )
-        self.retrieval.commit(self.retrieval_cluster, self.retrieval_db)
+        if commit:
+            self.commit_chunk()
 
     def save_chunks(self, chunks: List[Dict[str, Any]]):
         text_content_chunks = []
@@ -369,6 +448,37 @@ field(created_time,long,sort)
         )
         return docs[0] if docs else None
 
+    def get_docs_by_collection(self, collection: str, limit: int = 100000):
+        # filter has no offset, a full page means there may be more docs: ask again with a
+        # doubled limit until the result is not cut
+        while True:
+            docs = self.retrieval.filter(
+                self.retrieval_cluster,
+                [
+                    SearchQuery(
+                        self.retrieval_db,
+                        "text_content",
+                        filters={"and": [{"field": "collection", "value": collection}]},
+                        keyword=None,
+                        fields=[],
+                        vector=[],
+                        vectorField=None,
+                        limit=limit,
+                    )
+                ],
+            )
+            if len(docs) < limit:
+                return docs
+            limit *= 2
+
+    def delete_docs(self, doc_ids: List[str], collection: str):
+        self.retrieval.delete_by_ids(
+            self.retrieval_cluster,
+            self.retrieval_db,
+            "text_content",
+            [f"{collection}/{doc_id}" for doc_id in doc_ids],
+        )
+
     @DeprecationWarning
     def delete_doc(self, doc_ids: List[str], collection: str):
         ids = []
@@ -444,6 +554,21 @@ field(created_time,long,sort)
             0
         ].output
 
+    def emb_many(self, texts: List[str]) -> List[List[float]]:
+        """The embeddings of `texts` from one request, empty texts get no vector."""
+        non_empty = [s for s in texts if s]
+        vectors = iter(
+            [
+                r.output
+                for r in self.llm.emb(
+                    self.llm.default_emb_model_name, LLMRequest(instruction=non_empty)
+                )
+            ]
+            if non_empty
+            else []
+        )
+        return [next(vectors) if s else [] for s in texts]
+
     def split_text_into_chunks(self, s: str):
         # self.llm.apply_sql_func(
         #     '''select llm_split(value,array(",","。","\n"),1600) as value ''',[{"value":content}],
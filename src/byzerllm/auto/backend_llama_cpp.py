@@ -15,7 +15,9 @@ from byzerllm.utils.types import (
     BlockVLLMStreamServer,   
     StreamOutputs,
     SingleOutput,
-    SingleOutputMeta,    
+    SingleOutputMeta,
+    create_stream_server,
+    get_stream_server,
 )
 
 
@@ -96,13 +98,7 @@ class LlamaCppBackend:
             "support_stream": True,            
         }
 
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER") 
-        except ValueError:  
-            try:          
-                ray.remote(BlockVLLMStreamServer).options(name="BLOCK_VLLM_STREAM_SERVER",lifetime="detached",max_concurrency=1000).remote()
-            except Exception as e:
-                print(f"create BlockVLLMStreamServer error:{e}",flush=True)                
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
 
 
     def get_meta(self):
@@ -157,12 +153,11 @@ class LlamaCppBackend:
 
         stream = kwargs.get("stream",False)
         
-        server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
+        server = get_stream_server("BLOCK_VLLM_STREAM_SERVER")
         request_id = [None]
         
         def writer():
             try:
-                r = ""       
                 response = self.model.create_chat_completion_openai_v1(
                                     messages=messages,                                    
                                     stream=True, 
@@ -174,7 +169,6 @@ class LlamaCppBackend:
 
                 for chunk in response:                                                              
                     content = chunk.choices[0].delta.content or ""
-                    r += content        
                     if hasattr(chunk,"usage"):
                         input_tokens_count = chunk.usage.prompt_tokens
                         generated_tokens_count = chunk.usage.completion_tokens
@@ -182,10 +176,10 @@ class LlamaCppBackend:
                         input_tokens_count = 0
                         generated_tokens_count = 0
                     ray.get(server.add_item.remote(request_id[0], 
-                                                    StreamOutputs(outputs=[SingleOutput(text=r,metadata=SingleOutputMeta(
+                                                    StreamOutputs(outputs=[SingleOutput(text=content,metadata=SingleOutputMeta(
                                                         input_tokens_count=input_tokens_count,
                                                         generated_tokens_count=generated_tokens_count,
-                                                    ))])
+                                                    ))],delta=True)
                                                     ))                                                   
             except:
                 traceback.print_exc()            
@@ -206,7 +200,7 @@ class LlamaCppBackend:
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})]
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER","stream_server_shards":server.num_shards}})]
         else:
             try:
                 start_time = time.monotonic()
@@ -45,7 +45,11 @@ from transformers import (
     StoppingCriteriaList,
     GenerationConfig,
 )
-from byzerllm.utils.types import StopSequencesCriteria
+from byzerllm.utils.types import (
+    StopSequencesCriteria,
+    create_stream_server,
+    get_stream_server,
+)
 from ray.util.client.common import ClientActorHandle
 
 
@@ -199,25 +203,29 @@ async def async_vllm_chat(
     current_time_milliseconds = int(time.time() * 1000)
 
     if stream:
-        server = ray.get_actor("VLLM_STREAM_SERVER")
+        server = get_stream_server("VLLM_STREAM_SERVER")
 
         async def writer():
             results_generator = model.generate(
                 ins, sampling_params, request_id, lora_request=lora_request
             )
+            # vLLM reports the accumulated text, only ship what is new since the last chunk
+            sent_lengths = {}
             async for request_output in results_generator:
-                v = StreamOutputs(
-                    outputs=[
+                outputs = []
+                for index, item in enumerate(request_output.outputs):
+                    sent = sent_lengths.get(index, 0)
+                    sent_lengths[index] = len(item.text)
+                    outputs.append(
                         SingleOutput(
-                            text=item.text,
+                            text=item.text[sent:],
                             metadata=SingleOutputMeta(
                                 input_tokens_count=len(request_output.prompt_token_ids),
                                 generated_tokens_count=len(item.token_ids),
                             ),
                         )
-                        for item in request_output.outputs
-                    ]
-                )
+                    )
+                v = StreamOutputs(outputs=outputs, delta=True)
                 await server.add_item.remote(request_output.request_id, v)
             # mark the request is done
             await server.mark_done.remote(request_output.request_id)
@@ -231,6 +239,7 @@ async def async_vllm_chat(
                     "metadata": {
                         "request_id": request_id,
                         "stream_server": "VLLM_STREAM_SERVER",
+                        "stream_server_shards": server.num_shards,
                     }
                 },
             )
@@ -302,15 +311,7 @@ def from_vllm_backend(
     global INFERENCE_NAME
     INFERENCE_NAME = infer_params.get("udfName", "auto")
 
-    try:
-        ray.get_actor("VLLM_STREAM_SERVER")
-    except ValueError:
-        try:
-            ray.remote(VLLMStreamServer).options(
-                name="VLLM_STREAM_SERVER", lifetime="detached", max_concurrency=1000
-            ).remote()
-        except Exception as e:
-            print(f"create VLLM_STREAM_SERVER error:{e}", flush=True)
+    create_stream_server(VLLMStreamServer, "VLLM_STREAM_SERVER")
 
     worker_use_ray: bool = get_bool(infer_params, "backend.worker_use_ray", True)
 
@@ -4,7 +4,7 @@ import jinja2
 import yaml
 import subprocess
 from typing import List, Optional
-from byzerllm.utils.client import ByzerLLM, InferBackend
+from byzerllm.utils.client import ByzerLLM, AsyncByzerLLM, InferBackend
 from byzerllm.utils.client.types import Templates
 from byzerllm.apps.byzer_storage.command import StorageSubCommand
 from byzerllm.utils.client.entrypoints.openai.serve import serve, ServerArgs
@@ -217,7 +217,7 @@ def main(input_args: Optional[List[str]] = None):
 
     elif args.command == "serve":
         byzerllm.connect_cluster(address=args.ray_address)
-        llm_client = ByzerLLM()
+        llm_client = AsyncByzerLLM()
         if args.served_model_name:
             llm_client.setup_template(args.served_model_name, get_llm_template(args.template))
         server_args = ServerArgs(
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from .utils import print_flush
+
+DEFAULT_MODEL_CACHE_DIR = os.environ.get(
+    "BYZERLLM_MODEL_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".byzerllm", "model_cache"),
+)
+
+
+def dir_fingerprint(path: str) -> str:
+    """A hash of the file names, sizes and modification times under `path`."""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            h.update(os.path.relpath(file_path, path).encode("utf-8"))
+            h.update(f"\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def model_cache_key(model_path: str) -> str:
+    """The cache key of a model directory: its real path and the fingerprint of its content."""
+    real_path = os.path.realpath(model_path)
+    return hashlib.sha256(
+        f"{real_path}\0{dir_fingerprint(real_path)}".encode("utf-8")
+    ).hexdigest()
+
+
+class ModelCache:
+    """
+    A node local, content addressed cache of model directories, shared by all the
+    workers (and deployments) on the node.
+
+    An entry is a directory `<root>/<key>` which is filled once, under a file lock so that
+    workers starting at the same time wait for the first one, and published by a rename,
+    so it is either complete or absent. Reusing an entry only updates its modification
+    time, which `evict` uses to drop the least recently used entries.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or DEFAULT_MODEL_CACHE_DIR
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_of(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    @contextmanager
+    def _lock(self, key: str):
+        import fcntl
+
+        with open(os.path.join(self.root, f".{key}.lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_of(key)
+        if not os.path.isdir(path):
+            return None
+        os.utime(path)
+        return path
+
+    def get_or_create(self, key: str, fill: Callable[[str], Any]) -> str:
+        """The directory of `key`, `fill(path)` creates it when it is not cached yet."""
+        path = self.get(key)
+        if path is not None:
+            return path
+        with self._lock(key):
+            path = self.get(key)
+            if path is not None:
+                return path
+            path = self.path_of(key)
+            part = os.path.join(self.root, f".{key}.{uuid.uuid4().hex}.part")
+            try:
+                fill(part)
+                os.rename(part, path)
+            except BaseException:
+                shutil.rmtree(part, ignore_errors=True)
+                raise
+        return path
+
+    def cache_model_dir(self, model_path: str, key: Optional[str] = None) -> str:
+        """
+        A node local copy of the model directory `model_path`, e.g. of a shared file system.
+        `key` is its `model_cache_key` when the caller computed it already.
+        """
+        start = time.monotonic()
+        path = self.get_or_create(
+            key or model_cache_key(model_path),
+            lambda part: shutil.copytree(model_path, part, symlinks=True),
+        )
+        print_flush(
+            f"[ModelCache] {model_path} -> {path} in {time.monotonic() - start:.1f}s"
+        )
+        return path
+
+    def restore_from_ob(self, cache_key: str, udf_name: str, model_refs: List[Any]) -> str:
+        """The model stored in the object store as `model_refs`, `cache_key` identifies its version."""
+        from .store import transfer_from_ob
+
+        key = hashlib.sha256(f"object_store\0{cache_key}".encode("utf-8")).hexdigest()
+        return self.get_or_create(
+            key, lambda part: transfer_from_ob(udf_name, model_refs, part)
+        )
+
+    def entries(self) -> List[Dict[str, Any]]:
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            size = 0
+            for root, _, files in os.walk(path):
+                size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+            entries.append(
+                {"key": name, "path": path, "bytes": size, "last_used": os.path.getmtime(path)}
+            )
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+    def evict(self, max_bytes: int) -> List[str]:
+        """Removes the least recently used entries until the cache holds at most `max_bytes`."""
+        entries = self.entries()
+        total = sum(entry["bytes"] for entry in entries)
+        removed = []
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            with self._lock(entry["key"]):
+                shutil.rmtree(entry["path"], ignore_errors=True)
+            total -= entry["bytes"]
+            removed.append(entry["key"])
+        return removed
@@ -1,7 +1,7 @@
 import time
 from typing import List, Tuple, Dict, Any, Union
 import ray
-from byzerllm.utils.types import BlockVLLMStreamServer, StreamOutputs, SingleOutput, SingleOutputMeta, BlockBinaryStreamServer
+from byzerllm.utils.types import BlockVLLMStreamServer, StreamOutputs, SingleOutput, SingleOutputMeta, BlockBinaryStreamServer, create_stream_server, get_stream_server
 import threading
 import asyncio
 import traceback
@@ -41,20 +41,8 @@ class CustomSaasAPI:
             "model_name": "azure_tts",
         }
 
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        except ValueError:
-            try:
-                ray.remote(BlockVLLMStreamServer).options(name="BLOCK_VLLM_STREAM_SERVER", lifetime="detached", max_concurrency=1000).remote()
-            except Exception as e:
-                pass
-        try:
-            ray.get_actor("BlockBinaryStreamServer")
-        except ValueError:
-            try:
-                ray.remote(BlockBinaryStreamServer).options(name="BlockBinaryStreamServer", lifetime="detached", max_concurrency=1000).remote()
-            except Exception as e:
-                pass
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
+        create_stream_server(BlockBinaryStreamServer, "BlockBinaryStreamServer")
 
     def get_meta(self):
         return [self.meta]
@@ -132,7 +120,7 @@ class CustomSaasAPI:
                 "speed": 0,
             }})]
         else:
-            server = ray.get_actor("BlockBinaryStreamServer")
+            server = get_stream_server("BlockBinaryStreamServer")
             
             def writer():
                 request_id[0] = str(uuid.uuid4())
@@ -153,7 +141,7 @@ class CustomSaasAPI:
                                                                                                               metadata=SingleOutputMeta(
                                         input_tokens_count=0,
                                         generated_tokens_count=0,
-                                    ))])
+                                    ))],delta=True)
                                 ))
                             filled_size = pull_stream.read(audio_buffer)                                                                                                    
                     else:
@@ -177,7 +165,7 @@ class CustomSaasAPI:
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
 
             await asyncio.to_thread(write_running)
-            return [("", {"metadata": {"request_id": request_id[0], "stream_server": "BlockBinaryStreamServer"}})]
+            return [("", {"metadata": {"request_id": request_id[0], "stream_server":"BlockBinaryStreamServer","stream_server_shards":server.num_shards}})]
             
 
     def speech_to_text(self, ins: str, **kwargs):
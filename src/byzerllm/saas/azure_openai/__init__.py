@@ -16,6 +16,8 @@ from byzerllm.utils.types import (
     SingleOutput,
     SingleOutputMeta,
     BlockBinaryStreamServer,
+    create_stream_server,
+    get_stream_server,
 )
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 import threading
@@ -49,28 +51,8 @@ class CustomSaasAPI:
         }
 
         self.meta["embedding_mode"] = "embedding" in self.model.lower()
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        except ValueError:
-            try:
-                ray.remote(BlockVLLMStreamServer).options(
-                    name="BLOCK_VLLM_STREAM_SERVER",
-                    lifetime="detached",
-                    max_concurrency=1000,
-                ).remote()
-            except Exception as e:
-                pass
-        try:
-            ray.get_actor("BlockBinaryStreamServer")
-        except ValueError:
-            try:
-                ray.remote(BlockBinaryStreamServer).options(
-                    name="BlockBinaryStreamServer",
-                    lifetime="detached",
-                    max_concurrency=1000,
-                ).remote()
-            except Exception as e:
-                pass
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
+        create_stream_server(BlockBinaryStreamServer, "BlockBinaryStreamServer")
 
     # saas/proprietary
     def get_meta(self):
@@ -176,7 +158,7 @@ class CustomSaasAPI:
         self, stream: bool, ins: str, voice: str, chunk_size: int = None, **kwargs
     ):
         if stream:
-            server = ray.get_actor("BlockBinaryStreamServer")
+            server = get_stream_server("BlockBinaryStreamServer")
             request_id = [None]
 
             def writer():
@@ -200,7 +182,8 @@ class CustomSaasAPI:
                                                     generated_tokens_count=generated_tokens_count,
                                                 ),
                                             )
-                                        ]
+                                        ],
+                                        delta=True,
                                     ),
                                 )
                             )
@@ -229,6 +212,7 @@ class CustomSaasAPI:
                         "metadata": {
                             "request_id": request_id[0],
                             "stream_server": "BlockBinaryStreamServer",
+                            "stream_server_shards": server.num_shards,
                         }
                     },
                 )
@@ -418,12 +402,11 @@ class CustomSaasAPI:
                 audio_data = f"data:audio/${tpe};base64," + audio_data
             return await self.async_speech_to_text(audio=audio_data)
 
-        server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
+        server = get_stream_server("BLOCK_VLLM_STREAM_SERVER")
         request_id = [None]
 
         def writer():
             try:
-                r = ""
                 response = self.client.chat.completions.create(
                     messages=messages,
                     model=model,
@@ -439,7 +422,6 @@ class CustomSaasAPI:
 
                 for chunk in response:
                     content = chunk.choices[0].delta.content or ""
-                    r += content
                     if hasattr(chunk, "usage") and chunk.usage:
                         input_tokens_count = chunk.usage.prompt_tokens
                         generated_tokens_count = chunk.usage.completion_tokens
@@ -452,13 +434,14 @@ class CustomSaasAPI:
                             StreamOutputs(
                                 outputs=[
                                     SingleOutput(
-                                        text=r,
+                                        text=content,
                                         metadata=SingleOutputMeta(
                                             input_tokens_count=input_tokens_count,
                                             generated_tokens_count=generated_tokens_count,
                                         ),
                                     )
-                                ]
+                                ],
+                                delta=True,
                             ),
                         )
                     )
@@ -488,6 +471,7 @@ class CustomSaasAPI:
                         "metadata": {
                             "request_id": request_id[0],
                             "stream_server": "BLOCK_VLLM_STREAM_SERVER",
+                            "stream_server_shards": server.num_shards,
                         }
                     },
                 )
@@ -12,6 +12,8 @@ from byzerllm.utils.types import (
     StreamOutputs,
     SingleOutput,
     SingleOutputMeta,
+    create_stream_server,
+    get_stream_server,
 )
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 
@@ -33,17 +35,7 @@ class CustomSaasAPI:
 
         self.client = Anthropic(api_key=self.api_key, **other_params)
 
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        except ValueError:
-            try:
-                ray.remote(BlockVLLMStreamServer).options(
-                    name="BLOCK_VLLM_STREAM_SERVER",
-                    lifetime="detached",
-                    max_concurrency=1000,
-                ).remote()
-            except:
-                pass
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
 
     # saas/proprietary
     def get_meta(self):
@@ -183,12 +175,11 @@ class CustomSaasAPI:
             raise e
 
         if stream:
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER")
             request_id = [None]
 
             def writer():
                 input_tokens = 0
-                r = ""
                 for response in res_data:
 
                     if response.type == "message_start":
@@ -197,19 +188,19 @@ class CustomSaasAPI:
 
                     if response.type == "content_block_delta":
                         v = response.delta.text
-                        r += v
                         server.add_item.remote(
                             request_id[0],
                             StreamOutputs(
                                 outputs=[
                                     SingleOutput(
-                                        text=r,
+                                        text=v,
                                         metadata=SingleOutputMeta(
                                             input_tokens_count=0,
                                             generated_tokens_count=0,
                                         ),
                                     )
-                                ]
+                                ],
+                                delta=True,
                             ),
                         )
                     if response.type == "message_delta":
@@ -218,13 +209,14 @@ class CustomSaasAPI:
                             StreamOutputs(
                                 outputs=[
                                     SingleOutput(
-                                        text=r,
+                                        text="",
                                         metadata=SingleOutputMeta(
                                             input_tokens_count=input_tokens,
                                             generated_tokens_count=response.usage.output_tokens,
                                         ),
                                     )
-                                ]
+                                ],
+                                delta=True,
                             ),
                         )
 
@@ -251,6 +243,7 @@ class CustomSaasAPI:
                         "metadata": {
                             "request_id": request_id[0],
                             "stream_server": "BLOCK_VLLM_STREAM_SERVER",
+                            "stream_server_shards": server.num_shards,
                         }
                     },
                 )
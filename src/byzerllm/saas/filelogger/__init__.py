@@ -12,6 +12,8 @@ from byzerllm.utils.types import (
     SingleOutput,
     SingleOutputMeta,
     BlockBinaryStreamServer,
+    create_stream_server,
+    get_stream_server,
 )
 
 
@@ -25,28 +27,8 @@ class CustomSaasAPI:
             "support_stream": True,
             "model_name": "filelogger",
         }
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        except ValueError:
-            try:
-                ray.remote(BlockVLLMStreamServer).options(
-                    name="BLOCK_VLLM_STREAM_SERVER",
-                    lifetime="detached",
-                    max_concurrency=1000,
-                ).remote()
-            except Exception as e:
-                pass
-        try:
-            ray.get_actor("BlockBinaryStreamServer")
-        except ValueError:
-            try:
-                ray.remote(BlockBinaryStreamServer).options(
-                    name="BlockBinaryStreamServer",
-                    lifetime="detached",
-                    max_concurrency=1000,
-                ).remote()
-            except Exception as e:
-                pass
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
+        create_stream_server(BlockBinaryStreamServer, "BlockBinaryStreamServer")
 
     def process_input(self, ins: Union[str, List[Dict[str, Any]], Dict[str, Any]]):
 
@@ -160,14 +142,14 @@ class CustomSaasAPI:
         if not stream:
             return await self.chat_oai(messages, **kwargs)
 
-        server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
+        server = get_stream_server("BLOCK_VLLM_STREAM_SERVER")
         request_id = str(uuid.uuid4())
 
         async def writer():
             try:
                 message = "Messages logged successfully"
                 for i in range(len(message)):
-                    chunk = message[: i + 1]
+                    chunk = message[i]
                     await server.add_item.remote(
                         request_id,
                         StreamOutputs(
@@ -179,7 +161,8 @@ class CustomSaasAPI:
                                         generated_tokens_count=i + 1,
                                     ),
                                 )
-                            ]
+                            ],
+                            delta=True,
                         ),
                     )
                 await server.mark_done.remote(request_id)
@@ -197,6 +180,7 @@ class CustomSaasAPI:
                     "metadata": {
                         "request_id": request_id,
                         "stream_server": "BLOCK_VLLM_STREAM_SERVER",
+                        "stream_server_shards": server.num_shards,
                     }
                 },
             )
@@ -7,7 +7,7 @@ import ray
 
 from byzerllm.utils import random_uuid
 from byzerllm.log import init_logger
-from byzerllm.utils.types import BlockVLLMStreamServer, StreamOutputs, SingleOutput, SingleOutputMeta
+from byzerllm.utils.types import BlockVLLMStreamServer, StreamOutputs, SingleOutput, SingleOutputMeta, create_stream_server, get_stream_server
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 
 logger = init_logger(__name__)
@@ -28,10 +28,7 @@ class CustomSaasAPI:
         # qianfan.SK(self.secret_key)
         self.model: str = infer_params.get("saas.model", "ERNIE-Bot-turbo")
         self.client = qianfan.ChatCompletion(ak=self.api_key, sk=self.secret_key, access_token=self.access_token)
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        except ValueError:            
-            ray.remote(BlockVLLMStreamServer).options(name="BLOCK_VLLM_STREAM_SERVER",lifetime="detached",max_concurrency=1000).remote() 
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
 
      # saas/proprietary
     def get_meta(self):
@@ -99,7 +96,7 @@ class CustomSaasAPI:
         ))()
         
         if stream:
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER")
             request_id = [None]
 
             def writer(): 
@@ -129,7 +126,7 @@ class CustomSaasAPI:
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})] 
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER","stream_server_shards":server.num_shards}})] 
 
         time_cost = time.monotonic() - start_time
 
@@ -4,7 +4,7 @@ import dashscope
 from dashscope.api_entities.dashscope_response import Message
 import time
 import ray
-from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta
+from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,create_stream_server,get_stream_server
 import threading
 import asyncio
 from byzerllm.utils.langutil import asyncfy_with_semaphore
@@ -21,13 +21,7 @@ class CustomSaasAPI:
         
         self.meta["embedding_mode"] = "embedding"  in  self.model.lower()
 
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        except ValueError: 
-            try:           
-                ray.remote(BlockVLLMStreamServer).options(name="BLOCK_VLLM_STREAM_SERVER",lifetime="detached",max_concurrency=1000).remote()     
-            except Exception:
-                pass
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
 
      # saas/proprietary
     def get_meta(self):
@@ -100,7 +94,7 @@ class CustomSaasAPI:
         
         if stream:
             
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER")
             request_id = [None]
 
             def writer(): 
@@ -136,7 +130,7 @@ class CustomSaasAPI:
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})]  
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER","stream_server_shards":server.num_shards}})]  
               
         time_cost = time.monotonic() - start_time
         
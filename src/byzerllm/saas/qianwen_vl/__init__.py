@@ -4,7 +4,7 @@ import dashscope
 from dashscope.api_entities.dashscope_response import MultiModalConversationResponse
 import time
 import ray
-from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta
+from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,create_stream_server,get_stream_server
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 import threading
 import asyncio
@@ -23,10 +23,7 @@ class CustomSaasAPI:
             "support_stream": True
         }
         
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER") 
-        except ValueError:            
-            ray.remote(BlockVLLMStreamServer).options(name="BLOCK_VLLM_STREAM_SERVER",lifetime="detached",max_concurrency=1000).remote()
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
 
      # saas/proprietary
     def get_meta(self):
@@ -72,7 +69,7 @@ class CustomSaasAPI:
                                             **other_params))()
         
         if stream:            
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER")
             request_id = [None]
 
             def writer(): 
@@ -108,7 +105,7 @@ class CustomSaasAPI:
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})]
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER","stream_server_shards":server.num_shards}})]
               
         time_cost = time.monotonic() - start_time
         
@@ -13,6 +13,8 @@ from byzerllm.utils.types import (
     SingleOutput,
     SingleOutputMeta,
     BlockBinaryStreamServer,
+    create_stream_server,
+    get_stream_server,
 )
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 import threading
@@ -37,28 +39,8 @@ class CustomSaasAPI:
             "model_name": self.model,
         }
 
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        except ValueError:
-            try:
-                ray.remote(BlockVLLMStreamServer).options(
-                    name="BLOCK_VLLM_STREAM_SERVER",
-                    lifetime="detached",
-                    max_concurrency=1000,
-                ).remote()
-            except Exception as e:
-                pass
-        try:
-            ray.get_actor("BlockBinaryStreamServer")
-        except ValueError:
-            try:
-                ray.remote(BlockBinaryStreamServer).options(
-                    name="BlockBinaryStreamServer",
-                    lifetime="detached",
-                    max_concurrency=1000,
-                ).remote()
-            except Exception as e:
-                pass
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
+        create_stream_server(BlockBinaryStreamServer, "BlockBinaryStreamServer")
 
     def get_meta(self):
         return [self.meta]
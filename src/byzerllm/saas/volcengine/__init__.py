@@ -5,7 +5,7 @@ import base64
 import io    
 import json
 import ray
-from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,BlockBinaryStreamServer
+from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,BlockBinaryStreamServer,create_stream_server,get_stream_server
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 import threading
 import asyncio
@@ -35,20 +35,8 @@ class CustomSaasAPI:
             "model_name": self.model,
         }
 
-        try:
-            ray.get_actor("BLOCK_VLLM_STREAM_SERVER") 
-        except ValueError:  
-            try:          
-                ray.remote(BlockVLLMStreamServer).options(name="BLOCK_VLLM_STREAM_SERVER",lifetime="detached",max_concurrency=1000).remote()
-            except Exception as e:
-                pass    
-        try:
-            ray.get_actor("BlockBinaryStreamServer")    
-        except ValueError:  
-            try:          
-                ray.remote(BlockBinaryStreamServer).options(name="BlockBinaryStreamServer",lifetime="detached",max_concurrency=1000).remote()
-            except Exception as e:
-                pass        
+        create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER")
+        create_stream_server(BlockBinaryStreamServer, "BlockBinaryStreamServer")
     
     # saas/proprietary
     def get_meta(self):
@@ -120,7 +108,7 @@ class CustomSaasAPI:
                     }
         request_id = [None]
         if stream:
-            server = ray.get_actor("BlockBinaryStreamServer")            
+            server = get_stream_server("BlockBinaryStreamServer")            
                         
             def writer():
                 request_id[0] = str(uuid.uuid4())
@@ -135,7 +123,7 @@ class CustomSaasAPI:
                                                         StreamOutputs(outputs=[SingleOutput(text=chunk,metadata=SingleOutputMeta(
                                                             input_tokens_count=0,
                                                             generated_tokens_count=0,
-                                                        ))])
+                                                        ))],delta=True)
                                                         ))                                                                                                                                                          
                 except:
                     traceback.print_exc()            
@@ -156,7 +144,7 @@ class CustomSaasAPI:
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BlockBinaryStreamServer"}})]                   
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BlockBinaryStreamServer","stream_server_shards":server.num_shards}})]                   
     
         start_time = time.monotonic()     
         request_id[0] = str(uuid.uuid4())
@@ -1,10 +1,15 @@
 import asyncio
+import io
+import queue
+import shutil
+import threading
 import ray
 import time
 import os
 import tarfile
 import tempfile
 import uuid
+from typing import Any, Dict, List, Optional
 from .utils import print_flush
 
 async def producer(items,udf_name, queue):    
@@ -59,10 +64,154 @@ def block_transfer_from_ob(udf_name, model_refs,target_dir):
     os.remove(tf_path)        
 
 
+class TransferProgress:
+    """Progress and throughput of a model transfer, logged every `log_interval` seconds."""
+
+    def __init__(self, udf_name: str, total_blocks: int, log_interval: float = 10):
+        self.udf_name = udf_name
+        self.total_blocks = total_blocks
+        self.log_interval = log_interval
+        self.blocks = 0
+        self.bytes = 0
+        # seconds the writer waited for the object store, a high share means the fetch is the bottleneck
+        self.fetch_wait = 0.0
+        self.start = time.monotonic()
+        self.last_log = self.start
+
+    def update(self, size: int):
+        self.blocks += 1
+        self.bytes += size
+        now = time.monotonic()
+        if now - self.last_log >= self.log_interval:
+            self.last_log = now
+            self.log()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.start
+        return {
+            "blocks": self.blocks,
+            "total_blocks": self.total_blocks,
+            "bytes": self.bytes,
+            "elapsed": elapsed,
+            "fetch_wait": self.fetch_wait,
+            "mb_per_second": self.bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def log(self):
+        stats = self.stats()
+        percent = float(stats["blocks"]) / max(stats["total_blocks"], 1) * 100
+        print_flush(
+            f"MODEL[{self.udf_name}] UDFWorker pull model: {percent:.1f}% "
+            f"{stats['bytes'] / 1024 / 1024:.1f}MB {stats['mb_per_second']:.1f}MB/s "
+            f"(waited {stats['fetch_wait']:.1f}s for the object store)"
+        )
+
+
+class _BlockStream(io.RawIOBase):
+    """A readable stream over the blocks queued by the prefetcher, consumed by tarfile."""
+
+    def __init__(self, blocks: "queue.Queue", progress: TransferProgress):
+        self.blocks = blocks
+        self.progress = progress
+        self.current = memoryview(b"")
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.current:
+            if self.finished:
+                return 0
+            start = time.monotonic()
+            block = self.blocks.get()
+            self.progress.fetch_wait += time.monotonic() - start
+            if block is None:
+                self.finished = True
+                return 0
+            if isinstance(block, BaseException):
+                raise block
+            self.progress.update(len(block))
+            self.current = memoryview(block)
+        n = min(len(buffer), len(self.current))
+        buffer[:n] = self.current[:n]
+        self.current = self.current[n:]
+        return n
+
+
+def _prefetch_blocks(model_refs, blocks: "queue.Queue", batch_size: int, stop: threading.Event):
+    try:
+        for start in range(0, len(model_refs), batch_size):
+            # one ray.get per window fetches its blocks in parallel
+            for item in ray.get(model_refs[start : start + batch_size]):
+                if stop.is_set():
+                    return
+                blocks.put(item["value"])
+        blocks.put(None)
+    except BaseException as e:
+        blocks.put(e)
+
+
+def pipelined_transfer_from_ob(
+    udf_name: str,
+    model_refs: List[Any],
+    target_dir: str,
+    prefetch_blocks: int = 1024,
+    batch_size: int = 256,
+    progress: Optional[TransferProgress] = None,
+) -> Dict[str, Any]:
+    """
+    Restores the model tar stored as blocks in the object store into `target_dir`.
+
+    A background thread fetches the blocks with one `ray.get` per `batch_size` blocks and keeps up
+    to `prefetch_blocks` of them ahead of the writer, while the tar is extracted as a stream, so
+    network and disk overlap and no intermediate tar file is written. The files are extracted
+    into a temporary sibling of `target_dir` which is renamed at the end, an interrupted transfer
+    does not leave a half written model behind (unless `target_dir` already exists, then the
+    files are extracted into it).
+    """
+    progress = progress or TransferProgress(udf_name, len(model_refs))
+    blocks = queue.Queue(max(prefetch_blocks, batch_size))
+    stop = threading.Event()
+    prefetcher = threading.Thread(
+        target=_prefetch_blocks, args=(model_refs, blocks, batch_size, stop), daemon=True
+    )
+    prefetcher.start()
+
+    target_dir = os.path.abspath(target_dir)
+    parent = os.path.dirname(target_dir)
+    os.makedirs(parent, exist_ok=True)
+    part_dir = None
+    extract_dir = target_dir
+    if not os.path.exists(target_dir):
+        part_dir = extract_dir = os.path.join(
+            parent, f".{os.path.basename(target_dir)}.{uuid.uuid4().hex}.part"
+        )
+    try:
+        stream = io.BufferedReader(_BlockStream(blocks, progress), buffer_size=1024 * 1024)
+        with tarfile.open(fileobj=stream, mode="r|") as tt:
+            tt.extractall(extract_dir)
+        if part_dir is not None:
+            os.makedirs(part_dir, exist_ok=True)
+            os.rename(part_dir, target_dir)
+    except BaseException:
+        stop.set()
+        # unblock the prefetcher if it waits for room in the queue
+        while prefetcher.is_alive():
+            try:
+                blocks.get_nowait()
+            except queue.Empty:
+                prefetcher.join(0.1)
+        if part_dir is not None:
+            shutil.rmtree(part_dir, ignore_errors=True)
+        raise
+    prefetcher.join()
+    progress.log()
+    return progress.stats()
+
+
 def transfer_from_ob(udf_name,model_refs,model_dir):
     print_flush(f"[{udf_name}] model_refs:{len(model_refs)} model_dir:{model_dir}")
     time1 = time.time()
-    # loop = asyncio.get_event_loop()
-    # loop.run_until_complete(_transfer_from_ob(udf_name,model_refs,model_dir))            
-    block_transfer_from_ob(udf_name,model_refs,model_dir)
+    pipelined_transfer_from_ob(udf_name,model_refs,model_dir)
     print_flush(f"[{udf_name}] UDFWorker pull model from object store cost {time.time() - time1} seconds")
@@ -1,4 +1,6 @@
 import uuid
+import weakref
+import functools
 from pathlib import Path
 from functools import wraps
 import time
@@ -847,31 +849,73 @@ JSON Schema：
 '''
     return msg  
 
-def format_prompt(func,**kargs): 
-    from langchain import PromptTemplate
-    doc = func.__doc__       
+def _dedent_doc(doc: str) -> str:
     lines = doc.splitlines()
     # get the first line to get the whitespace prefix
     first_non_empty_line = next(line for line in lines if line.strip())
-    prefix_whitespace_length = len(first_non_empty_line) - len(first_non_empty_line.lstrip())    
-    prompt = "\n".join([line[prefix_whitespace_length:] for line in lines])
-    tpl = PromptTemplate.from_template(prompt)
+    prefix_whitespace_length = len(first_non_empty_line) - len(first_non_empty_line.lstrip())
+    return "\n".join([line[prefix_whitespace_length:] for line in lines])
+
+# func -> {render: (docstring, compiled template)}, the docstring detects a reassigned __doc__
+_prompt_template_cache: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_signature_cache: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def get_prompt_template(func, render: str = "jinja2"):
+    """
+    The compiled template of a prompt function's docstring: a jinja2 Template, or a langchain
+    PromptTemplate for other renders. Compiled once per function and render.
+    """
+    doc = func.__doc__
+    try:
+        templates = _prompt_template_cache.get(func)
+    except TypeError:
+        # not weakly referenceable, compiled on each call
+        return _compile_prompt_template(doc, render)
+    if templates is None:
+        templates = {}
+        _prompt_template_cache[func] = templates
+    cached = templates.get(render)
+    if cached is not None and cached[0] is doc:
+        return cached[1]
+
+    tpl = _compile_prompt_template(doc, render)
+    templates[render] = (doc, tpl)
+    return tpl
+
+def _compile_prompt_template(doc: str, render: str):
+    prompt = _dedent_doc(doc)
+    if render == "jinja2" or render == "jinja":
+        from jinja2 import Template
+        return Template(prompt)
+    from langchain import PromptTemplate
+    return PromptTemplate.from_template(prompt)
+
+def get_func_signature(func) -> inspect.Signature:
+    """inspect.signature, computed once per function."""
+    try:
+        signature = _signature_cache.get(func)
+    except TypeError:
+        return inspect.signature(func)
+    if signature is None:
+        signature = inspect.signature(func)
+        _signature_cache[func] = signature
+    return signature
+
+def format_prompt(func,**kargs):
+    tpl = get_prompt_template(func, render="langchain")
     return tpl.format(**kargs)
 
 def format_prompt_jinja2(func,**kargs):
-    from jinja2 import Template
-    doc = func.__doc__       
-    lines = doc.splitlines()
-    # get the first line to get the whitespace prefix
-    first_non_empty_line = next(line for line in lines if line.strip())
-    prefix_whitespace_length = len(first_non_empty_line) - len(first_non_empty_line.lstrip())    
-    prompt = "\n".join([line[prefix_whitespace_length:] for line in lines])
-    tpl = Template(prompt)
+    tpl = get_prompt_template(func, render="jinja2")
     return tpl.render(kargs)
 
-def format_str_jinja2(s,**kargs):
+@functools.lru_cache(maxsize=1024)
+def _compile_jinja2_str(s: str):
     from jinja2 import Template
-    tpl = Template(s)
+    return Template(s)
+
+def format_str_jinja2(s,**kargs):
+    tpl = _compile_jinja2_str(s)
     return tpl.render(kargs)
 
 def random_uuid() -> str:
@@ -7,12 +7,14 @@ from byzerllm.utils.client.types import (
     FintuneRequest,ExecuteCodeResponse,LLMMetadata
 )
 from byzerllm.utils.client.byzerllm_client import ByzerLLM
+from byzerllm.utils.client.async_byzerllm_client import AsyncByzerLLM
+from byzerllm.utils.client.client_registry import get_llm_client, invalidate_llm_clients
 
 def default_chat_wrapper(llm:ByzerLLM,conversations: Optional[List[Dict]] = None,llm_config={}):
     return llm.chat_oai(conversations=conversations,llm_config=llm_config)
 
 __all__ = [
-    "ByzerLLM","default_chat_wrapper","Templates","Template","Role","LLMHistoryItem",
+    "ByzerLLM","AsyncByzerLLM","get_llm_client","invalidate_llm_clients","default_chat_wrapper","Templates","Template","Role","LLMHistoryItem",
     "LLMRequest",
     "LLMFunctionCallResponse",
     "LLMClassResponse","InferBackend","EventName","EventCallbackResult","EventCallback","LLMResponse","FintuneRequestExtra",
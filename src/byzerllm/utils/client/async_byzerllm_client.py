@@ -0,0 +1,262 @@
+import asyncio
+import functools
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import ray
+
+from byzerllm.utils.client.byzerllm_client import ByzerLLM, _StreamText
+from byzerllm.utils.client.request_coalescer import chat_request_key
+from byzerllm.utils.client.types import LLMRequest, LLMResponse
+
+
+class AsyncByzerLLM(ByzerLLM):
+    """
+    A ByzerLLM whose model calls are coroutines.
+
+    `achat_oai`, `aemb`, `aget_meta` and `astream_chat_oai` await the Ray ObjectRefs
+    instead of blocking on `ray.get`, so one event loop (e.g. the OpenAI compatible
+    API server) can keep thousands of requests in flight. Prompt building is shared
+    with ByzerLLM, the blocking methods of ByzerLLM are still available.
+
+    Actor handles are looked up once and cached, a lookup is the only call that runs
+    in the default executor.
+    """
+
+    def __init__(self, url: Optional[str] = None, **kwargs):
+        super().__init__(url, **kwargs)
+        self.actor_handles: Dict[str, Any] = {}
+
+    def setup_reset(self):
+        super().setup_reset()
+        self.actor_handles = {}
+
+    def undeploy(self, udf_name: str, force: bool = False):
+        self.actor_handles.pop(udf_name, None)
+        return super().undeploy(udf_name, force=force)
+
+    async def _aget_actor(self, name: str):
+        handle = self.actor_handles.get(name)
+        if handle is None:
+            loop = asyncio.get_running_loop()
+            handle = await loop.run_in_executor(None, ray.get_actor, name)
+            self.actor_handles[name] = handle
+        return handle
+
+    async def _aapply_with_udf_master(
+        self, model: str, worker_id: int, new_input_value: List[str]
+    ):
+        udf_master = await self._aget_actor(model)
+        index = -1
+        try:
+            [index, worker] = await udf_master.get.remote(worker_id)
+            return await worker.async_apply.remote(new_input_value)
+        except ray.exceptions.RayActorError:
+            # the model was redeployed, look the master up again next time
+            self.actor_handles.pop(model, None)
+            raise
+        finally:
+            if index != -1:
+                await udf_master.give_back.remote(index)
+
+    async def _aapply_with_worker_pool(
+        self, model: str, worker_id: int, new_input_value: List[str]
+    ):
+        load_balance = self.sys_conf.get("load_balance", "lru")
+        loop = asyncio.get_running_loop()
+        for retry in range(2):
+            pool = self.worker_pools.pools.get(model)
+            if pool is None:
+                pool = await loop.run_in_executor(
+                    None, self.worker_pools.get, model, load_balance
+                )
+            leased = pool.try_lease(worker_id)
+            if leased is None:
+                # every worker is busy, wait for a release without blocking the loop
+                leased = await loop.run_in_executor(None, pool.lease, worker_id)
+            index, worker = leased
+            try:
+                return await worker.async_apply.remote(new_input_value)
+            except ray.exceptions.RayActorError:
+                self.worker_pools.invalidate(model)
+                if retry == 1:
+                    raise
+            finally:
+                pool.release(index)
+
+    async def _aquery(self, model: str, input_value: List[Dict[str, Any]]):
+        event_result, new_input_value, worker_id = self._encode_query(
+            model, input_value
+        )
+        if event_result is not None:
+            return event_result
+
+        if self.client_dispatch:
+            res = await self._aapply_with_worker_pool(model, worker_id, new_input_value)
+        else:
+            res = await self._aapply_with_udf_master(model, worker_id, new_input_value)
+
+        return self._decode_query(model, res)
+
+    async def aget_meta(self, model: str, llm_config: Dict[str, Any] = {}):
+        if not model and not self.default_model_name:
+            raise Exception("model name is required")
+
+        if not model:
+            model = self.default_model_name
+
+        if model in self.meta_cache:
+            return self.meta_cache[model]
+
+        default_config = self.mapping_extra_generation_params.get(model, {})
+
+        v = [{"instruction": "", "meta": True, **{**default_config, **llm_config}}]
+        res = await self._aquery(model, v)
+
+        meta = {}
+        if len(res) != 0 and len(res[0]["predict"]) != 0:
+            meta = res[0]["predict"][0]
+
+        self.meta_cache[model] = meta
+        return self.meta_cache[model]
+
+    async def achat_oai(
+        self,
+        conversations,
+        model: Optional[str] = None,
+        role_mapping=None,
+        llm_config: Dict[str, Any] = {},
+        enable_default_sys_message: bool = True,
+        only_return_prompt: bool = False,
+    ) -> List[LLMResponse]:
+        """
+        The async version of `chat_oai` for plain chat. Function calling and response
+        classes need the blocking `chat_oai`.
+        """
+        if not self.default_model_name and not model:
+            raise Exception(
+                "Use llm.setup_default_model_name to setup default model name or setup the model parameter"
+            )
+
+        if not model:
+            model = self.default_model_name
+
+        # chat_oai reads the meta of the model, fetch it here so building the prompt never blocks
+        await self.aget_meta(model=model)
+
+        build_prompts = functools.partial(
+            self.chat_oai,
+            conversations,
+            model=model,
+            role_mapping=role_mapping,
+            llm_config=llm_config,
+            enable_default_sys_message=enable_default_sys_message,
+            only_return_prompt=True,
+        )
+        if self.mapping_auto_use_apply_chat_template.get(model, False):
+            # applying the chat template of the model is a blocking call to a worker
+            prompts = await asyncio.get_running_loop().run_in_executor(None, build_prompts)
+        else:
+            prompts = build_prompts()
+        if only_return_prompt:
+            return prompts
+
+        v = [item.metadata for item in prompts]
+        if self._should_coalesce(v):
+            res = await self.chat_coalescer.arun(
+                chat_request_key(model, v), lambda: self._aquery(model, v)
+            )
+        else:
+            res = await self._aquery(model, v)
+        clean_func = self.mapping_clean_func.get(model, lambda s: s)
+
+        return [
+            LLMResponse(
+                output=clean_func(item["predict"]),
+                metadata=item.get("metadata", {}),
+                input=item["input"],
+            )
+            for item in res
+        ]
+
+    async def aemb(
+        self,
+        model,
+        request: Union[LLMRequest, List[str]],
+        extract_params: Dict[str, Any] = {},
+    ) -> List[LLMResponse]:
+        model, v = self._emb_input(model, request, extract_params)
+
+        if self.emb_cache is not None:
+            keys, responses, misses = self._emb_cache_lookup(model, v)
+            res = await self._aquery(model, misses) if misses else []
+            responses = self._emb_cache_fill(keys, responses, res)
+        else:
+            res = await self._aquery(model, v)
+            responses = [
+                LLMResponse(
+                    output=item["predict"],
+                    metadata=item.get("metadata", {}),
+                    input=item["input"],
+                )
+                for item in res
+            ]
+
+        for response in responses:
+            if isinstance(response.output, np.ndarray):
+                response.output = response.output.tolist()
+        return responses
+
+    async def astream_chat_oai(
+        self,
+        conversations,
+        model: Optional[str] = None,
+        role_mapping=None,
+        delta_mode: bool = False,
+        llm_config: Dict[str, Any] = {},
+    ):
+        if not model:
+            model = self.default_model_name
+
+        meta = await self.aget_meta(model=model)
+        if not meta.get("support_stream", False):
+            raise Exception(f"The model({model}) is not support stream chat for now.")
+
+        v = await self.achat_oai(
+            conversations,
+            model=model,
+            role_mapping=role_mapping,
+            llm_config={**llm_config, **{"generation.stream": True}},
+        )
+        request_id, stream_server_type, server_name = self._stream_server_of(v[0])
+        server = await self._aget_actor(server_name)
+
+        stream_text = _StreamText(
+            self.mapping_clean_func.get(model, lambda s: s),
+            binary=stream_server_type == "BlockBinaryStreamServer",
+            delta_mode=delta_mode,
+        )
+        try:
+            async for final_output in self._async_stream_outputs(server, request_id):
+                v = stream_text.feed(final_output)
+                if v is not None:
+                    yield v
+        except ray.exceptions.RayActorError:
+            self.actor_handles.pop(server_name, None)
+            raise
+
+    def async_stream_chat_oai(
+        self,
+        conversations,
+        role_mapping=None,
+        model: Optional[str] = None,
+        delta_mode: bool = False,
+        llm_config: Dict[str, Any] = {},
+    ):
+        return self.astream_chat_oai(
+            conversations,
+            model=model,
+            role_mapping=role_mapping,
+            delta_mode=delta_mode,
+            llm_config=llm_config,
+        )
@@ -18,21 +18,42 @@ from byzerllm.utils import (
     exec_capture_output,
     format_prompt,
     format_prompt_jinja2,
+    get_func_signature,
 )
 from byzerllm.utils.ray_utils import cancel_placement_group, get_actor_info
 from byzerllm.utils.json_repaire import repair_json_str
+from byzerllm.utils.types import SingleOutputMeta, stream_server_shard_name
+from byzerllm.utils.client.worker_pool import ModelWorkerPools
+from byzerllm.utils.client.client_registry import invalidate_llm_clients
+from byzerllm.utils.client.emb_cache import EmbeddingCache, emb_cache_key
+from byzerllm.utils.client import json_codec
+from byzerllm.utils.client.request_coalescer import (
+    RequestCoalescer,
+    chat_request_key,
+    is_deterministic,
+)
+from byzerllm.model_cache import model_cache_key
+from byzerllm.warm_pool import (
+    build_udf_with_warm_pool,
+    scale_up,
+    shutdown_master,
+    warm_pool_name,
+)
 import byzerllm
 import json
+import hashlib
+import os
 import importlib
 import time
 import functools
 import inspect
 import pydantic
-import copy
 import traceback
 from enum import Enum
 from loguru import logger
 import asyncio
+import concurrent.futures
+import numpy as np
 
 from byzerllm.utils.client.types import (
     Templates,
@@ -54,6 +75,65 @@ from byzerllm.utils.client.types import (
 )
 
 
+def _metadata_key(metadata):
+    # SingleOutputMeta has no __eq__, compare the counts it carries
+    return getattr(metadata, "__dict__", metadata)
+
+
+class _StreamText:
+    """
+    Turns the outputs read from a stream server into the `(text, metadata)` tuples yielded
+    by `stream_chat_oai`. Servers send either deltas or the full text generated so far;
+    `feed` returns None for outputs that add no new text, except for empty deltas with new
+    metadata (e.g. the token usage on the last chunk), which are yielded without text.
+    """
+
+    def __init__(self, clean_func: Callable, binary: bool = False, delta_mode: bool = False):
+        self.clean_func = clean_func
+        self.binary = binary
+        self.delta_mode = delta_mode
+        self.pre_generated_text = None
+        # empty deltas with the default metadata carry nothing
+        self.pre_metadata = SingleOutputMeta()
+
+    def feed(self, final_output) -> Optional[Tuple[Any, Any]]:
+        if self.binary:
+            return (final_output.outputs[0].text, final_output.outputs[0].metadata)
+
+        text_outputs = final_output.outputs
+        if getattr(final_output, "delta", False):
+            delta_text = text_outputs[0].text
+            metadata = text_outputs[0].metadata
+            if not delta_text:
+                if _metadata_key(metadata) == _metadata_key(self.pre_metadata):
+                    return None
+                self.pre_metadata = metadata
+                if self.delta_mode:
+                    return ("", metadata)
+                return (self.clean_func(self.pre_generated_text or ""), metadata)
+            if self.delta_mode:
+                s = delta_text
+            else:
+                self.pre_generated_text = (self.pre_generated_text or "") + delta_text
+                s = self.pre_generated_text
+            self.pre_metadata = metadata
+            return (self.clean_func(s), metadata)
+
+        generated_text = text_outputs[0].text
+        if (
+            self.pre_generated_text is not None
+            and generated_text == self.pre_generated_text
+        ):
+            return None
+
+        if self.delta_mode and self.pre_generated_text is not None:
+            s = generated_text[len(self.pre_generated_text) :]
+        else:
+            s = generated_text
+        self.pre_generated_text = generated_text
+        return (self.clean_func(s), text_outputs[0].metadata)
+
+
 class ByzerLLM:
 
     def __init__(self, url: Optional[str] = None, **kwargs):
@@ -131,6 +211,19 @@ class ByzerLLM:
         self.event_callbacks: Dict[EventName, List[EventCallback]] = {}
         self.sub_clients = {}
         self.skip_nontext_check = False
+        # how long (seconds) one long-poll call may wait on the stream server
+        self.stream_poll_timeout = kwargs.get("stream_poll_timeout", 1.0)
+
+        # dispatch requests to the model workers from this client instead of
+        # leasing a worker from the model's UDFMaster on every call
+        self.client_dispatch = kwargs.get("client_dispatch", False)
+        self.worker_pools = ModelWorkerPools()
+
+        # see setup_emb_cache
+        self.emb_cache: Optional[EmbeddingCache] = kwargs.get("emb_cache", None)
+        # see setup_chat_coalescing
+        self.chat_coalescer: Optional[RequestCoalescer] = kwargs.get("chat_coalescer", None)
+        self.coalesce_only_deterministic = True
 
     @property
     def metadata(self) -> LLMMetadata:
@@ -181,6 +274,66 @@ class ByzerLLM:
     def setup_reset(self):
         self.sys_conf = self.default_sys_conf.copy()
         self.context.conf = self.sys_conf
+        self.worker_pools.invalidate()
+
+    def setup_client_dispatch(self, enable: bool = True) -> "ByzerLLM":
+        """
+        Cache the worker handles of every model and pick the worker in this process,
+        so a request costs one actor round trip. The load of other clients is not visible,
+        so prefer it for small frequent requests (tokenize, emb, get_meta).
+        """
+        self.client_dispatch = enable
+        if not enable:
+            self.worker_pools.invalidate()
+        return self
+
+    def setup_emb_cache(
+        self, max_items: int = 100000, path: Optional[str] = None
+    ) -> "ByzerLLM":
+        """
+        Cache the results of `emb` by content (model, text, parameters). Only the texts
+        that are not cached are sent to the model. `path` adds a sqlite tier on disk.
+        Pass `max_items=0` to turn the cache off.
+        """
+        if self.emb_cache is not None:
+            self.emb_cache.close()
+        self.emb_cache = EmbeddingCache(max_items=max_items, path=path) if max_items > 0 else None
+        return self
+
+    def setup_chat_coalescing(
+        self,
+        enable: bool = True,
+        cache_ttl: float = 0,
+        max_items: int = 1024,
+        only_deterministic: bool = True,
+    ) -> "ByzerLLM":
+        """
+        Identical concurrent `chat_oai` requests (same model, instruction, history and
+        generation parameters) share one model call. `cache_ttl > 0` also keeps the results
+        for that many seconds (LRU of `max_items`). By default only requests with
+        `temperature=0` are coalesced, sampled answers are expected to differ.
+        `chat_coalescer.stats()` counts the coalesced requests and the cache hits.
+        """
+        self.chat_coalescer = (
+            RequestCoalescer(cache_ttl=cache_ttl, max_items=max_items) if enable else None
+        )
+        self.coalesce_only_deterministic = only_deterministic
+        return self
+
+    def _should_coalesce(self, v: List[Dict[str, Any]]) -> bool:
+        # a stream request returns the id of its stream server entry, which only one reader can consume
+        if any(item.get("generation.stream") or item.get("gen.stream") for item in v):
+            return False
+        return self.chat_coalescer is not None and (
+            not self.coalesce_only_deterministic or is_deterministic(v)
+        )
+
+    def _chat_query(self, model: str, v: List[Dict[str, Any]]):
+        if not self._should_coalesce(v):
+            return self._query(model, v)
+        return self.chat_coalescer.run(
+            chat_request_key(model, v), lambda: self._query(model, v)
+        )
 
     def setup_pin_model_worker_mapping(
         self, pin_model_worker_mapping: Dict[Any, int]
@@ -281,6 +434,25 @@ class ByzerLLM:
         self.sys_conf["maxConcurrency"] = num_workers
         return self
 
+    def setup_warm_pool(self, size: int) -> "ByzerLLM":
+        """
+        Keep `size` idle, loaded workers per deployed model (see byzerllm.warm_pool), they are
+        attached by `scale_up` and by redeploying the model with the same settings.
+        """
+        self.sys_conf["warmPoolSize"] = size
+        return self
+
+    def setup_model_cache(self, path: Optional[str] = None) -> "ByzerLLM":
+        """
+        Workers load the model from a node local copy in the content addressed model cache
+        (see byzerllm.model_cache), which is made once per node and model version. `deploy`
+        sets `modelCacheKey` (the model path and a hash of its files) in the worker conf.
+        """
+        self.sys_conf["modelCache"] = "true"
+        if path:
+            self.sys_conf["modelCacheDir"] = path
+        return self
+
     def setup_max_model_length(self, model: str, max_model_length: int) -> "ByzerLLM":
         self.mapping_max_model_length[model] = max_model_length
         return self
@@ -486,13 +658,69 @@ class ByzerLLM:
                             cancel_placement_group(meta["engine_placement_group_id"])
                 except Exception as inst:
                     pass
-            ray.kill(model)
+            # the workers of a model deployed with a warm pool do not die with its master
+            if self._has_warm_pool(udf_name):
+                shutdown_master(model)
+            else:
+                ray.kill(model)
             if udf_name in self.meta_cache:
                 del self.meta_cache[udf_name]
+            self.worker_pools.invalidate(udf_name)
+            invalidate_llm_clients(udf_name)
+        except ValueError:
+            pass
+        try:
+            pool = ray.get_actor(warm_pool_name(udf_name))
+            ray.get(pool.shutdown.remote())
+            ray.kill(pool)
         except ValueError:
             pass
         time.sleep(3)
 
+    def _has_warm_pool(self, udf_name: str) -> bool:
+        try:
+            ray.get_actor(warm_pool_name(udf_name))
+            return True
+        except ValueError:
+            return False
+
+    def _setup_model_cache_key(self, model_path: str):
+        # hash the model files once here instead of in every worker
+        if os.path.isdir(model_path):
+            self.setup("modelCacheKey", model_cache_key(model_path))
+        else:
+            self.sys_conf.pop("modelCacheKey", None)
+            self.context.conf = self.sys_conf
+
+    def scale_up(self, udf_name: str, num_workers: int = 1) -> int:
+        """
+        Adds workers to a model deployed with `setup_warm_pool`, idle workers of the
+        pool are attached in seconds. Returns the number of workers of the model.
+        """
+        total = scale_up(udf_name, num_workers)
+        self.worker_pools.invalidate(udf_name)
+        return total
+
+    def warm_pool_stat(self, udf_name: str) -> Dict[str, Any]:
+        return ray.get(ray.get_actor(warm_pool_name(udf_name)).stat.remote())
+
+    def _build_udf(self, init_model, predict_func, signature: Dict[str, Any]):
+        warm_pool_size = int(self.sys_conf.get("warmPoolSize", 0))
+        if warm_pool_size <= 0:
+            UDFBuilder.build(self.ray_context, init_model, predict_func)
+            return
+        conf = {k: v for k, v in self.sys_conf.items() if k != "UDF_CLIENT"}
+        key = json.dumps(
+            {**signature, "conf": conf}, sort_keys=True, ensure_ascii=False, default=str
+        )
+        build_udf_with_warm_pool(
+            self.ray_context,
+            init_model,
+            predict_func,
+            warm_pool_size,
+            hashlib.sha256(key.encode("utf-8")).hexdigest(),
+        )
+
     def generate_instruction_from_history(
         self,
         model: str,
@@ -560,8 +788,17 @@ class ByzerLLM:
         from byzerllm import common_init_model
 
         self.setup("UDF_CLIENT", udf_name)
+        self.worker_pools.invalidate(udf_name)
+        invalidate_llm_clients(udf_name)
+        if self.sys_conf.get("modelCache", "false") == "true":
+            self._setup_model_cache_key(model_path)
 
         infer_backend = self.sys_conf["infer_backend"]
+        signature = {
+            "model_path": model_path,
+            "pretrained_model_type": pretrained_model_type,
+            "infer_params": infer_params,
+        }
 
         if (
             infer_backend == InferBackend.VLLM
@@ -589,7 +826,7 @@ class ByzerLLM:
                 infer = infer_module.CustomSaasAPI(infer_params)
                 return (infer, None)
 
-            UDFBuilder.build(self.ray_context, init_model, simple_predict_func)
+            self._build_udf(init_model, simple_predict_func, signature)
             return self.get_meta(model=udf_name)
 
         if pretrained_model_type == "bark":
@@ -619,7 +856,7 @@ class ByzerLLM:
                 ]
                 return {"value": [json.dumps(results, ensure_ascii=False, indent=4)]}
 
-            UDFBuilder.build(self.ray_context, init_model, predict_func)
+            self._build_udf(init_model, predict_func, signature)
             return self.get_meta(model=udf_name)
 
         # we put in this place so it only take effect for private model
@@ -636,13 +873,21 @@ class ByzerLLM:
         predict_module = importlib.import_module(f"byzerllm.utils.text_generator")
 
         def init_model(model_refs: List[ClientObjectRef], conf: Dict[str, str]) -> Any:
+            from byzerllm.utils.emb import setup_emb_batching
+
             common_init_model(model_refs, conf, model_path, is_load_from_local=True)
-            model = infer_module.init_model(model_path, infer_params, conf)
+            setup_emb_batching(infer_params)
+            local_model_path = model_path
+            if conf.get("modelCache", "false") == "true":
+                from byzerllm.model_cache import ModelCache
+
+                local_model_path = ModelCache(conf.get("modelCacheDir")).cache_model_dir(
+                    model_path, key=conf.get("modelCacheKey")
+                )
+            model = infer_module.init_model(local_model_path, infer_params, conf)
             return model
 
-        UDFBuilder.build(
-            self.ray_context, init_model, getattr(predict_module, predict_func)
-        )
+        self._build_udf(init_model, getattr(predict_module, predict_func), signature)
         return self.get_meta(model=udf_name)
 
     def get_meta(self, model: str, llm_config: Dict[str, Any] = {}):
@@ -729,8 +974,9 @@ class ByzerLLM:
     def emb_query(self, v: str, model: str = None):
         return self.emb(model=model, request=LLMRequest(instruction=v))
 
-    def emb(self, model, request: LLMRequest, extract_params: Dict[str, Any] = {}):
-
+    def _emb_input(
+        self, model, request: LLMRequest, extract_params: Dict[str, Any] = {}
+    ) -> Tuple[str, List[Dict[str, Any]]]:
         if not model and not self.default_emb_model_name:
             raise Exception("model name is required")
 
@@ -747,6 +993,7 @@ class ByzerLLM:
                 {
                     "instruction": request.instruction,
                     "embedding": True,
+                    "binary_output": True,
                     "max_length": request.max_length,
                     "top_p": request.top_p,
                     "temperature": request.temperature,
@@ -759,6 +1006,7 @@ class ByzerLLM:
                 {
                     "instruction": x,
                     "embedding": True,
+                    "binary_output": True,
                     "max_length": request.max_length,
                     "top_p": request.top_p,
                     "temperature": request.temperature,
@@ -767,6 +1015,81 @@ class ByzerLLM:
                 }
                 for x in request.instruction
             ]
+        return model, v
+
+    def _emb_cache_lookup(
+        self, model: str, v: List[Dict[str, Any]]
+    ) -> Tuple[List[str], List[Optional[LLMResponse]], List[Dict[str, Any]]]:
+        """
+        Returns the cache keys of the items, the cached responses (None for a miss)
+        and the items that still have to be sent to the model.
+        """
+        keys = [
+            emb_cache_key(
+                model, item["instruction"], {k: x for k, x in item.items() if k != "instruction"}
+            )
+            for item in v
+        ]
+        responses = []
+        misses = []
+        for item, value in zip(v, self.emb_cache.get_many(keys)):
+            if value is None:
+                responses.append(None)
+                misses.append(item)
+                continue
+            output, metadata = value
+            responses.append(
+                LLMResponse(
+                    output=list(output) if isinstance(output, list) else output,
+                    metadata=dict(metadata),
+                    input=item,
+                )
+            )
+        return keys, responses, misses
+
+    @staticmethod
+    def _is_emb_vector(output: Any) -> bool:
+        if isinstance(output, np.ndarray):
+            return output.ndim == 1 and output.size > 0 and np.issubdtype(output.dtype, np.number)
+        return (
+            isinstance(output, list)
+            and len(output) > 0
+            and all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in output)
+        )
+
+    def _emb_cache_fill(
+        self,
+        keys: List[str],
+        responses: List[Optional[LLMResponse]],
+        res: List[Dict[str, Any]],
+    ) -> List[LLMResponse]:
+        new_items = []
+        it = iter(res)
+        for i, response in enumerate(responses):
+            if response is not None:
+                continue
+            item = next(it)
+            output = item["predict"]
+            metadata = item.get("metadata", {})
+            # failed or malformed outputs are returned but never cached
+            if not metadata.get("error") and self._is_emb_vector(output):
+                cached = output.tolist() if isinstance(output, np.ndarray) else list(output)
+                new_items.append((keys[i], (cached, metadata)))
+            responses[i] = LLMResponse(output=output, metadata=metadata, input=item["input"])
+        self.emb_cache.put_many(new_items)
+        return responses
+
+    def _emb_responses(
+        self, model: str, request: LLMRequest, extract_params: Dict[str, Any]
+    ) -> List[LLMResponse]:
+        """The outputs are float32 rows (np.ndarray) when the worker sent a matrix."""
+        model, v = self._emb_input(model, request, extract_params)
+
+        if self.emb_cache is not None:
+            keys, responses, misses = self._emb_cache_lookup(model, v)
+            res = self._query(model, misses) if misses else []
+            return self._emb_cache_fill(keys, responses, res)
+
         res = self._query(model, v)
 
         return [
@@ -778,6 +1101,23 @@ class ByzerLLM:
             for item in res
         ]
 
+    def emb(self, model, request: LLMRequest, extract_params: Dict[str, Any] = {}):
+        responses = self._emb_responses(model, request, extract_params)
+        for response in responses:
+            if isinstance(response.output, np.ndarray):
+                response.output = response.output.tolist()
+        return responses
+
+    def emb_array(
+        self, model, request: LLMRequest, extract_params: Dict[str, Any] = {}
+    ) -> np.ndarray:
+        """
+        Like `emb`, but returns the embeddings as one float32 matrix with a row per text,
+        without converting the vectors to Python lists.
+        """
+        responses = self._emb_responses(model, request, extract_params)
+        return np.stack([np.asarray(r.output, dtype=np.float32) for r in responses])
+
     def emb_rerank(
         self,
         model: str = None,
@@ -1121,8 +1461,9 @@ class ByzerLLM:
         is_saas_model = meta.get("model_deploy_type", None) == "saas"
         is_message_format = meta.get("message_format", False)
 
-        temp_conversations = copy.deepcopy(conversations)
-        last_message = temp_conversations[-1]
+        # only the last message is changed below, the history is shared with the caller
+        temp_conversations = list(conversations)
+        last_message = temp_conversations[-1] = dict(conversations[-1])
 
         # function calling
         if tools or tool_choice:
@@ -1170,7 +1511,7 @@ class ByzerLLM:
                 # clean metadata field in conversation
                 # which may used by agent.
                 if "metadata" in item:
-                    del item["metadata"]
+                    item = {k: v for k, v in item.items() if k != "metadata"}
                 history.append(item)
 
         else:
@@ -1210,7 +1551,7 @@ class ByzerLLM:
                 return new_responses
             return responses
 
-        res = self._query(model, v)
+        res = self._chat_query(model, v)
         clean_func = self.mapping_clean_func.get(model, lambda s: s)
 
         responses = [
@@ -1283,6 +1624,165 @@ class ByzerLLM:
 
         return responses
 
+    def _num_model_workers(self, model: str) -> int:
+        if self.client_dispatch:
+            load_balance = self.sys_conf.get("load_balance", "lru")
+            return len(self.worker_pools.get(model, load_balance=load_balance))
+        udf_master = ray.get_actor(model)
+        return int(ray.get(udf_master.stat.remote())["total_workers"])
+
+    def batch_chat_oai(
+        self,
+        conversations_list: List[Union[str, List[Dict[str, Any]]]],
+        model: Optional[str] = None,
+        role_mapping=None,
+        llm_config: Dict[str, Any] = {},
+        enable_default_sys_message: bool = True,
+        batch_size: int = 64,
+        max_workers: Optional[int] = None,
+    ) -> List[LLMResponse]:
+        """
+        Chat with many conversations at once.
+
+        The conversations are packed into batches of at most `batch_size` items, each batch
+        is sent to the model in a single worker call and the batches are spread over the
+        workers of the model. The responses are returned in the order of `conversations_list`.
+
+        A failing item does not fail the batch: its response has an empty output and the
+        error message in `metadata["error"]`.
+        """
+        if not self.default_model_name and not model:
+            raise Exception(
+                "Use llm.setup_default_model_name to setup default model name or setup the model parameter"
+            )
+
+        if not model:
+            model = self.default_model_name
+
+        if not conversations_list:
+            return []
+
+        items = []
+        for conversations in conversations_list:
+            item = self.chat_oai(
+                conversations,
+                model=model,
+                role_mapping=role_mapping,
+                llm_config=llm_config,
+                enable_default_sys_message=enable_default_sys_message,
+                only_return_prompt=True,
+            )[0].metadata
+            item["isolate_errors"] = True
+            items.append(item)
+
+        num_workers = max(self._num_model_workers(model), 1)
+        size = max(min(batch_size, -(-len(items) // num_workers)), 1)
+        batches = [items[i : i + size] for i in range(0, len(items), size)]
+
+        def run_batch(batch: List[Dict[str, Any]]):
+            try:
+                return self._query(model, batch)
+            except Exception as inst:
+                # the whole call failed, e.g. the worker died
+                error = str(inst)
+                return [
+                    {"predict": "", "metadata": {"error": error}, "input": item}
+                    for item in batch
+                ]
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or num_workers
+        ) as executor:
+            results = list(executor.map(run_batch, batches))
+
+        clean_func = self.mapping_clean_func.get(model, lambda s: s)
+        responses = []
+        for res in results:
+            for item in res:
+                metadata = item.get("metadata", {})
+                output = item["predict"]
+                responses.append(
+                    LLMResponse(
+                        output="" if "error" in metadata else clean_func(output),
+                        metadata=metadata,
+                        input=item["input"],
+                    )
+                )
+        return responses
+
+    def _stream_server_of(self, response: LLMResponse) -> Tuple[str, str, str]:
+        """
+        Returns the request id, the stream server type and the name of the stream server
+        actor that holds the output of a stream request.
+        """
+        request_id = response.metadata["request_id"]
+        stream_server_type = response.metadata.get("stream_server", "VLLM_STREAM_SERVER")
+        server_name = stream_server_shard_name(
+            stream_server_type,
+            request_id,
+            response.metadata.get("stream_server_shards", 1),
+        )
+        return request_id, stream_server_type, server_name
+
+    def _stream_outputs(self, server, request_id: str):
+        """
+        Long poll the stream server: every call blocks until new chunks arrive
+        and returns all of them, so there is no fixed polling load per stream.
+        Falls back to `get_item` polling for stream servers created by older versions.
+        """
+        try:
+            get_items_since = server.get_items_since
+        except AttributeError:
+            get_items_since = None
+
+        if get_items_since is None:
+            while True:
+                final_output = ray.get(server.get_item.remote(request_id))
+                if isinstance(final_output, str):
+                    time.sleep(0.01)
+                    continue
+                if final_output is None:
+                    break
+                yield final_output
+            return
+
+        offset = 0
+        while True:
+            offset, items, done = ray.get(
+                get_items_since.remote(request_id, offset, self.stream_poll_timeout)
+            )
+            for item in items:
+                yield item
+            if done:
+                break
+
+    async def _async_stream_outputs(self, server, request_id: str):
+        try:
+            get_items_since = server.get_items_since
+        except AttributeError:
+            get_items_since = None
+
+        if get_items_since is None:
+            while True:
+                final_output = await server.get_item.remote(request_id)
+                if isinstance(final_output, str):
+                    await asyncio.sleep(0.01)
+                    continue
+                if final_output is None:
+                    break
+                yield final_output
+            return
+
+        offset = 0
+        while True:
+            offset, items, done = await get_items_since.remote(
+                request_id, offset, self.stream_poll_timeout
+            )
+            for item in items:
+                yield item
+            if done:
+                break
+
     def stream_chat_oai(
         self,
         conversations,
@@ -1305,39 +1805,18 @@ class ByzerLLM:
             role_mapping=role_mapping,
             llm_config={**llm_config, **{"generation.stream": True}},
         )
-        request_id = v[0].metadata["request_id"]
-        stream_server_type = v[0].metadata.get("stream_server", "VLLM_STREAM_SERVER")
-        server = ray.get_actor(stream_server_type)
-
-        pre_generated_text = None
-        while True:
-            final_output = ray.get(server.get_item.remote(request_id))
-            if isinstance(final_output, str):
-                time.sleep(0.01)
-                continue
-
-            if final_output is None:
-                break
+        request_id, stream_server_type, server_name = self._stream_server_of(v[0])
+        server = ray.get_actor(server_name)
 
-            if stream_server_type == "BlockBinaryStreamServer":
-                binary_data = final_output.outputs[0].text
-                yield (binary_data, final_output.outputs[0].metadata)
-            else:
-                text_outputs = final_output.outputs
-                clean_func = self.mapping_clean_func.get(model, lambda s: s)
-                generated_text = text_outputs[0].text
-                if (
-                    pre_generated_text is not None
-                    and generated_text == pre_generated_text
-                ):
-                    continue
-
-                if delta_mode and pre_generated_text is not None:
-                    s = generated_text[len(pre_generated_text) :]
-                else:
-                    s = generated_text
-                pre_generated_text = generated_text
-                yield (clean_func(s), text_outputs[0].metadata)
+        stream_text = _StreamText(
+            self.mapping_clean_func.get(model, lambda s: s),
+            binary=stream_server_type == "BlockBinaryStreamServer",
+            delta_mode=delta_mode,
+        )
+        for final_output in self._stream_outputs(server, request_id):
+            v = stream_text.feed(final_output)
+            if v is not None:
+                yield v
 
     async def async_stream_chat_oai(
         self,
@@ -1361,39 +1840,18 @@ class ByzerLLM:
             role_mapping=role_mapping,
             llm_config={**llm_config, **{"generation.stream": True}},
         )
-        request_id = v[0].metadata["request_id"]
-        stream_server_type = v[0].metadata.get("stream_server", "VLLM_STREAM_SERVER")
-        server = ray.get_actor(stream_server_type)
+        request_id, stream_server_type, server_name = self._stream_server_of(v[0])
+        server = ray.get_actor(server_name)
 
-        pre_generated_text = None
-        while True:
-            final_output = await server.get_item.remote(request_id)
-            if isinstance(final_output, str):
-                await asyncio.sleep(0.01)
-                continue
-
-            if final_output is None:
-                break
-
-            if stream_server_type == "BlockBinaryStreamServer":
-                binary_data = final_output.outputs[0].text
-                yield (binary_data, final_output.outputs[0].metadata)
-            else:
-                text_outputs = final_output.outputs
-                clean_func = self.mapping_clean_func.get(model, lambda s: s)
-                generated_text = text_outputs[0].text
-                if (
-                    pre_generated_text is not None
-                    and generated_text == pre_generated_text
-                ):
-                    continue
-
-                if delta_mode and pre_generated_text is not None:
-                    s = generated_text[len(pre_generated_text) :]
-                else:
-                    s = generated_text
-                pre_generated_text = generated_text
-                yield (clean_func(s), text_outputs[0].metadata)
+        stream_text = _StreamText(
+            self.mapping_clean_func.get(model, lambda s: s),
+            binary=stream_server_type == "BlockBinaryStreamServer",
+            delta_mode=delta_mode,
+        )
+        async for final_output in self._async_stream_outputs(server, request_id):
+            v = stream_text.feed(final_output)
+            if v is not None:
+                yield v
 
     def clear_impl_cache(
         self,
@@ -1455,7 +1913,7 @@ class ByzerLLM:
         def _impl(func):
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                signature = inspect.signature(func)
+                signature = get_func_signature(func)
                 arguments = signature.bind(*args, **kwargs)
                 arguments.apply_defaults()
                 input_dict = {}
@@ -1567,7 +2025,7 @@ class ByzerLLM:
         def _impl(func):
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                signature = inspect.signature(func)
+                signature = get_func_signature(func)
                 arguments = signature.bind(*args, **kwargs)
                 arguments.apply_defaults()
                 input_dict = {}
@@ -1628,7 +2086,7 @@ class ByzerLLM:
             def wrapper(*args, **kwargs):
 
                 key = f"{model}_{instruction}_{func.__module__}.{func.__name__}"
-                signature = inspect.signature(func)
+                signature = get_func_signature(func)
                 arguments = signature.bind(*args, **kwargs)
                 arguments.apply_defaults()
 
@@ -1830,23 +2288,37 @@ cost {time.monotonic() - start_time} seconds
     def get_max_input_length(self, model: str):
         return self.mapping_max_input_length.get(model, None)
 
-    def _query(self, model: str, input_value: List[Dict[str, Any]]):
-        
+    def _encode_query(
+        self, model: str, input_value: List[Dict[str, Any]]
+    ) -> Tuple[Optional[Any], List[str], int]:
+        """
+        Everything `_query` does before the model is called. Returns the result of
+        the BEFORE_CALL_MODEL event (if a callback short-circuits the call),
+        the serialized input and the pinned worker id.
+        """
         if not self.skip_nontext_check:
             try:
-                from byzerllm.utils.nontext import Image, Audio
+                from byzerllm.utils.nontext import (
+                    Image,
+                    Audio,
+                    TagExtractor,
+                    may_have_nontext,
+                )
 
                 for v in input_value:
                     s = v["instruction"]
-                    image = Image(s)
-                    if image.has_image():
-                        c = image.to_content()
-                        v["instruction"] = json.dumps(c, ensure_ascii=False)
-
-                    audio = Audio(s)
-                    if audio.has_audio():
-                        c = audio.to_content()
-                        v["instruction"] = json.dumps(c, ensure_ascii=False)
+                    # plain text prompts skip the tag extraction
+                    if not may_have_nontext(s):
+                        continue
+                    tags = TagExtractor(s)
+                    media = tags.media_types()
+                    if "image" in media:
+                        c = Image.from_extracted(tags).to_content()
+                        v["instruction"] = json_codec.dumps(c)
+
+                    if "audio" in media:
+                        c = Audio.from_extracted(tags).to_content()
+                        v["instruction"] = json_codec.dumps(c)
 
             except Exception as inst:
                 pass
@@ -1855,12 +2327,10 @@ cost {time.monotonic() - start_time} seconds
             EventName.BEFORE_CALL_MODEL, self, model, input_value
         )
         if event_result is not None:
-            return event_result
-
-        udf_master = ray.get_actor(model)
+            return event_result, [], -1
 
         try:
-            new_input_value = [json.dumps(x, ensure_ascii=False) for x in input_value]
+            new_input_value = [json_codec.dumps(x) for x in input_value]
         except Exception as inst:
             raise Exception(
                 f"input_value should be json serializable, got {input_value}"
@@ -1869,33 +2339,77 @@ cost {time.monotonic() - start_time} seconds
         if self.verbose:
             print(f"Send to model[{model}]:{new_input_value}")
 
-        index = -1
-        try:
-            worker_id = -1
-            if self.pin_model_worker_mapping:
-                if input_value[0].get("embedding", False):
-                    worker_id = self.pin_model_worker_mapping.get("embedding", -1)
-                elif input_value[0].get("tokenizer", False):
-                    worker_id = self.pin_model_worker_mapping.get("tokenizer", -1)
-                elif input_value[0].get("apply_chat_template", False):
-                    worker_id = self.pin_model_worker_mapping.get(
-                        "apply_chat_template", -1
-                    )
-                elif input_value[0].get("meta", False):
-                    worker_id = self.pin_model_worker_mapping.get("meta", -1)            
+        worker_id = -1
+        if self.pin_model_worker_mapping:
+            if input_value[0].get("embedding", False):
+                worker_id = self.pin_model_worker_mapping.get("embedding", -1)
+            elif input_value[0].get("tokenizer", False):
+                worker_id = self.pin_model_worker_mapping.get("tokenizer", -1)
+            elif input_value[0].get("apply_chat_template", False):
+                worker_id = self.pin_model_worker_mapping.get(
+                    "apply_chat_template", -1
+                )
+            elif input_value[0].get("meta", False):
+                worker_id = self.pin_model_worker_mapping.get("meta", -1)
 
-            [index, worker] = ray.get(udf_master.get.remote(worker_id))
-            res = ray.get(worker.async_apply.remote(new_input_value))
+        return None, new_input_value, worker_id
 
-            event_result = self._trigger_event(
-                EventName.AFTER_CALL_MODEL, self, model, json.loads(res["value"][0])
-            )
-            if event_result is not None:
-                return event_result
+    def _decode_query(self, model: str, res: Dict[str, Any]):
+        items = json.loads(res["value"][0])
+        # embeddings sent as one float32 matrix, see text_generator._pack_results
+        embeddings = res.get("embeddings", None)
+        if embeddings is not None:
+            for item in items:
+                if "embedding_row" in item:
+                    item["predict"] = embeddings[item.pop("embedding_row")]
 
-            return json.loads(res["value"][0])
-        except Exception as inst:
-            raise inst
+        event_result = self._trigger_event(
+            EventName.AFTER_CALL_MODEL, self, model, items
+        )
+        if event_result is not None:
+            return event_result
+
+        return items
+
+    def _query(self, model: str, input_value: List[Dict[str, Any]]):
+        event_result, new_input_value, worker_id = self._encode_query(
+            model, input_value
+        )
+        if event_result is not None:
+            return event_result
+
+        if self.client_dispatch:
+            res = self._apply_with_worker_pool(model, worker_id, new_input_value)
+        else:
+            res = self._apply_with_udf_master(model, worker_id, new_input_value)
+
+        return self._decode_query(model, res)
+
+    def _apply_with_udf_master(
+        self, model: str, worker_id: int, new_input_value: List[str]
+    ):
+        udf_master = ray.get_actor(model)
+        index = -1
+        try:
+            [index, worker] = ray.get(udf_master.get.remote(worker_id))
+            return ray.get(worker.async_apply.remote(new_input_value))
         finally:
             if index != -1:
                 ray.get(udf_master.give_back.remote(index))
+
+    def _apply_with_worker_pool(
+        self, model: str, worker_id: int, new_input_value: List[str]
+    ):
+        load_balance = self.sys_conf.get("load_balance", "lru")
+        for retry in range(2):
+            pool = self.worker_pools.get(model, load_balance=load_balance)
+            index, worker = pool.lease(worker_id)
+            try:
+                return ray.get(worker.async_apply.remote(new_input_value))
+            except ray.exceptions.RayActorError:
+                # the model was redeployed or the worker died, refresh the handles once
+                self.worker_pools.invalidate(model)
+                if retry == 1:
+                    raise
+            finally:
+                pool.release(index)
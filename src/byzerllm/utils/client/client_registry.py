@@ -0,0 +1,67 @@
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+import ray
+
+if TYPE_CHECKING:
+    from byzerllm.utils.client.byzerllm_client import ByzerLLM
+
+
+class ByzerLLMRegistry:
+    """
+    Process wide cache of ByzerLLM clients for models given by name, e.g.
+    `@byzerllm.prompt(llm="model")`. A client is configured once
+    (`setup_default_model_name` + `setup_template(model, "auto")`) and reused,
+    together with its meta cache and worker pools.
+
+    Clients are keyed by the model name, the url and the Ray namespace of the
+    connection, and the extra ByzerLLM kwargs. Deploying or undeploying a model through
+    ByzerLLM invalidates its clients.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients: Dict[Tuple, "ByzerLLM"] = {}
+
+    def _key(self, model: str, url: Optional[str], kwargs: Dict[str, Any]) -> Tuple:
+        namespace = ray.get_runtime_context().namespace if ray.is_initialized() else None
+        return (model, url, namespace, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+
+    def get(self, model: str, url: Optional[str] = None, **kwargs) -> "ByzerLLM":
+        from byzerllm.utils.client.byzerllm_client import ByzerLLM
+
+        key = self._key(model, url, kwargs)
+        client = self.clients.get(key)
+        if client is not None:
+            return client
+
+        # configure outside of the lock, setup_template("auto") asks the model for its meta
+        client = ByzerLLM(url, **kwargs)
+        client.setup_default_model_name(model)
+        client.setup_template(model, "auto")
+        with self.lock:
+            return self.clients.setdefault(key, client)
+
+    def invalidate(self, model: Optional[str] = None):
+        with self.lock:
+            if model is None:
+                self.clients.clear()
+                return
+            for key in [key for key in self.clients if key[0] == model]:
+                del self.clients[key]
+
+    def __len__(self):
+        return len(self.clients)
+
+
+llm_registry = ByzerLLMRegistry()
+
+
+def get_llm_client(model: str, url: Optional[str] = None, **kwargs) -> "ByzerLLM":
+    """The shared, configured client of `model`, see ByzerLLMRegistry."""
+    return llm_registry.get(model, url, **kwargs)
+
+
+def invalidate_llm_clients(model: Optional[str] = None):
+    """Drop the shared clients of `model`, or all of them."""
+    llm_registry.invalidate(model)
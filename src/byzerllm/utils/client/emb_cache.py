@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def emb_cache_key(model: str, text: Any, params: Dict[str, Any]) -> str:
+    """
+    The cache key of one embedding: the model, the NFC normalized text and
+    the remaining request parameters (sorted, so the order of llm_config does not matter).
+    """
+    if isinstance(text, str):
+        text = unicodedata.normalize("NFC", text)
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(text, ensure_ascii=False).encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(params, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caches embedding results of `ByzerLLM.emb` by content.
+
+    The first tier is an in-memory LRU of `max_items` entries. When `path` is set the
+    entries are also written to a sqlite file, a miss in memory is looked up there and
+    promoted back to the LRU, so the cache survives restarts and can be shared by processes
+    on the same machine.
+
+    A value is the `(output, metadata)` pair returned by the model.
+    """
+
+    def __init__(self, max_items: int = 100000, path: Optional[str] = None):
+        self.max_items = max_items
+        self.path = path
+        self.lock = threading.Lock()
+        self.items: "OrderedDict[str, Tuple[Any, Dict[str, Any]]]" = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.conn = None
+        if path:
+            dirname = os.path.dirname(os.path.abspath(path))
+            os.makedirs(dirname, exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS emb_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self.conn.commit()
+
+    def _remember(self, key: str, value: Tuple[Any, Dict[str, Any]]):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> List[Optional[Tuple[Any, Dict[str, Any]]]]:
+        with self.lock:
+            values = []
+            missing = []
+            for i, key in enumerate(keys):
+                value = self.items.get(key)
+                if value is not None:
+                    self.items.move_to_end(key)
+                else:
+                    missing.append(i)
+                values.append(value)
+
+            if missing and self.conn is not None:
+                missing_keys = list({keys[i] for i in missing})
+                found = {}
+                # stay below sqlite's limit of host parameters
+                for start in range(0, len(missing_keys), 500):
+                    chunk = missing_keys[start : start + 500]
+                    rows = self.conn.execute(
+                        f"SELECT key, value FROM emb_cache WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                    for key, value in rows:
+                        output, metadata = json.loads(value)
+                        found[key] = (output, metadata)
+                        self._remember(key, found[key])
+                still_missing = []
+                for i in missing:
+                    if keys[i] in found:
+                        values[i] = found[keys[i]]
+                        self.disk_hits += 1
+                    else:
+                        still_missing.append(i)
+                missing = still_missing
+
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+            return values
+
+    def put_many(self, items: List[Tuple[str, Tuple[Any, Dict[str, Any]]]]):
+        with self.lock:
+            for key, value in items:
+                self._remember(key, value)
+            if self.conn is not None and items:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO emb_cache (key, value) VALUES (?, ?)",
+                    [
+                        (key, json.dumps([output, metadata], ensure_ascii=False))
+                        for key, (output, metadata) in items
+                    ],
+                )
+                self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM emb_cache")
+                self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_items": len(self.items),
+                "max_items": self.max_items,
+                "path": self.path,
+            }
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
@@ -13,7 +13,7 @@ from fastapi.responses import JSONResponse, StreamingResponse, Response
 from byzerllm.log import init_logger
 from byzerllm.utils import random_uuid
 from byzerllm.version import __version__ as version
-from byzerllm.utils.client import ByzerLLM, LLMRequest
+from byzerllm.utils.client import ByzerLLM, AsyncByzerLLM, LLMRequest
 from byzerllm.utils.client.entrypoints.openai.serving_chat import OpenAIServingChat
 from byzerllm.utils.client.entrypoints.openai.serving_completion import OpenAIServingCompletion
 from byzerllm.utils.client.entrypoints.openai.protocol import (
@@ -141,7 +141,7 @@ async def embed(body: EmbeddingCompletionRequest):
     # Generate embeddings for each input
     results_list = []
     for text in inputs:
-        result = llm_client.emb(body.model, request=LLMRequest(instruction=text))
+        result = await openai_serving_chat.emb(body.model, text)
         results_list.extend(result)
 
     # Build response data
@@ -263,7 +263,7 @@ if __name__ == "__main__":
 
     # Register labels for metrics
     # add_global_metrics_labels(model_name=engine_args.model)
-    llm_client = ByzerLLM()
+    llm_client = AsyncByzerLLM()
 
     openai_serving_chat = OpenAIServingChat(
         llm_client=llm_client,
@@ -139,7 +139,7 @@ async def embed(body: EmbeddingCompletionRequest):
     # Generate embeddings for each input
     results_list = []
     for text in inputs:
-        result = llm_client.emb(body.model, request=LLMRequest(instruction=text))
+        result = await openai_serving_chat.emb(body.model, text)
         results_list.extend(result)
 
     # Build response data
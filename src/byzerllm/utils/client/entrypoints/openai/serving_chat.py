@@ -181,14 +181,14 @@ class OpenAIServingChat(OpenAIServing):
         model_name = self.server_model_name or body.model        
 
         async def wrapper_chat_generator():
-            r = await asyncfy_with_semaphore(lambda: self.llm_client.chat_oai(
+            r = await self.chat(
                 model=model_name,
                 conversations=body.messages,
                 llm_config={
                     "gen.request_id": request_id,
                     **body.to_llm_config()
                 }
-            ))()
+            )
             for _ in r:
                 yield _
 
@@ -10,6 +10,7 @@ from fastapi import Request
 from byzerllm.utils.types import SingleOutputMeta
 from byzerllm.utils import random_uuid
 from byzerllm.utils.client import ByzerLLM, LLMResponse
+from byzerllm.utils.langutil import asyncfy_with_semaphore
 from byzerllm.utils.client.entrypoints.openai.protocol import (
     CompletionRequest,
     CompletionResponse,
@@ -68,7 +69,7 @@ class OpenAIServingCompletion(OpenAIServing):
 
         # Non-streaming response
         async def wrapper_chat_generator():
-            r = self.llm_client.chat_oai(
+            r = await self.chat(
                 model=model_name,
                 conversations=[
                     {
@@ -84,12 +85,12 @@ class OpenAIServingCompletion(OpenAIServing):
             for _ in r:
                 yield _
 
-        result_generator = await asyncio.to_thread(wrapper_chat_generator)
+        result_generator = wrapper_chat_generator()
         final_res = None
         async for res in result_generator:
             if await request.is_disconnected():
                 # Abort the request if the client disconnects.
-                await self.llm_client.abort(request_id, model=model_name)
+                await asyncfy_with_semaphore(lambda: self.llm_client.abort(request_id, model=model_name))()
                 return self.create_error_response("Client disconnected")
             final_res = res
         assert final_res is not None
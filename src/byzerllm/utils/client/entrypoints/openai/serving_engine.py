@@ -9,7 +9,8 @@ from http import HTTPStatus
 from typing import Dict, List, Optional, Union
 
 from byzerllm.log import init_logger
-from byzerllm.utils.client import ByzerLLM, Templates
+from byzerllm.utils.client import ByzerLLM, AsyncByzerLLM, LLMRequest, LLMResponse, Templates
+from byzerllm.utils.langutil import asyncfy_with_semaphore
 from byzerllm.utils.client.entrypoints.openai.protocol import (
     CompletionRequest,
     ChatCompletionRequest,
@@ -47,6 +48,24 @@ class OpenAIServing:
                 server_model_name, self._detect_prompt_template(prompt_template)
             )
 
+    async def chat(self, model: str, conversations, llm_config: Dict) -> List[LLMResponse]:
+        """chat_oai without blocking the event loop."""
+        if isinstance(self.llm_client, AsyncByzerLLM):
+            return await self.llm_client.achat_oai(
+                model=model, conversations=conversations, llm_config=llm_config
+            )
+        return await asyncfy_with_semaphore(lambda: self.llm_client.chat_oai(
+            model=model, conversations=conversations, llm_config=llm_config
+        ))()
+
+    async def emb(self, model: str, text: str) -> List[LLMResponse]:
+        """emb without blocking the event loop."""
+        if isinstance(self.llm_client, AsyncByzerLLM):
+            return await self.llm_client.aemb(model, request=LLMRequest(instruction=text))
+        return await asyncfy_with_semaphore(
+            lambda: self.llm_client.emb(model, request=LLMRequest(instruction=text))
+        )()
+
     async def show_available_models(self) -> ModelList:
         """Show available models. Right now we only have one model."""
         model_cards = [
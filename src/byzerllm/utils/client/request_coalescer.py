@@ -0,0 +1,151 @@
+import asyncio
+import concurrent.futures
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+def chat_request_key(model: str, v: List[Dict[str, Any]]) -> str:
+    """The key of a chat request: the model and the items (instruction, history, generation params)."""
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(v, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def is_deterministic(v: List[Dict[str, Any]]) -> bool:
+    # the generators sample with temperature 0.9 unless told otherwise
+    try:
+        return all(float(item.get("temperature", 0.9)) == 0 for item in v)
+    except (TypeError, ValueError):
+        return False
+
+
+class RequestCoalescer:
+    """
+    Single flight for identical requests: while a request is in flight, identical requests
+    wait for its result instead of calling the model again. With `cache_ttl > 0` results are
+    also kept for `cache_ttl` seconds in an LRU of `max_items` entries.
+
+    Every caller gets its own copy of the result. A failed request is not cached, the callers
+    waiting for it get the error.
+    """
+
+    def __init__(
+        self,
+        cache_ttl: float = 0,
+        max_items: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.cache_ttl = cache_ttl
+        self.max_items = max_items
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.inflight: Dict[str, concurrent.futures.Future] = {}
+        self.async_inflight: Dict[Tuple[int, str], "asyncio.Task"] = {}
+        # key -> (expire time, result)
+        self.cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+        self.requests = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+    def _cached(self, key: str) -> Tuple[bool, Any]:
+        item = self.cache.get(key)
+        if item is None:
+            return False, None
+        expire_at, result = item
+        if expire_at < self.clock():
+            del self.cache[key]
+            return False, None
+        self.cache.move_to_end(key)
+        self.cache_hits += 1
+        return True, result
+
+    def _remember(self, key: str, result: Any):
+        if self.cache_ttl <= 0:
+            return
+        with self.lock:
+            self.cache[key] = (self.clock() + self.cache_ttl, result)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_items:
+                self.cache.popitem(last=False)
+
+    def run(self, key: str, func: Callable[[], Any]) -> Any:
+        with self.lock:
+            self.requests += 1
+            found, result = self._cached(key)
+            if found:
+                return copy.deepcopy(result)
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self.inflight[key] = future
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = func()
+        except BaseException as e:
+            with self.lock:
+                self.inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        # cache before leaving the flight, so the next identical request finds one or the other
+        self._remember(key, result)
+        with self.lock:
+            self.inflight.pop(key, None)
+        future.set_result(result)
+        return copy.deepcopy(result)
+
+    async def arun(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self.lock:
+            self.requests += 1
+            found, result = self._cached(key)
+            if found:
+                return copy.deepcopy(result)
+            task = self.async_inflight.get(loop_key)
+            if task is None:
+                task = asyncio.ensure_future(func())
+                self.async_inflight[loop_key] = task
+                self.executed += 1
+
+                def done(t):
+                    with self.lock:
+                        self.async_inflight.pop(loop_key, None)
+                    if not t.cancelled() and t.exception() is None:
+                        self._remember(key, t.result())
+
+                task.add_done_callback(done)
+            else:
+                self.coalesced += 1
+        # a cancelled caller must not cancel the request the others wait for
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "cache_hits": self.cache_hits,
+                "inflight": len(self.inflight) + len(self.async_inflight),
+                "cache_items": len(self.cache),
+            }
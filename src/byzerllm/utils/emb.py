@@ -1,5 +1,11 @@
 from langchain.embeddings.base import Embeddings
-from typing import List, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import json
+import os
+import numpy as np
+
+from byzerllm.utils.langutil import asyncfy_with_semaphore
 
 try:
     import torch
@@ -21,10 +27,13 @@ try:
             else:
                 self.device = device
 
+        def _encode_array(self, texts: List[str], extract_params={}):
+            return np.asarray(
+                self.model.encode(texts, **extract_params), dtype=np.float32
+            )
+
         def _encode(self, texts: List[str], extract_params={}):
-            embeddings = [
-                emb.tolist() for emb in self.model.encode(texts, **extract_params)
-            ]
+            embeddings = [emb.tolist() for emb in self._encode_array(texts, extract_params)]
             return embeddings
 
         def embed_documents(
@@ -37,6 +46,9 @@ try:
             embedding = self._encode([text], extract_params)
             return embedding[0]
 
+        def embed_query_array(self, text: str, extract_params={}) -> np.ndarray:
+            return self._encode_array([text], extract_params)[0]
+
     class ByzerLLMEmbeddings(Embeddings):
         def __init__(
             self, model, tokenizer, device="auto", use_feature_extraction=False
@@ -57,14 +69,29 @@ try:
                     "feature-extraction", model=model, tokenizer=tokenizer, device=0
                 )
 
+        def _pipeline_vectors(self, texts: List[str]):
+            outputs = self.pipeline(texts, batch_size=len(texts))
+            tokenizer = self.pipeline.tokenizer
+            if getattr(tokenizer, "padding_side", "right") == "left":
+                return [out[0][-1] for out in outputs]
+            # the outputs of a batch are padded to its longest text, the hidden state of a
+            # text's last token is at its own token length
+            return [
+                out[0][len(tokenizer(text)["input_ids"]) - 1]
+                for text, out in zip(texts, outputs)
+            ]
+
+        def _encode_array(self, texts: List[str], extract_params={}):
+            if self.pipeline:
+                return np.asarray(self._pipeline_vectors(texts), dtype=np.float32)
+            _, embeddings = self.get_embedding_with_token_count(texts)
+            return embeddings.detach().cpu().numpy().astype(np.float32, copy=False)
+
         def _encode(self, texts: List[str], extract_params={}):
             if self.pipeline:
-                return [self.pipeline(text)[0][-1] for text in texts]
+                return self._pipeline_vectors(texts)
             else:
-                _, embeddings = self.get_embedding_with_token_count(texts)
-                embeddings = embeddings.detach().cpu()
-                embeddings = embeddings.numpy()
-                embeddings = [emb.tolist() for emb in embeddings]
+                embeddings = [emb.tolist() for emb in self._encode_array(texts, extract_params)]
                 return embeddings
 
         def embed_documents(
@@ -77,6 +104,9 @@ try:
             embedding = self._encode([text], extract_params)
             return embedding[0]
 
+        def embed_query_array(self, text: str, extract_params={}) -> np.ndarray:
+            return self._encode_array([text], extract_params)[0]
+
         # copied from https://huggingface.co/sentence-transformers/all-MiniLM-L6-v2#usage-huggingface-transformers
         def get_embedding_with_token_count(
             self,
@@ -135,3 +165,177 @@ except ImportError:
 
         def embed_query(self, *args, **kwargs):
             raise ImportError("transformers is not installed")
+
+
+EMB_BATCH_SIZE = int(os.environ.get("BYZERLLM_EMB_BATCH_SIZE", "32"))
+EMB_BATCH_WAIT_MS = float(os.environ.get("BYZERLLM_EMB_BATCH_WAIT_MS", "2"))
+
+_EMB_BATCH_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def setup_emb_batching(infer_params: Dict[str, Any]):
+    """
+    Reads `embedding.batch_size` and `embedding.batch_wait_ms` from the infer params
+    of a deployed model. A worker process hosts one model, so the options are process wide.
+    `embedding.batch_size` <= 1 turns the micro-batching off.
+    """
+    global EMB_BATCH_SIZE, EMB_BATCH_WAIT_MS
+    if "embedding.batch_size" in infer_params:
+        EMB_BATCH_SIZE = int(infer_params["embedding.batch_size"])
+    if "embedding.batch_wait_ms" in infer_params:
+        EMB_BATCH_WAIT_MS = float(infer_params["embedding.batch_wait_ms"])
+
+
+class _EmbBatchMetrics:
+    """Histogram of the batch sizes, exported through the Ray metrics agent inside a Ray worker."""
+
+    def __init__(self):
+        self.histogram = None
+        try:
+            import ray
+            from ray.util.metrics import Histogram
+
+            if not ray.is_initialized():
+                return
+            self.histogram = Histogram(
+                "byzerllm_emb_batch_size",
+                description="texts encoded in one forward pass of an embedding model",
+                boundaries=_EMB_BATCH_BUCKETS,
+            )
+        except Exception:
+            self.histogram = None
+
+    def observe(self, batch_size: int):
+        if self.histogram is not None:
+            self.histogram.observe(batch_size)
+
+
+class EmbeddingMicroBatcher:
+    """
+    Collects the concurrent single text embedding requests of a worker and encodes them
+    in one forward pass.
+
+    A batch is flushed when it has `max_batch_size` texts or `max_wait_ms` after its
+    first text arrived. Requests with different extract_params are never mixed. The texts
+    of a batch are sorted by length, so encoders that split it again
+    (SentenceTransformer.encode, feature-extraction pipelines) pad texts of similar length together.
+    When a batch fails it is bisected, only the requests of the failing texts get the error.
+    """
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str], Dict[str, Any]], Any],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2,
+    ):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self.params: Dict[str, Dict[str, Any]] = {}
+        self.timers: Dict[str, asyncio.TimerHandle] = {}
+        self.batches = 0
+        self.requests = 0
+        self.histogram = {bucket: 0 for bucket in _EMB_BATCH_BUCKETS}
+        self.metrics = _EmbBatchMetrics()
+
+    async def embed(self, text: str, extract_params: Dict[str, Any] = {}):
+        loop = asyncio.get_running_loop()
+        key = json.dumps(extract_params, sort_keys=True, default=str)
+        future = loop.create_future()
+        batch = self.pending.setdefault(key, [])
+        batch.append((text, future))
+        self.params[key] = extract_params
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self.timers:
+            self.timers[key] = loop.call_later(self.max_wait_ms / 1000, self._flush, key)
+        return await future
+
+    def _flush(self, key: str):
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(key, None)
+        if batch:
+            asyncio.ensure_future(self._run(batch, self.params.pop(key)))
+
+    def _record(self, batch_size: int):
+        self.batches += 1
+        self.requests += batch_size
+        for bucket in _EMB_BATCH_BUCKETS:
+            if batch_size <= bucket:
+                self.histogram[bucket] += 1
+                break
+        else:
+            self.histogram[_EMB_BATCH_BUCKETS[-1]] += 1
+        self.metrics.observe(batch_size)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]], extract_params: Dict[str, Any]):
+        self._record(len(batch))
+        order = sorted(range(len(batch)), key=lambda i: len(batch[i][0]))
+        await self._encode([batch[i] for i in order], extract_params)
+
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future]], extract_params: Dict[str, Any]):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await asyncfy_with_semaphore(
+                lambda: self.encode_batch(texts, extract_params)
+            )()
+        except Exception as inst:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(inst)
+                return
+            # bisect, so only the requests whose text fails the encoder get the error
+            middle = len(batch) // 2
+            await self._encode(batch[:middle], extract_params)
+            await self._encode(batch[middle:], extract_params)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "batch_size_histogram": {
+                f"<={bucket}": count for bucket, count in self.histogram.items()
+            },
+        }
+
+
+# keyed by the id of the underlying model, the embedding wrappers are created per request
+_EMB_BATCHERS: Dict[int, EmbeddingMicroBatcher] = {}
+
+
+def get_emb_batcher(embedding) -> Optional[EmbeddingMicroBatcher]:
+    """
+    The micro-batcher of a local embedding model, None for other models (e.g. SaaS
+    models, whose API calls are not batched) or when batching is turned off.
+    """
+    if EMB_BATCH_SIZE <= 1:
+        return None
+    if not isinstance(embedding, (ByzerLLMEmbeddings, ByzerSentenceTransformerEmbeddings)):
+        return None
+
+    model = embedding.model
+    batcher = _EMB_BATCHERS.get(id(model))
+    if batcher is not None:
+        return batcher
+
+    if hasattr(model, "embed_documents"):
+        # e.g. bge, the SentenceTransformer carries its own embed_documents
+        encode_batch = lambda texts, params: model.embed_documents(texts, extract_params=params)
+    else:
+        encode_batch = lambda texts, params: embedding._encode_array(texts, params)
+
+    batcher = EmbeddingMicroBatcher(
+        encode_batch, max_batch_size=EMB_BATCH_SIZE, max_wait_ms=EMB_BATCH_WAIT_MS
+    )
+    _EMB_BATCHERS[id(model)] = batcher
+    return batcher
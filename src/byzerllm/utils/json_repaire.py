@@ -1,57 +1,75 @@
 import json
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+# returned by parse_number for a stray "-", parse_json moves on to the next character
+_SKIPPED = object()
+
 
 class JSONParser:
     def __init__(self, json_str: str) -> None:
-        # The string to parse
-        self.json_str = json_str
-        # Index is our iterator that will keep track of which character we are looking at right now
-        self.index = 0
+        # The string to parse, it is never rebuilt. The repaired text is kept as a gap buffer around
+        # the cursor: `out` holds everything before the cursor, `ahead` (a stack) and `json_str[pos:]`
+        # everything after it, so inserting or removing a character next to the cursor is O(1)
+        self.src = json_str
+        self.pos = 0
+        self.ahead: List[str] = []
+        self.out: List[str] = []
         # This is used in the object member parsing to manage the special cases of missing quotes in key or value
         self.context = ""
 
+    @property
+    def index(self) -> int:
+        # Index of the character we are looking at right now in the repaired text
+        return len(self.out)
+
+    @property
+    def json_str(self) -> str:
+        return "".join(self.out) + "".join(reversed(self.ahead)) + self.src[self.pos :]
+
     def parse(self) -> Union[Dict[str, Any], List[Any], str, float, int, bool, None]:
         return self.parse_json()
 
     def parse_json(
         self,
     ) -> Union[Dict[str, Any], List[Any], str, float, int, bool, None]:
-        char = self.get_char_at()
-        # False means that we are at the end of the string provided, is the base case for recursion
-        if char is False:
-            return ""
-        # <object> starts with '{'
-        elif char == "{":
-            self.index += 1
-            return self.parse_object()
-        # <array> starts with '['
-        elif char == "[":
-            self.index += 1
-            return self.parse_array()
-        # there can be an edge case in which a key is empty and at the end of an object
-        # like "key": }. We return an empty string here to close the object properly
-        elif char == "}" and self.context == "object_value":
-            return ""
-        # <string> starts with '"'
-        elif char == '"':
-            return self.parse_string()
-        elif char == "'":
-            return self.parse_string(string_quotes="'")
-        elif char == "“":
-            return self.parse_string(string_quotes=["“", "”"])
-        # <number> starts with [0-9] or minus
-        elif char.isdigit() or char == "-":
-            return self.parse_number()
-        # <boolean> could be (T)rue or (F)alse or (N)ull
-        elif char.lower() in ["t", "f", "n"]:
-            return self.parse_boolean_or_null()
-        # This might be a <string> that is missing the starting '"'
-        elif char.isalpha():
-            return self.parse_string()
-        # If everything else fails, we just ignore and move on
-        else:
-            self.index += 1
-            return self.parse_json()
+        while True:
+            char = self.get_char_at()
+            # False means that we are at the end of the string provided
+            if char is False:
+                return ""
+            # <object> starts with '{'
+            elif char == "{":
+                self.advance()
+                return self.parse_object()
+            # <array> starts with '['
+            elif char == "[":
+                self.advance()
+                return self.parse_array()
+            # there can be an edge case in which a key is empty and at the end of an object
+            # like "key": }. We return an empty string here to close the object properly
+            elif char == "}" and self.context == "object_value":
+                return ""
+            # <string> starts with '"'
+            elif char == '"':
+                return self.parse_string()
+            elif char == "'":
+                return self.parse_string(string_quotes="'")
+            elif char == "“":
+                return self.parse_string(string_quotes=["“", "”"])
+            # <number> starts with [0-9] or minus
+            elif char.isdigit() or char == "-":
+                value = self.parse_number()
+                if value is not _SKIPPED:
+                    return value
+            # <boolean> could be (T)rue or (F)alse or (N)ull
+            elif char.lower() in ["t", "f", "n"]:
+                return self.parse_boolean_or_null()
+            # This might be a <string> that is missing the starting '"'
+            elif char.isalpha():
+                return self.parse_string()
+            # If everything else fails, we just ignore and move on
+            else:
+                self.advance()
 
     def parse_object(self) -> Dict[str, Any]:
         # <object> ::= '{' [ <member> *(', ' <member>) ] '}' ; A sequence of 'members'
@@ -68,7 +86,7 @@ class JSONParser:
             if (self.get_char_at() or "") == ":":
                 self.remove_char_at()
                 self.insert_char_at(",")
-                self.index += 1
+                self.advance()
 
             # We are now searching for they string key
             # Context is used in the string parser to manage the lack of quotes
@@ -93,7 +111,7 @@ class JSONParser:
             # An extreme case of missing ":" after a key
             if (self.get_char_at() or "") != ":":
                 self.insert_char_at(":")
-            self.index += 1
+            self.advance()
             self.context = "object_value"
             # The value can be any valid json
             value = self.parse_json()
@@ -103,7 +121,7 @@ class JSONParser:
             obj[key] = value
 
             if (self.get_char_at() or "") == ",":
-                self.index += 1
+                self.advance()
 
             # Remove trailing spaces
             self.skip_whitespaces_at()
@@ -111,7 +129,7 @@ class JSONParser:
         # Especially at the end of an LLM generated json you might miss the last "}"
         if (self.get_char_at() or "}") != "}":
             self.insert_char_at("}")
-        self.index += 1
+        self.advance()
         return obj
 
     def parse_array(self) -> List[Any]:
@@ -130,7 +148,7 @@ class JSONParser:
             # skip over whitespace after a value but before closing ]
             char = self.get_char_at()
             while char and (char.isspace() or char == ","):
-                self.index += 1
+                self.advance()
                 char = self.get_char_at()
 
         # Especially at the end of an LLM generated json you might miss the last "]"
@@ -142,7 +160,7 @@ class JSONParser:
                 self.remove_char_at()
             self.insert_char_at("]")
 
-        self.index += 1
+        self.advance()
         return arr
 
     def parse_string(self, string_quotes=False) -> str:
@@ -163,7 +181,7 @@ class JSONParser:
             self.insert_char_at(lstring_delimiter)
             fixed_quotes = True
         else:
-            self.index += 1
+            self.advance()
 
         # Start position of the string (to use later in the return value)
         start = self.index
@@ -174,7 +192,7 @@ class JSONParser:
         # * It finds a closing quote
         # * It iterated over the entire sequence
         # * If we are fixing missing quotes in an object, when it finds the special terminators
-        char = self.get_char_at()        
+        char = self.get_char_at()
 
         fix_broken_markdown_link = False
         while char and char != rstring_delimiter:
@@ -183,16 +201,16 @@ class JSONParser:
                     break
                 elif self.context == "object_value" and char in [",", "}"]:
                     break
-            self.index += 1
+            self.advance()
             char = self.get_char_at()
             # If the string contains an escaped character we should respect that or remove the escape
             if self.get_char_at(-1) == "\\":
                 if char in [rstring_delimiter, "t", "n", "r", "b", "\\"]:
-                    self.index += 1
+                    self.advance()
                     char = self.get_char_at()
                 else:
+                    # drop the backslash, the cursor stays on the escaped character
                     self.remove_char_at(-1)
-                    self.index -= 1
             # ChatGPT sometimes forget to quote links in markdown like: { "content": "[LINK]("https://google.com")" }
             if (
                 char == rstring_delimiter
@@ -204,31 +222,29 @@ class JSONParser:
                 )
             ):
                 fix_broken_markdown_link = not fix_broken_markdown_link
-                self.index += 1
+                self.advance()
                 char = self.get_char_at()
 
-            if (char and self.context == "object_value" and char == rstring_delimiter 
-                and self.get_char_at(-1) != "\\" 
+            if (char and self.context == "object_value" and char == rstring_delimiter
+                and self.get_char_at(-1) != "\\"
                 and self.get_char_at(-2) != "\\"):
                 current_index = self.index
-                self.skip_whitespaces_at() 
-                new_index = self.index
-                if new_index == current_index:
-                    self.index += 1
-
-                if self.get_char_at() not in [",", "}","]"]:
-                    self.index = current_index
-                    self.insert_char_at("\\")                                                           
-                    self.index -= 2
+                self.skip_whitespaces_at()
+                if self.index == current_index:
+                    self.advance()
+
+                # Look past the quote, an unescaped quote inside of a value is not followed by a terminator
+                terminated = self.get_char_at() in [",", "}", "]"]
+                self.rewind(self.index - current_index)
+                if not terminated:
+                    self.insert_char_at("\\")
+                    self.rewind(2)
                     char = self.get_char_at()
-                else:
-                    self.index = current_index    
 
         if char and fixed_quotes and self.context == "object_key" and char.isspace():
             self.skip_whitespaces_at()
             if self.get_char_at() not in [":", ","]:
                 return ""
-                                            
 
         end = self.index
 
@@ -236,26 +252,26 @@ class JSONParser:
         if char != rstring_delimiter:
             self.insert_char_at(rstring_delimiter)
         else:
-            self.index += 1
+            self.advance()
 
-        return self.json_str[start:end]
+        return "".join(self.out[start:end])
 
     def parse_number(self) -> Union[float, int, str]:
         # <number> is a valid real number expressed in one of a number of given formats
-        number_str = ""
         number_chars = set("0123456789-.eE")
+        start = self.index
         char = self.get_char_at()
         while char and char in number_chars:
-            number_str += char
-            self.index += 1
+            self.advance()
             char = self.get_char_at()
+        number_str = "".join(self.out[start:])
         if number_str:
             try:
                 if "." in number_str or "e" in number_str or "E" in number_str:
                     return float(number_str)
                 elif number_str == "-":
                     # If there is a stray "-" this will throw an exception, throw away this character
-                    return self.parse_json()
+                    return _SKIPPED
                 else:
                     return int(number_str)
             except ValueError:
@@ -267,45 +283,253 @@ class JSONParser:
     def parse_boolean_or_null(self) -> Union[bool, str, None]:
         # <boolean> is one of the literal strings 'true', 'false', or 'null' (unquoted)
         boolean_map = {"true": (True, 4), "false": (False, 5), "null": (None, 4)}
+        word = self.peek(5).lower()
         for key, (value, length) in boolean_map.items():
-            if self.json_str.lower().startswith(key, self.index):
-                self.index += length
+            if word.startswith(key):
+                self.advance(length)
                 return value
 
         # This is a string then
         return self.parse_string()
 
+    def advance(self, count: int = 1) -> None:
+        # Move the cursor forward, the characters it passes become part of the repaired text
+        for _ in range(count):
+            if self.ahead:
+                self.out.append(self.ahead.pop())
+            elif self.pos < len(self.src):
+                self.out.append(self.src[self.pos])
+                self.pos += 1
+            else:
+                return
+
+    def rewind(self, count: int = 1) -> None:
+        # Move the cursor back, the inverse of advance
+        for _ in range(min(count, len(self.out))):
+            self.ahead.append(self.out.pop())
+
+    def peek(self, count: int) -> str:
+        chars = []
+        for i in range(count):
+            char = self.get_char_at(i)
+            if char is False:
+                break
+            chars.append(char)
+        return "".join(chars)
+
     def insert_char_at(self, char: str) -> None:
-        self.json_str = self.json_str[: self.index] + char + self.json_str[self.index :]
-        self.index += 1
+        # Insert a character at the cursor and move past it
+        self.out.append(char)
 
     def get_char_at(self, count: int = 0) -> Union[str, bool]:
         # Why not use something simpler? Because we might be out of bounds and doing this check all the time is annoying
-        try:
-            return self.json_str[self.index + count]
-        except IndexError:
-            return False
+        if count < 0:
+            return self.out[count] if -count <= len(self.out) else False
+        if count < len(self.ahead):
+            return self.ahead[-1 - count]
+        i = self.pos + count - len(self.ahead)
+        return self.src[i] if i < len(self.src) else False
 
     def remove_char_at(self, count: int = 0) -> None:
-        self.json_str = (
-            self.json_str[: self.index + count]
-            + self.json_str[self.index + count + 1 :]
-        )
+        # Only the characters right before (-1) and at (0) the cursor are ever removed
+        if count == -1:
+            if self.out:
+                self.out.pop()
+        elif count == 0:
+            if self.ahead:
+                self.ahead.pop()
+            elif self.pos < len(self.src):
+                self.pos += 1
+        else:
+            raise ValueError(f"can not remove the character at offset {count}")
 
     def skip_whitespaces_at(self) -> None:
-        # Remove trailing spaces
-        # I'd rather not do this BUT this method is called so many times that it makes sense to expand get_char_at
-        # At least this is what the profiler said and I believe in our lord and savior the profiler
-        try:
-            char = self.json_str[self.index]
-        except IndexError:
+        # Skip the spaces at the cursor, runs of plain input are copied in one go
+        while self.ahead and self.ahead[-1].isspace():
+            self.out.append(self.ahead.pop())
+        if self.ahead:
             return
-        while char and char.isspace():
-            self.index += 1
-            try:
-                char = self.json_str[self.index]
-            except IndexError:
+        src, pos = self.src, self.pos
+        end = pos
+        while end < len(src) and src[end].isspace():
+            end += 1
+        if end > pos:
+            self.out.extend(src[pos:end])
+            self.pos = end
+
+
+class StreamingJSONParser:
+    """
+    Repairs a JSON document while it is still being generated, e.g. the answer of a
+    `response_class` chat that arrives through `stream_chat_oai`:
+
+        parser = StreamingJSONParser()
+        for chunk, _ in llm.stream_chat_oai(conversations):
+            parser.feed(chunk)
+            partial = parser.value()
+
+    `feed` only scans the new characters and keeps the nesting state of the document,
+    `value` closes the open string and containers, drops a dangling key or a half written
+    literal, and decodes the result. Anything before the first "{" or "[" (like a ```json
+    fence) and after the closing bracket is ignored.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.length = 0
+        # one frame per open container: [closer, state, start of the current key]
+        # object states: key, in_key, colon, value, after ; array states: value, after
+        self.stack: List[list] = []
+        self.started = False
+        self.done = False
+        self.end = 0
+        self.in_string = False
+        self.escape = False
+        # hex digits of a \uXXXX escape that are still missing
+        self.unicode_left = 0
+        self.literal_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> None:
+        if self.done or not chunk:
+            return
+        offset = self.length
+        if not self.started:
+            starts = [i for i in (chunk.find("{"), chunk.find("[")) if i >= 0]
+            if not starts:
+                return
+            chunk = chunk[min(starts) :]
+            self.started = True
+        self.chunks.append(chunk)
+        self.length += len(chunk)
+        for i, char in enumerate(chunk):
+            self._scan(char, offset + i)
+            if self.done:
+                self.end = offset + i + 1
+                return
+
+    def _scan(self, char: str, offset: int) -> None:
+        if self.in_string:
+            if self.unicode_left:
+                self.unicode_left -= 1
+            elif self.escape:
+                self.escape = False
+                if char == "u":
+                    self.unicode_left = 4
+            elif char == "\\":
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+                frame = self.stack[-1]
+                frame[1] = "colon" if frame[1] == "in_key" else "after"
+            return
+
+        if self.literal_start is not None:
+            if char.isalnum() or char in ".+-":
                 return
+            self.literal_start = None
+            self.stack[-1][1] = "after"
+
+        if char.isspace():
+            return
+        frame = self.stack[-1] if self.stack else None
+        if char in "{[":
+            self.stack.append(["}", "key", None] if char == "{" else ["]", "value", None])
+        elif char in "}]":
+            self.stack.pop()
+            if self.stack:
+                self.stack[-1][1] = "after"
+            else:
+                self.done = True
+        elif char == '"':
+            self.in_string = True
+            if frame[0] == "}" and frame[1] == "key":
+                frame[1] = "in_key"
+                frame[2] = offset
+        elif char == ":":
+            if frame[1] == "colon":
+                frame[1] = "value"
+        elif char == ",":
+            frame[1] = "key" if frame[0] == "}" else "value"
+        else:
+            self.literal_start = offset
+
+    def text(self) -> str:
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0] if self.chunks else ""
+
+    def completed_text(self) -> Optional[str]:
+        """The text fed so far, cut and closed so that it is a complete JSON document."""
+        if not self.started:
+            return None
+        text = self.text()
+        if self.done:
+            return text[: self.end]
+
+        frame = self.stack[-1]
+        in_object = frame[0] == "}"
+        # the index where the text is cut, `None` drops the current member of an object
+        cut: Optional[int] = len(text)
+        close_string = False
+        if self.in_string:
+            if frame[1] == "in_key":
+                cut = None
+            else:
+                close_string = True
+                if self.escape:
+                    cut -= 1
+                elif self.unicode_left:
+                    cut -= 6 - self.unicode_left
+        elif self.literal_start is not None:
+            literal = text[self.literal_start :]
+            while literal and not _is_json_literal(literal):
+                literal = literal[:-1]
+            if literal:
+                cut = self.literal_start + len(literal)
+            elif in_object:
+                cut = None
+            else:
+                cut = self.literal_start
+        elif in_object and frame[1] in ["colon", "value"]:
+            cut = None
+
+        if cut is None:
+            cut = frame[2]
+        if close_string:
+            head = text[:cut] + '"'
+        else:
+            head = text[:cut].rstrip()
+            if head.endswith(","):
+                head = head[:-1]
+        return head + "".join(f[0] for f in reversed(self.stack))
+
+    def value(self) -> Union[Dict[str, Any], List[Any], None]:
+        """The best effort decoding of the text fed so far, None before the document starts."""
+        text = self.completed_text()
+        if text is None:
+            return None
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return loads(text)
+
+
+def _is_json_literal(literal: str) -> bool:
+    try:
+        json.loads(literal)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def iter_partial_json(chunks: Iterable[str]) -> Iterator[Union[Dict[str, Any], List[Any]]]:
+    """Yields the partial document after every chunk, see StreamingJSONParser."""
+    parser = StreamingJSONParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        value = parser.value()
+        if value is not None:
+            yield value
 
 
 def repair_json(
@@ -351,4 +575,4 @@ def loads(
     This function works like `json.loads()` except that it will fix your JSON in the process.
     It is a wrapper around the `repair_json()` function with `return_objects=True`.
     """
-    return repair_json(json_str, True)
\ No newline at end of file
+    return repair_json(json_str, True)
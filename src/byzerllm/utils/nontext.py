@@ -2,6 +2,7 @@ from typing import List, Dict, Any, Union, Optional
 import pydantic
 import base64
 import os
+import re
 
 
 class Tag(pydantic.BaseModel):
@@ -11,6 +12,21 @@ class Tag(pydantic.BaseModel):
     parent: Optional["Tag"] = None
 
 
+NONTEXT_MEDIA = ("image", "audio")
+NONTEXT_START_TAGS = tuple(f"<_{media}_>" for media in NONTEXT_MEDIA)
+
+_TAG_CANDIDATE = re.compile(r"</?_")
+_BLANKS = re.compile(r"[\n \t\r]*")
+
+
+def may_have_nontext(text: str) -> bool:
+    """
+    A cheap check before the tags are extracted: text without an image or audio
+    start tag has no non-text content.
+    """
+    return isinstance(text, str) and any(tag in text for tag in NONTEXT_START_TAGS)
+
+
 class TagExtractor:
     def __init__(self, text: str):
         self.text = text
@@ -54,7 +70,9 @@ class TagExtractor:
         while self.peek() and self.peek() != ">":
             tag += self.next()
         tag += self.next()
+        return self._open_tag(tag)
 
+    def _open_tag(self, tag: str) -> str:
         if self.current_tag is None or self.current_tag == self.root_tag:
             self.current_tag = Tag(
                 start_tag=tag, end_tag="", content="", parent=self.root_tag
@@ -108,6 +126,9 @@ class TagExtractor:
         while self.peek() and self.peek() != ">":
             tag += self.next()
         tag += self.next()
+        return self._close_tag(tag)
+
+    def _close_tag(self, tag: str) -> str:
         self.current_tag.end_tag = tag
         self.current_tag = self.current_tag.parent
         return tag
@@ -169,26 +190,76 @@ class TagExtractor:
         return content
 
     def extract(self) -> Union[Tag]:
+        """
+        Builds the tag tree like walking the text with `peek`/`next`, but jumps from one
+        candidate tag (`<_` or `</_`) to the next with a compiled regex, so the text
+        between tags is sliced instead of read char by char.
+        """
         if self.is_extracted:
             return self.root_tag
-        while True:
-            if self.pos == self.len - 1:
-                break
-            if self.is_start_tag():
-                self.extract_start_tag()
-            elif self.is_end_tag():
-                self.extract_end_tag()
+        text = self.text
+        pos = self.pos + 1
+        while pos < self.len:
+            if text.startswith("<_", pos) or text.startswith("</_", pos):
+                end = text.find(">", pos)
+                if end < 0:
+                    raise ValueError(f"unclosed tag at {pos}: {text[pos:pos + 20]}")
+                tag = text[pos : end + 1]
+                if tag[1] == "_":
+                    self._open_tag(tag)
+                elif self.current_tag is None:
+                    raise ValueError(f"end tag {tag} at {pos} closes no tag")
+                else:
+                    self._close_tag(tag)
+                pos = end + 1
             elif self.is_in_tag():
-                if self.is_tag_content():
-                    self.consume_blank()
+                # blanks in front of a nested tag are dropped, the text of a tag
+                # starts at its first non blank char
+                pos = _BLANKS.match(text, pos).end()
+                if text.startswith("<_", pos) or text.startswith("</_", pos):
                     continue
-                else:
-                    self.extract_str_content()
-            elif self.is_not_in_tag_str():
-                self.extract_content_not_in_tag()
+                end = self._next_tag(pos)
+                self.current_tag.content = text[pos:end]
+                pos = end
+            else:
+                # text out of tags is not kept
+                pos = self._next_tag(pos)
+        self.pos = self.len - 1
         self.is_extracted = True
         return self.root_tag
 
+    def _next_tag(self, pos: int) -> int:
+        m = _TAG_CANDIDATE.search(self.text, pos)
+        return m.start() if m else self.len
+
+    def media_types(self) -> List[str]:
+        """
+        The media (`image`, `audio`) of the closed tags at the top level. One extraction
+        answers for all of them, see `from_extracted`.
+        """
+        self.extract()
+        result = []
+        for item in self.root_tag.content:
+            if not isinstance(item, Tag):
+                continue
+            for media in NONTEXT_MEDIA:
+                if (
+                    media not in result
+                    and item.start_tag == f"<_{media}_>"
+                    and item.end_tag == f"</_{media}_>"
+                ):
+                    result.append(media)
+        return result
+
+    @classmethod
+    def from_extracted(cls, extractor: "TagExtractor"):
+        """An extractor of the same text reusing the tags `extractor` extracted, e.g. `Image.from_extracted(tags)`."""
+        v = cls(extractor.text)
+        v.root_tag = extractor.extract()
+        v.pos = extractor.pos
+        v.is_extracted = True
+        return v
+
 
 class Image(TagExtractor):
 
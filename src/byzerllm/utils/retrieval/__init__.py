@@ -9,9 +9,12 @@ from byzerllm.records import (
     ResourceRequirementSettings,
     ResourceRequirement,
 )
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple, Union
 import byzerllm.utils.object_store_ref_util as ref_utils
+from byzerllm.utils.retrieval.blocks import DEFAULT_BLOCK_ROWS, pack_ndjson, iter_ndjson
+from collections import deque
 import json
+import time
 from loguru import logger
 
 
@@ -132,11 +135,32 @@ class ClusterBuilder:
 
 
 class ByzerRetrievalProxy:
-
-    def __init__(self):
+    """
+    Client of the retrieval gateway and clusters. The cluster handles and the table
+    settings of each cluster are cached for `meta_cache_ttl` seconds, so the table checks
+    in front of every write do not cost a call to the cluster. The settings are reloaded
+    after `create_table`, `closeAndDeleteFile` and `shutdown_cluster`, and when a table is
+    not found in them. With `meta_cache_ttl <= 0` only the handles are cached, and they
+    do not expire.
+    """
+
+    def __init__(self, meta_cache_ttl: float = 60, clock: Callable[[], float] = time.monotonic):
         self.launched = False
         self.retrieval_gateway = None
         self.clusters = {}
+        self.meta_cache_ttl = meta_cache_ttl
+        self.clock = clock
+        # cluster name -> expire time of its handle in self.clusters
+        self.cluster_expire_at: Dict[str, float] = {}
+        # cluster name -> (expire time, table settings)
+        self.table_settings_cache: Dict[str, Tuple[float, List[TableSettings]]] = {}
+        self.meta_stats = {
+            "cluster_hits": 0,
+            "cluster_loads": 0,
+            "table_hits": 0,
+            "table_loads": 0,
+            "invalidations": 0,
+        }
 
     def launch_gateway(self) -> ray.actor.ActorHandle:
 
@@ -203,13 +227,18 @@ class ByzerRetrievalProxy:
         if not self.launched:
             raise Exception("Please launch gateway first")
 
-        if name in self.clusters:
+        expire_at = self.cluster_expire_at.get(name)
+        if name in self.clusters and (expire_at is None or expire_at > self.clock()):
+            self.meta_stats["cluster_hits"] += 1
             return self.clusters[name]
 
         cluster_ref = self.retrieval_gateway.getCluster.remote(name)
         # master_ref.buildFromRayObjectStore.remote("db1","table1",data_refs)
         cluster = ray.get(cluster_ref)
+        self.meta_stats["cluster_loads"] += 1
         self.clusters[name] = cluster
+        if self.meta_cache_ttl > 0:
+            self.cluster_expire_at[name] = self.clock() + self.meta_cache_ttl
         return cluster
 
     def cluster_info(self, name: str) -> Dict[str, Any]:
@@ -223,27 +252,75 @@ class ByzerRetrievalProxy:
         except ValueError:
             return False
 
+    def _cached_tables(self, cluster_name: str) -> Optional[List[TableSettings]]:
+        item = self.table_settings_cache.get(cluster_name)
+        if item is None or item[0] <= self.clock():
+            return None
+        self.meta_stats["table_hits"] += 1
+        return item[1]
+
+    def _load_tables(self, cluster_name: str) -> List[TableSettings]:
+        cluster_info = self.cluster_info(cluster_name)
+        tables = [
+            TableSettings(**table_settings_dict)
+            for table_settings_dict in cluster_info["tableSettingsList"]
+        ]
+        self.meta_stats["table_loads"] += 1
+        if self.meta_cache_ttl > 0:
+            self.table_settings_cache[cluster_name] = (
+                self.clock() + self.meta_cache_ttl,
+                tables,
+            )
+        return tables
+
+    def invalidate_meta_cache(self, cluster_name: Optional[str] = None, handle: bool = False):
+        """Drops the cached table settings (and with `handle` the handle) of a cluster, or of all."""
+        if cluster_name:
+            names = [cluster_name]
+        elif handle:
+            names = list(set(self.clusters) | set(self.table_settings_cache))
+        else:
+            names = list(self.table_settings_cache)
+        for name in names:
+            self.table_settings_cache.pop(name, None)
+            if handle:
+                self.clusters.pop(name, None)
+                self.cluster_expire_at.pop(name, None)
+        self.meta_stats["invalidations"] += 1
+
+    def meta_cache_stats(self) -> Dict[str, int]:
+        stats = dict(self.meta_stats)
+        stats["round_trips_saved"] = stats["cluster_hits"] + stats["table_hits"]
+        return stats
+
     def get_table_settings(
         self, cluster_name: str, database: str, table: str
     ) -> Optional[TableSettings]:
-        cluster_info = self.cluster_info(cluster_name)
-        target_table_settings = None
-        for table_settings_dict in cluster_info["tableSettingsList"]:
-            table_settings = TableSettings(**table_settings_dict)
-            if table_settings.database == database and table_settings.table == table:
-                target_table_settings = table_settings
-                break
-        return target_table_settings
+        def find(tables: List[TableSettings]) -> Optional[TableSettings]:
+            for table_settings in tables:
+                if table_settings.database == database and table_settings.table == table:
+                    return table_settings
+            return None
+
+        tables = self._cached_tables(cluster_name)
+        if tables is not None:
+            target_table_settings = find(tables)
+            # a table missing from the cache may have been created by another client
+            if target_table_settings is not None:
+                return target_table_settings
+        return find(self._load_tables(cluster_name))
 
     def check_table_exists(self, cluster_name: str, database: str, table: str) -> bool:
         return self.get_table_settings(cluster_name, database, table) is not None
 
     def restore_from_cluster_info(self, cluster_info: Dict[str, Any]) -> bool:
-        return ray.get(
+        v = ray.get(
             self.retrieval_gateway.restoreFromClusterInfo.remote(
                 json.dumps(cluster_info, ensure_ascii=False)
             )
         )
+        self.invalidate_meta_cache(handle=True)
+        return v
 
     def create_table(self, cluster_name: str, tableSettings: TableSettings) -> bool:
 
@@ -255,7 +332,10 @@ class ByzerRetrievalProxy:
             )
 
         cluster = self.cluster(cluster_name)
-        return ray.get(cluster.createTable.remote(tableSettings.json()))
+        try:
+            return ray.get(cluster.createTable.remote(tableSettings.json()))
+        finally:
+            self.invalidate_meta_cache(cluster_name)
 
     def build(
         self,
@@ -279,15 +359,58 @@ class ByzerRetrievalProxy:
         )
 
     def build_from_dicts(
-        self, cluster_name: str, database: str, table: str, data: List[Dict[str, Any]]
+        self,
+        cluster_name: str,
+        database: str,
+        table: str,
+        data: List[Dict[str, Any]],
+        block_rows: int = DEFAULT_BLOCK_ROWS,
     ) -> bool:
-        data_refs = []
+        return self.build_from_blocks(
+            cluster_name, database, table, pack_ndjson(data, block_rows)
+        )
 
-        for item in data:
-            itemref = ray.put(json.dumps(item, ensure_ascii=False))
-            data_refs.append(itemref)
+    def build_from_blocks(
+        self,
+        cluster_name: str,
+        database: str,
+        table: str,
+        blocks: Iterable[Union[bytes, ObjectRef[bytes]]],
+        max_inflight: int = 2,
+    ) -> bool:
+        """
+        Builds the table from newline delimited JSON blocks (see `pack_ndjson`), given as
+        bytes or as refs to them. The cluster reads one document per object, so each block
+        is put row by row and built with one call; the next block is put while up to
+        `max_inflight` builds run, and the rows of a block are released once it is built.
+        """
+        if not self.check_table_exists(cluster_name, database, table):
+            raise Exception(
+                f"Table {database}.{table} not exists in cluster {cluster_name}"
+            )
 
-        return self.build(cluster_name, database, table, data_refs)
+        cluster = self.cluster(cluster_name)
+        inflight = deque()
+        results = []
+        for block in blocks:
+            if isinstance(block, ray.ObjectRef):
+                block = ray.get(block)
+            data_refs = [ray.put(doc) for doc in iter_ndjson(block)]
+            if not data_refs:
+                continue
+            build_ref = cluster.buildFromRayObjectStore.remote(
+                database,
+                table,
+                ref_utils.get_object_ids(data_refs),
+                ref_utils.get_locations(data_refs),
+            )
+            # the rows must live until the cluster has read them
+            inflight.append((build_ref, data_refs))
+            while len(inflight) > max_inflight:
+                results.append(ray.get(inflight.popleft()[0]))
+        while inflight:
+            results.append(ray.get(inflight.popleft()[0]))
+        return all(results)
 
     def delete_by_ids(
         self, cluster_name: str, database: str, table: str, ids: List[Any]
@@ -306,11 +429,7 @@ class ByzerRetrievalProxy:
         )
 
     def get_tables(self, cluster_name: str) -> List[TableSettings]:
-        cluster_info = self.cluster_info(cluster_name)
-        target_table_settings = []
-        for table_settings_dict in cluster_info["tableSettingsList"]:
-            target_table_settings.append(TableSettings(**table_settings_dict))
-        return target_table_settings
+        return list(self._load_tables(cluster_name))
 
     def get_databases(self, cluster_name: str) -> List[str]:
         table_settings_list = self.get_tables(cluster_name)
@@ -321,8 +440,7 @@ class ByzerRetrievalProxy:
             raise Exception("Please launch gateway first")
 
         v = ray.get(self.retrieval_gateway.shutdownCluster.remote(cluster_name))
-        if cluster_name in self.clusters:
-            del self.clusters[cluster_name]
+        self.invalidate_meta_cache(cluster_name, handle=True)
         return v
 
     def commit(self, cluster_name: str, database: str, table: str) -> bool:
@@ -363,7 +481,10 @@ class ByzerRetrievalProxy:
             )
 
         cluster = self.cluster(cluster_name)
-        return ray.get(cluster.closeAndDeleteFile.remote(database, table))
+        try:
+            return ray.get(cluster.closeAndDeleteFile.remote(database, table))
+        finally:
+            self.invalidate_meta_cache(cluster_name)
 
     def search_keyword(
         self,
@@ -428,6 +549,20 @@ class ByzerRetrievalProxy:
         v = cluster.search.remote(f"[{','.join([x.json() for x in search_query])}]")
         return json.loads(ray.get(v))
 
+    def search_many(
+        self, cluster_name: str, search_queries: List[SearchQuery]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        The results of each query, in the order of `search_queries`. A list of queries
+        given to `search` comes back as one list, here the queries run side by side on
+        the cluster and keep their own ranking, e.g. for `reciprocal_rank_fusion`.
+        """
+        if not search_queries:
+            raise Exception("search_queries is empty")
+        cluster = self.cluster(cluster_name)
+        refs = [cluster.search.remote(f"[{x.json()}]") for x in search_queries]
+        return [json.loads(v) for v in ray.get(refs)]
+
     def filter(
         self, cluster_name: str, search_query: Union[List[SearchQuery], SearchQuery]
     ) -> List[Dict[str, Any]]:
@@ -450,10 +585,11 @@ class ByzerRetrievalProxy:
 
 class ByzerRetrieval:
 
-    def __init__(self, pure_client: bool = False):
+    def __init__(self, pure_client: bool = False, meta_cache_ttl: float = 60):
         self.launched = False
         self.retrieval_proxy: ByzerRetrievalProxy = None        
         self.pure_client = pure_client
+        self.meta_cache_ttl = meta_cache_ttl
 
     def launch_gateway(self) -> Union[ray.actor.ActorHandle, ByzerRetrievalProxy]:        
         if self.pure_client:
@@ -469,13 +605,13 @@ class ByzerRetrieval:
             self.retrieval_proxy = (
                 ray.remote(ByzerRetrievalProxy)
                 .options(name="ByzerRetrievalProxy", lifetime="detached")
-                .remote()
+                .remote(self.meta_cache_ttl)
             )
             ray.get(self.retrieval_proxy.launch_gateway.remote())
             self.launched = True
             return self.retrieval_proxy
         else:
-            self.retrieval_proxy = ByzerRetrievalProxy()
+            self.retrieval_proxy = ByzerRetrievalProxy(self.meta_cache_ttl)
             return self.retrieval_proxy.launch_gateway()
 
     def gateway(self) -> ray.actor.ActorHandle:
@@ -560,6 +696,11 @@ class ByzerRetrieval:
             self.retrieval_proxy.restore_from_cluster_info.remote(cluster_info)
         )
 
+    def meta_cache_stats(self) -> Dict[str, int]:
+        if not self.pure_client:
+            return self.retrieval_proxy.meta_cache_stats()
+        return ray.get(self.retrieval_proxy.meta_cache_stats.remote())
+
     def create_table(self, cluster_name: str, tableSettings: TableSettings) -> bool:
         if not self.pure_client:
             return self.retrieval_proxy.create_table(cluster_name, tableSettings)
@@ -585,15 +726,39 @@ class ByzerRetrieval:
         )
 
     def build_from_dicts(
-        self, cluster_name: str, database: str, table: str, data: List[Dict[str, Any]]
+        self,
+        cluster_name: str,
+        database: str,
+        table: str,
+        data: List[Dict[str, Any]],
+        block_rows: int = DEFAULT_BLOCK_ROWS,
     ) -> bool:
         if not self.pure_client:
             return self.retrieval_proxy.build_from_dicts(
-                cluster_name, database, table, data
+                cluster_name, database, table, data, block_rows
             )
+        # the proxy actor gets a few large blocks instead of every row in the call
+        block_refs = [ray.put(block) for block in pack_ndjson(data, block_rows)]
         return ray.get(
-            self.retrieval_proxy.build_from_dicts.remote(
-                cluster_name, database, table, data
+            self.retrieval_proxy.build_from_blocks.remote(
+                cluster_name, database, table, block_refs
+            )
+        )
+
+    def build_from_blocks(
+        self,
+        cluster_name: str,
+        database: str,
+        table: str,
+        blocks: List[Union[bytes, ObjectRef[bytes]]],
+    ) -> bool:
+        if not self.pure_client:
+            return self.retrieval_proxy.build_from_blocks(
+                cluster_name, database, table, blocks
+            )
+        return ray.get(
+            self.retrieval_proxy.build_from_blocks.remote(
+                cluster_name, database, table, blocks
             )
         )
 
@@ -711,6 +876,16 @@ class ByzerRetrieval:
 
         return ray.get(self.retrieval_proxy.search.remote(cluster_name, search_query))
 
+    def search_many(
+        self, cluster_name: str, search_queries: List[SearchQuery]
+    ) -> List[List[Dict[str, Any]]]:
+        if not self.pure_client:
+            return self.retrieval_proxy.search_many(cluster_name, search_queries)
+
+        return ray.get(
+            self.retrieval_proxy.search_many.remote(cluster_name, search_queries)
+        )
+
     def filter(
         self, cluster_name: str, search_query: Union[List[SearchQuery], SearchQuery]
     ) -> List[Dict[str, Any]]:
@@ -0,0 +1,27 @@
+from typing import Any, Dict, Iterable, Iterator, List
+
+from byzerllm.utils.client import json_codec
+
+DEFAULT_BLOCK_ROWS = 2000
+
+
+def pack_ndjson(rows: Iterable[Dict[str, Any]], block_rows: int = DEFAULT_BLOCK_ROWS) -> Iterator[bytes]:
+    """Packs `rows` into newline delimited JSON blocks of up to `block_rows` rows each."""
+    if block_rows <= 0:
+        raise ValueError(f"block_rows should be positive, got {block_rows}")
+    lines: List[str] = []
+    for row in rows:
+        lines.append(json_codec.dumps(row))
+        if len(lines) >= block_rows:
+            yield "\n".join(lines).encode("utf-8")
+            lines = []
+    if lines:
+        yield "\n".join(lines).encode("utf-8")
+
+
+def iter_ndjson(block: bytes) -> Iterator[str]:
+    """The JSON documents of a block made by `pack_ndjson`, one string per row."""
+    # JSON escapes the newlines in strings, every line is one document
+    for line in block.decode("utf-8").split("\n"):
+        if line:
+            yield line
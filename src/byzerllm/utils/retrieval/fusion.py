@@ -0,0 +1,36 @@
+import json
+from typing import Any, Dict, List, Optional
+
+RRF_K = 60
+
+
+def _doc_key(doc: Dict[str, Any], id_field: str) -> str:
+    if id_field in doc:
+        return json.dumps(doc[id_field], ensure_ascii=False, default=str)
+    return json.dumps(doc, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]],
+    k: int = RRF_K,
+    id_field: str = "_id",
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Merges the ranked results of several queries: a document scores the sum of
+    `1 / (k + rank)` over the lists it is in (rank from 1), documents are identified
+    by `id_field` (or their whole content when they have none) and kept once.
+    The merged documents are copies with the score in `_rrf_score`, best first.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = _doc_key(doc, id_field)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    # sorted is stable, ties keep the order the documents were first seen in
+    keys = sorted(scores, key=lambda key: -scores[key])
+    if limit is not None:
+        keys = keys[:limit]
+    return [{**docs[key], "_rrf_score": scores[key]} for key in keys]
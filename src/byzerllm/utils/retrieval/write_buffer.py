@@ -0,0 +1,141 @@
+import atexit
+import logging
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ITEMS = 256
+DEFAULT_MAX_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+# the value of a key whose latest write is a delete
+DELETED = object()
+
+_buffers: "weakref.WeakSet[WriteBehindBuffer]" = weakref.WeakSet()
+
+
+class WriteBehindBuffer:
+    """
+    Collects writes by key and hands them to `write(puts, deletes)` as one group,
+    so the caller commits once per group instead of once per write. A group is
+    written when `max_items` keys are pending, `max_delay` seconds after the first
+    pending write (never when `max_delay <= 0`), on `flush()` and at exit.
+    The latest write of a key wins, and `lookup` answers keys which are not written yet.
+    A group that fails to write is kept and retried by a timer with exponential backoff
+    (up to `MAX_RETRY_DELAY` seconds), even when nothing else is written.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[Dict[Hashable, Any], List[Hashable]], None],
+        max_items: int = DEFAULT_MAX_ITEMS,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        self._write = write
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Hashable, Any] = {}
+        # the group being written, still answered by lookup until it is committed
+        self._inflight: Dict[Hashable, Any] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._failures = 0
+        self.stats = {"writes": 0, "flushes": 0, "flushed_keys": 0, "failed_flushes": 0}
+        _buffers.add(self)
+
+    def put(self, key: Hashable, value: Any):
+        self._add({key: value})
+
+    def put_many(self, items: Iterable[Tuple[Hashable, Any]]):
+        self._add(dict(items))
+
+    def delete(self, key: Hashable):
+        self._add({key: DELETED})
+
+    def delete_many(self, keys: Iterable[Hashable]):
+        self._add({key: DELETED for key in keys})
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """`(True, value)` when `key` has an unwritten write, the value is `DELETED` for a delete."""
+        with self._lock:
+            for writes in (self._pending, self._inflight):
+                if key in writes:
+                    return True, writes[key]
+        return False, None
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """The unwritten writes, the latest one of each key."""
+        with self._lock:
+            return list({**self._inflight, **self._pending}.items())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _add(self, writes: Dict[Hashable, Any]):
+        if not writes:
+            return
+        with self._lock:
+            self._pending.update(writes)
+            self.stats["writes"] += len(writes)
+            full = len(self._pending) >= self.max_items
+            if not full and self._timer is None and self.max_delay > 0:
+                self._start_timer(self.max_delay)
+        if full:
+            self.flush()
+
+    def _start_timer(self, delay: float):
+        self._timer = threading.Timer(delay, self._timed_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Failed to flush the write buffer, the writes are kept for the next flush")
+
+    def flush(self) -> int:
+        """Writes the pending writes as one group, returns the number of keys written."""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return 0
+            try:
+                puts = {key: value for key, value in batch.items() if value is not DELETED}
+                deletes = [key for key, value in batch.items() if value is DELETED]
+                self._write(puts, deletes)
+            except Exception:
+                with self._lock:
+                    # keep the failed group, writes made meanwhile are newer
+                    self._pending = {**batch, **self._pending}
+                    self._failures += 1
+                    self.stats["failed_flushes"] += 1
+                    if self._timer is None:
+                        base = self.max_delay if self.max_delay > 0 else DEFAULT_MAX_DELAY
+                        self._start_timer(min(base * 2 ** (self._failures - 1), MAX_RETRY_DELAY))
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = {}
+            self._failures = 0
+            self.stats["flushes"] += 1
+            self.stats["flushed_keys"] += len(batch)
+            return len(batch)
+
+
+@atexit.register
+def _flush_all():
+    for buffer in list(_buffers):
+        try:
+            buffer.flush()
+        except Exception:
+            logger.exception("Failed to flush a write buffer at exit")
@@ -1,7 +1,9 @@
 from typing import List,Tuple,Any,Dict
 import json
+import asyncio
+import numpy as np
 from byzerllm.utils.tokenizer import get_real_tokenizer
-from .emb import ByzerLLMEmbeddings,ByzerSentenceTransformerEmbeddings
+from .emb import ByzerLLMEmbeddings,ByzerSentenceTransformerEmbeddings,get_emb_batcher
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 
 class ByzerLLMGenerator:
@@ -116,6 +118,10 @@ class ByzerLLMGenerator:
 
                 if query.get("embed_rerank", False):
                     return self.embedding.embed_rerank(ins,extract_params=new_params)
+
+                batcher = get_emb_batcher(self.embedding)
+                if batcher is not None:
+                    return await batcher.embed(ins,new_params)
                 
                 if hasattr(self.embedding.model,"async_embed_query"):
                     return await self.embedding.model.async_embed_query(ins,extract_params=new_params)
@@ -124,6 +130,8 @@ class ByzerLLMGenerator:
                 
                 if hasattr(self.embedding,"async_embed_query"):
                     return await self.embedding.async_embed_query(ins,extract_params=new_params)
+                elif query.get("binary_output",False) and hasattr(self.embedding,"embed_query_array"):
+                    return await asyncfy_with_semaphore(lambda:self.embedding.embed_query_array(ins,extract_params=new_params))()
                 else:
                     return await asyncfy_with_semaphore(lambda:self.embedding.embed_query(ins,extract_params=new_params))()
 
@@ -173,39 +181,102 @@ class ByzerLLMGenerator:
             return response[-1]
 
 
+async def _simple_predict_item(llm,item):
+    v = await llm.async_predict(item)
+    if item.get("embedding",False):
+        metadata = {}
+        value = v
+        if isinstance(v,tuple):
+            if isinstance(v[1],dict) and "metadata" in v[1]:
+                metadata = v[1]["metadata"]
+            value = v[0]
+        return {"predict":value,"metadata":metadata,"input":item}
+
+    if item.get("tokenizer",False) or item.get("meta",False) or item.get("apply_chat_template",False):
+        return {
+        "predict":v,
+        "metadata":{},
+        "input":item}
+
+    metadata = {}
+    if isinstance(v[1],dict) and "metadata" in v[1]:
+        metadata = v[1]["metadata"]
+
+    return {
+        "predict":v[0],
+        "metadata":metadata,
+        "input":item}
+
+async def _simple_predict_item_isolated(llm,item):
+    try:
+        return await _simple_predict_item(llm,item)
+    except Exception as inst:
+        return {"predict":"","metadata":{"error":str(inst)},"input":item}
+
+def _pack_results(results):
+    """
+    Items that ask for `binary_output` get their embedding as a row of one float32 matrix
+    returned next to the JSON value (`{"value":[...],"embeddings":matrix}`), the item keeps
+    `"predict":null` and the index of its row in `embedding_row`. Ray ships the matrix as a
+    buffer, so vectors are never printed to and parsed from JSON text.
+    """
+    rows = []
+    packed = []
+    for r in results:
+        item = r["input"]
+        if not item.get("binary_output",False) or item.get("embed_rerank",False) or "error" in r["metadata"]:
+            continue
+        try:
+            row = np.asarray(r["predict"],dtype=np.float32)
+        except (TypeError,ValueError):
+            continue
+        if row.ndim != 1 or (rows and row.shape != rows[0].shape):
+            continue
+        rows.append(row)
+        packed.append(r)
+
+    packed_ids = {id(r) for r in packed}
+    for r in results:
+        if isinstance(r["predict"],np.ndarray) and id(r) not in packed_ids:
+            r["predict"] = r["predict"].tolist()
+
+    if not rows:
+        return {"value":[json.dumps(results,ensure_ascii=False)]}
+
+    for i,r in enumerate(packed):
+        r["predict"] = None
+        r["embedding_row"] = i
+    return {"value":[json.dumps(results,ensure_ascii=False)],"embeddings":np.stack(rows)}
+
 async def simple_predict_func(model,v):
     (model,tokenizer) = model
     llm = ByzerLLMGenerator(model,tokenizer)
     data = [json.loads(item) for item in v]
-    
-    results=[]
-    for item in data:        
-        v = await llm.async_predict(item)
-        if item.get("embedding",False):
-            metadata = {}
-            value = v
-            if isinstance(v,tuple):
-                if isinstance(v[1],dict) and "metadata" in v[1]:
-                    metadata = v[1]["metadata"]
-                value = v[0]                            
-            results.append({"predict":value,"metadata":metadata,"input":item})
-
-        elif item.get("tokenizer",False) or item.get("meta",False) or item.get("apply_chat_template",False):
-            results.append({
-            "predict":v,
-            "metadata":{},
-            "input":item})
-        else:            
-            metadata = {}
-            if isinstance(v[1],dict) and "metadata" in v[1]:
-                metadata = v[1]["metadata"] 
 
-            results.append({
-                "predict":v[0],
-                "metadata":metadata,
-                "input":item})
+    if len(data) == 1:
+        item = data[0]
+        if item.get("isolate_errors",False):
+            results = [await _simple_predict_item_isolated(llm,item)]
+        else:
+            results = [await _simple_predict_item(llm,item)]
+        return _pack_results(results)
 
-    return {"value":[json.dumps(results,ensure_ascii=False)]}
+    def predict_item(item):
+        if item.get("isolate_errors",False):
+            return _simple_predict_item_isolated(llm,item)
+        return _simple_predict_item(llm,item)
+
+    # the items of an async backend (e.g. vLLM) are submitted at once so that the backend
+    # can schedule them together. The sync stream_chat of local backends is not safe to
+    # call concurrently, their items (batches included) run one at a time
+    if hasattr(model,"async_stream_chat"):
+        results = await asyncio.gather(*[predict_item(item) for item in data])
+        return _pack_results(list(results))
+
+    results = []
+    for item in data:
+        results.append(await predict_item(item))
+    return _pack_results(results)
 
 
 def chatglm_predict_func(model,v):
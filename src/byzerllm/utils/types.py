@@ -1,7 +1,10 @@
+import os
 import time
 import threading
+import asyncio
+import zlib
 from typing import TYPE_CHECKING,TypeVar,Dict, List, Optional, Union,Any,Tuple,get_type_hints,Annotated,get_args,Callable
-from queue import Queue
+from collections import OrderedDict
 
 try:
     from transformers import StoppingCriteria
@@ -45,103 +48,439 @@ class SingleOutput:
         self.metadata = metadata
         
 class StreamOutputs: 
-    def __init__(self, outputs:List[SingleOutput]):
-        self.outputs = outputs   
+    def __init__(self, outputs:List[SingleOutput], delta:bool=False):
+        self.outputs = outputs
+        # when delta is True, every output only carries the text generated since the
+        # previous chunk of this request, and the stream server appends instead of replacing
+        self.delta = delta
+
+STREAM_RUNNING = "RUNNING"
+
+# Streams which have not been written for `BYZERLLM_STREAM_SERVER_TTL` seconds
+# (e.g. the reader disconnected) are dropped, and so are the least recently written
+# streams once a stream server holds more than `BYZERLLM_STREAM_SERVER_MAX_BYTES`.
+STREAM_SERVER_TTL = float(os.environ.get("BYZERLLM_STREAM_SERVER_TTL", 60 * 60))
+STREAM_SERVER_MAX_BYTES = int(os.environ.get("BYZERLLM_STREAM_SERVER_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+def _item_size(item) -> int:
+    outputs = getattr(item, "outputs", None)
+    if not outputs:
+        return 0
+    return sum(len(o.text) for o in outputs if isinstance(o.text, (str, bytes)))
+
+
+class _StreamState:
+    """
+    The chunk log of one stream. `offset` is the sequence number of chunks[0],
+    so a reader that has seen everything before `n` asks for `take_since(n)`.
+    The methods changing the log return how many bytes it grew (or shrank) by.
+    """
+    __slots__ = ("chunks", "offset", "done", "updated_at", "nbytes", "cond", "event")
 
-class BlockBinaryStreamServer:
     def __init__(self):
-        self.cache = {}
-        self.cache_status = {} 
+        self.chunks = []
+        self.offset = 0
+        self.done = False
+        self.updated_at = time.monotonic()
+        self.nbytes = 0
+        self.cond = None
+        self.event = None
+
+    @property
+    def next_offset(self) -> int:
+        return self.offset + len(self.chunks)
+
+    def _drop(self, count: int) -> int:
+        freed = sum(_item_size(i) for i in self.chunks[:count])
+        del self.chunks[:count]
+        self.offset += count
+        self.nbytes -= freed
+        return -freed
+
+    def append(self, item, keep_latest_only: bool) -> int:
+        delta = 0
+        if keep_latest_only:
+            delta += self._drop(len(self.chunks))
+        self.chunks.append(item)
+        size = _item_size(item)
+        self.nbytes += size
+        self.updated_at = time.monotonic()
+        return delta + size
+
+    def take_since(self, offset: int) -> Tuple[List[Any], int]:
+        # everything before `offset` has been acknowledged by the reader
+        delta = 0
+        if offset > self.offset:
+            delta = self._drop(min(offset - self.offset, len(self.chunks)))
+        return list(self.chunks[max(0, offset - self.offset):]), delta
+
+    def merge(self):
+        """
+        Folds the log into one full-text chunk: the texts of delta chunks are appended
+        to the text before them. The log keeps its size and `next_offset`.
+        """
+        if len(self.chunks) == 1 and not getattr(self.chunks[0], "delta", False):
+            return self.chunks[-1]
+        outputs = None
+        for item in self.chunks:
+            if outputs is None or not getattr(item, "delta", False):
+                outputs = [SingleOutput(o.text, o.metadata) for o in item.outputs]
+                continue
+            for i, o in enumerate(item.outputs):
+                if i < len(outputs):
+                    outputs[i] = SingleOutput(outputs[i].text + o.text, o.metadata)
+                else:
+                    outputs.append(SingleOutput(o.text, o.metadata))
+        merged = StreamOutputs(outputs=outputs)
+        self.offset += len(self.chunks) - 1
+        self.chunks = [merged]
+        return merged
+
+    def pop_first(self) -> Tuple[Any, int]:
+        item = self.chunks[0]
+        return item, self._drop(1)
+
+
+class _StreamServerMetrics:
+    """
+    Gauges of a stream server actor. They are exported through the Ray metrics agent
+    together with the other Ray metrics, and are only created inside a Ray worker.
+    """
+
+    def __init__(self, server_type: str):
+        self.gauges = None
+        self.last_report = 0.0
+        try:
+            import ray
+            from ray.util.metrics import Gauge
+
+            if not ray.is_initialized():
+                return
+            name = ray.get_runtime_context().get_actor_name() or server_type
+            self.tags = {"server": name}
+            self.gauges = {
+                key: Gauge(f"byzerllm_stream_server_{key}", description=description, tag_keys=("server",))
+                for key, description in [
+                    ("live_streams", "streams held by the stream server"),
+                    ("bytes_held", "bytes of stream chunks held by the stream server"),
+                    ("evicted_streams", "streams evicted because of the TTL or the byte budget"),
+                    ("evicted_bytes", "bytes released by evicting streams"),
+                ]
+            }
+        except Exception:
+            self.gauges = None
+
+    def report(self, stats: Dict[str, int], force: bool = False):
+        if self.gauges is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_report < 1:
+            return
+        self.last_report = now
+        for key, gauge in self.gauges.items():
+            gauge.set(stats[key], tags=self.tags)
+
+
+class _StreamServerCore:
+    """
+    Shared bookkeeping of the stream servers. Producers call `add_item` and `mark_done`,
+    readers call `get_items_since(request_id, offset)` which blocks until new chunks arrive
+    (long poll) and returns all of them at once as `(next_offset, items, done)`.
+    The offset is the sequence number of the chunk in the request's log.
+
+    Full-text chunks (the old protocol) replace each other, delta chunks
+    (`StreamOutputs(delta=True)`) are appended and dropped once the reader has seen them.
+    `get_item` is kept for clients which still poll, it returns the full text so far.
+
+    `cache` is ordered by last write, so expired streams and the streams to drop when
+    the byte budget is exceeded are always at its head and eviction is amortized O(1).
+    """
+    keep_latest_only = True
+
+    def __init__(self, ttl: float = STREAM_SERVER_TTL, max_bytes: int = STREAM_SERVER_MAX_BYTES):
+        self.cache: "OrderedDict[str, _StreamState]" = OrderedDict()
         self.lock = threading.Lock()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes_held = 0
+        self.evicted_streams = 0
+        self.evicted_bytes = 0
+        self.metrics = _StreamServerMetrics(type(self).__name__)
 
-    def add_item(self, request_id, item):
-        with self.lock:            
-            if request_id not in self.cache:
-                self.cache[request_id] = Queue()
-            self.cache[request_id].put(item)
-            self.cache_status[request_id]=int(time.time()*1000)
-    
-    def mark_done(self, request_id):
-        if len(self.cache_status) > 30:
-            now = int(time.time()*1000)
-            with self.lock:
-                for k in list(self.cache_status.keys()):
-                    if now - self.cache_status[k] > 10*60*60*1000:
-                        del self.cache_status[k]
-                        del self.cache[k] 
-        with self.lock:            
-            self.cache_status[request_id] = 0
-
-    def get_item(self, request_id):                
+    def _new_state(self) -> _StreamState:
+        return _StreamState()
+
+    def _notify(self, state: _StreamState):
+        pass
+
+    def _get_or_create(self, request_id) -> _StreamState:
+        state = self.cache.get(request_id)
+        if state is None:
+            state = self._new_state()
+            self.cache[request_id] = state
+        else:
+            self.cache.move_to_end(request_id)
+        return state
+
+    def _remove(self, request_id):
+        state = self.cache.pop(request_id)
+        self.bytes_held -= state.nbytes
+        return state
+
+    def _evict(self):
+        """
+        Should be called with the lock held.
+        """
+        now = time.monotonic()
+        while self.cache:
+            request_id, state = next(iter(self.cache.items()))
+            if now - state.updated_at <= self.ttl and self.bytes_held <= self.max_bytes:
+                break
+            self._remove(request_id)
+            self.evicted_streams += 1
+            self.evicted_bytes += state.nbytes
+            # wake up readers, they will see the stream is gone
+            self._notify(state)
+        self.metrics.report(self._stats())
+
+    def _stats(self) -> Dict[str, int]:
+        return {
+            "live_streams": len(self.cache),
+            "bytes_held": self.bytes_held,
+            "evicted_streams": self.evicted_streams,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+    def _add(self, request_id, item):
         with self.lock:
-            if request_id not in self.cache:
-                return None                                                        
-            try:
-                return self.cache[request_id].get(timeout=0.1)                
-            except:
-                if request_id in self.cache_status and self.cache_status[request_id] == 0:
-                    del self.cache[request_id]
-                    del self.cache_status[request_id]
-                    return None
-                return "RUNNING"
+            if isinstance(item, str) and item == STREAM_RUNNING:
+                # the placeholder only makes the stream visible to readers,
+                # it should never overwrite chunks which are already there
+                if request_id not in self.cache:
+                    self.cache[request_id] = self._new_state()
+                return
+            state = self._get_or_create(request_id)
+            self.bytes_held += state.append(item, self.keep_latest_only and not getattr(item, "delta", False))
+            self._notify(state)
+            self._evict()
 
+    def _done(self, request_id):
+        with self.lock:
+            state = self._get_or_create(request_id)
+            state.done = True
+            state.updated_at = time.monotonic()
+            self._notify(state)
+            self._evict()
 
-class BlockVLLMStreamServer:
-    def __init__(self):
-        self.cache = {}
-        self.cache_status = {} 
-        self.lock = threading.Lock()
+    def _take(self, request_id, offset: int) -> Optional[Tuple[int, List[Any], bool]]:
+        """
+        Should be called with the lock held. Returns None when there is nothing new yet.
+        """
+        state = self.cache.get(request_id)
+        if state is None:
+            return (offset, [], True)
+        items, delta = state.take_since(offset)
+        self.bytes_held += delta
+        if not items and not state.done:
+            return None
+        if state.done:
+            self._remove(request_id)
+        return (state.next_offset, items, state.done)
+
+    def _legacy_get(self, request_id):
+        with self.lock:
+            state = self.cache.get(request_id)
+            if state is None:
+                return None
+            if state.chunks:
+                # polling readers expect the whole text so far, not the latest delta
+                v = state.merge()
+            else:
+                v = None if state.done else STREAM_RUNNING
+            if state.done:
+                self._remove(request_id)
+            return v
+
+
+class _BlockingStreamServer(_StreamServerCore):
+
+    def _new_state(self) -> _StreamState:
+        state = _StreamState()
+        state.cond = threading.Condition(self.lock)
+        return state
+
+    def _notify(self, state: _StreamState):
+        state.cond.notify_all()
 
     def add_item(self, request_id, item):
-        with self.lock:            
-            self.cache[request_id]=item
-            self.cache_status[request_id]=int(time.time()*1000)
-    
+        self._add(request_id, item)
+
     def mark_done(self, request_id):
-        if len(self.cache_status) > 30:
-            now = int(time.time()*1000)
-            with self.lock:
-                for k in list(self.cache_status.keys()):
-                    if now - self.cache_status[k] > 10*60*60*1000:
-                        del self.cache_status[k]
-                        del self.cache[k] 
-        with self.lock:            
-            self.cache_status[request_id] = 0
-
-    def get_item(self, request_id):                
+        self._done(request_id)
+
+    def stats(self) -> Dict[str, int]:
         with self.lock:
-            v = self.cache.get(request_id, None)     
-            if request_id in self.cache_status and self.cache_status[request_id] == 0:
-                del self.cache[request_id]
-                del self.cache_status[request_id]
-            return v     
+            return self._stats()
 
-class VLLMStreamServer:
-    def __init__(self):
-        self.cache = {}
-        self.cache_status = {} 
-        self.lock = threading.Lock()
+    def get_items_since(self, request_id, offset: int = 0, timeout: float = 1.0):
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                result = self._take(request_id, offset)
+                if result is not None:
+                    return result
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return (offset, [], False)
+                self.cache[request_id].cond.wait(remaining)
+
+
+class BlockBinaryStreamServer(_BlockingStreamServer):
+    keep_latest_only = False
+
+    def get_item(self, request_id):
+        deadline = time.monotonic() + 0.1
+        with self.lock:
+            while True:
+                state = self.cache.get(request_id)
+                if state is None:
+                    return None
+                if state.chunks:
+                    item, delta = state.pop_first()
+                    self.bytes_held += delta
+                    return item
+                if state.done:
+                    self._remove(request_id)
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return STREAM_RUNNING
+                state.cond.wait(remaining)
+
+
+class BlockVLLMStreamServer(_BlockingStreamServer):
+
+    def get_item(self, request_id):
+        return self._legacy_get(request_id)
+
+
+class VLLMStreamServer(_StreamServerCore):
+    """
+    Async actor, readers wait on an asyncio.Event so the event loop is never blocked.
+    """
+
+    def _new_state(self) -> _StreamState:
+        state = _StreamState()
+        state.event = asyncio.Event()
+        return state
+
+    def _notify(self, state: _StreamState):
+        state.event.set()
+        state.event = asyncio.Event()
 
     async def add_item(self, request_id, item):
-        with self.lock:            
-            self.cache[request_id]=item
-            self.cache_status[request_id]=int(time.time()*1000)
-    
+        self._add(request_id, item)
+
     async def mark_done(self, request_id):
-        if len(self.cache_status) > 30:
-            now = int(time.time()*1000)
-            with self.lock:
-                for k in list(self.cache_status.keys()):
-                    if now - self.cache_status[k] > 10*60*60*1000:
-                        del self.cache_status[k]
-                        del self.cache[k] 
-        with self.lock:            
-            self.cache_status[request_id] = 0
-
-    async def get_item(self, request_id):                
+        self._done(request_id)
+
+    async def stats(self) -> Dict[str, int]:
         with self.lock:
-            v = self.cache.get(request_id, None)     
-            if request_id in self.cache_status and self.cache_status[request_id] == 0:
-                del self.cache[request_id]
-                del self.cache_status[request_id]
-            return v    
\ No newline at end of file
+            return self._stats()
+
+    async def get_items_since(self, request_id, offset: int = 0, timeout: float = 1.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                result = self._take(request_id, offset)
+                if result is not None:
+                    return result
+                event = self.cache[request_id].event
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return (offset, [], False)
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def get_item(self, request_id):
+        return self._legacy_get(request_id)
+
+
+# Number of actors each stream server is split into. Streams are spread over the shards
+# by a stable hash of their request id; shard 0 keeps the historical actor name.
+STREAM_SERVER_SHARDS = int(os.environ.get("BYZERLLM_STREAM_SERVER_SHARDS", "1"))
+
+
+def stream_server_shard_name(server_name: str, request_id: str, num_shards: int = 1) -> str:
+    if num_shards <= 1:
+        return server_name
+    shard = zlib.crc32(str(request_id).encode("utf-8")) % num_shards
+    return server_name if shard == 0 else f"{server_name}_{shard}"
+
+
+def create_stream_server(
+    server_cls,
+    server_name: str,
+    num_shards: Optional[int] = None,
+    ttl: float = STREAM_SERVER_TTL,
+    max_bytes: int = STREAM_SERVER_MAX_BYTES,
+):
+    import ray
+
+    num_shards = num_shards or STREAM_SERVER_SHARDS
+    for shard in range(num_shards):
+        name = server_name if shard == 0 else f"{server_name}_{shard}"
+        try:
+            ray.get_actor(name)
+        except ValueError:
+            try:
+                ray.remote(server_cls).options(
+                    name=name, lifetime="detached", max_concurrency=1000
+                ).remote(ttl=ttl, max_bytes=max_bytes)
+            except Exception:
+                # another worker created it first
+                pass
+
+
+class _ShardedMethod:
+    def __init__(self, server: "ShardedStreamServer", method: str):
+        self.server = server
+        self.method = method
+
+    def remote(self, request_id, *args, **kwargs):
+        handle = self.server.shard(request_id)
+        return getattr(handle, self.method).remote(request_id, *args, **kwargs)
+
+
+class ShardedStreamServer:
+    """
+    Producer side handle of a sharded stream server. It looks like an actor handle,
+    `server.add_item.remote(request_id, item)` is routed to the shard owning `request_id`.
+    """
+
+    def __init__(self, server_name: str, num_shards: Optional[int] = None):
+        self.server_name = server_name
+        self.num_shards = num_shards or STREAM_SERVER_SHARDS
+        self._handles = {}
+
+    def shard(self, request_id):
+        import ray
+
+        name = stream_server_shard_name(self.server_name, request_id, self.num_shards)
+        handle = self._handles.get(name)
+        if handle is None:
+            handle = ray.get_actor(name)
+            self._handles[name] = handle
+        return handle
+
+    def __getattr__(self, method: str) -> _ShardedMethod:
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return _ShardedMethod(self, method)
+
+
+def get_stream_server(server_name: str, num_shards: Optional[int] = None) -> ShardedStreamServer:
+    return ShardedStreamServer(server_name, num_shards)
@@ -0,0 +1,228 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import ray
+from pyjava.udf.udf_master import UDFMaster
+from pyjava.udf.udf_worker import UDFWorker
+
+from .utils import print_flush
+
+
+def warm_pool_name(udf_name: str) -> str:
+    return f"{udf_name}__warm_pool"
+
+
+def _worker_options(conf: Dict[str, str]) -> Dict[str, Any]:
+    # create_worker_conf only reads `conf`
+    return UDFMaster.__ray_actor_class__.create_worker_conf(None, conf)
+
+
+class _WarmUDFMaster(UDFMaster.__ray_actor_class__):
+    """
+    UDFMaster which can take workers that are already built, e.g. from a ModelWarmPool.
+    """
+
+    def attach_workers(self, workers: List[Any]) -> int:
+        max_concurrency = self.get_worker_max_concurrency()
+        with self.lock:
+            for worker in workers:
+                index = len(self.actors)
+                self.actors[index] = worker
+                self.actor_indices.append(index)
+                self.actor_index_concurrency.append(max_concurrency)
+                self.actor_index_update_time = np.append(
+                    self.actor_index_update_time, time.monotonic()
+                )
+                self.request_count.append(0)
+            self.num = len(self.actors)
+        return self.num
+
+
+WarmUDFMaster = ray.remote(_WarmUDFMaster)
+
+
+class _ModelWarmPool:
+    """
+    Keeps `size` idle UDFWorkers of a model which already ran `init_func`, so scaling the
+    model up or redeploying it attaches a loaded worker instead of restoring and loading the
+    model again. The pool is a detached actor and owns its workers, they outlive the
+    UDFMaster they are attached to.
+
+    `signature` identifies the deployment (model, infer params, worker resources) the workers
+    were built for, a pool with another signature is not reused.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        conf: Dict[str, str],
+        init_func: Callable,
+        apply_func: Callable,
+        signature: str,
+    ):
+        if "modelServers" in conf:
+            raise Exception("warm pool is not supported when using model server")
+        self.size = size
+        self.conf = conf
+        self.init_func = init_func
+        self.apply_func = apply_func
+        self.sig = signature
+        self.lock = threading.Lock()
+        self.workers: List[Any] = []
+        self.building = 0
+        self.built = 0
+        self.taken = 0
+
+    def signature(self) -> str:
+        return self.sig
+
+    def build(self, num: int) -> List[Any]:
+        """Builds `num` workers right away, they are handed to the caller and not pooled."""
+        workers = [
+            UDFWorker.options(**_worker_options(self.conf)).remote(
+                [], self.conf, self.init_func, self.apply_func
+            )
+            for _ in range(num)
+        ]
+        ray.get([worker.build_model.remote() for worker in workers])
+        with self.lock:
+            self.built += num
+        return workers
+
+    def fill(self) -> int:
+        """Builds workers until the pool holds `size` of them, returns the number of idle workers."""
+        with self.lock:
+            missing = self.size - len(self.workers) - self.building
+            self.building += max(missing, 0)
+        if missing > 0:
+            udf_name = self.conf.get("UDF_CLIENT", "UNKNOW MODEL")
+            print_flush(f"MODEL[{udf_name}] warm pool builds {missing} workers")
+            try:
+                workers = self.build(missing)
+            finally:
+                with self.lock:
+                    self.building -= missing
+            with self.lock:
+                self.workers.extend(workers)
+        return len(self.workers)
+
+    def take(self, num: int) -> List[Any]:
+        """Up to `num` idle workers, which leave the pool."""
+        with self.lock:
+            workers, self.workers = self.workers[:num], self.workers[num:]
+            self.taken += len(workers)
+        return workers
+
+    def stat(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "size": self.size,
+                "idle_workers": len(self.workers),
+                "building": self.building,
+                "built": self.built,
+                "taken": self.taken,
+                "signature": self.sig,
+            }
+
+    def shutdown(self):
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            ray.kill(worker)
+
+
+ModelWarmPool = ray.remote(_ModelWarmPool)
+
+
+def shutdown_master(master):
+    """
+    Kills a UDFMaster and its workers. `UDFMaster.shutdown` kills every worker of the master,
+    attached pool workers included, which `ray.kill(master)` alone would leave running since
+    the pool owns them.
+    """
+    try:
+        ray.get(master.shutdown.remote(), timeout=30)
+    except Exception:
+        pass
+    ray.kill(master)
+
+
+def get_warm_pool(
+    udf_name: str,
+    size: int,
+    conf: Dict[str, str],
+    init_func: Callable,
+    apply_func: Callable,
+    signature: str,
+):
+    """The warm pool of `udf_name` for this deployment, a pool of another deployment is replaced."""
+    name = warm_pool_name(udf_name)
+    try:
+        pool = ray.get_actor(name)
+        if ray.get(pool.signature.remote()) == signature:
+            return pool
+        ray.get(pool.shutdown.remote())
+        ray.kill(pool)
+    except ValueError:
+        pass
+    return ModelWarmPool.options(
+        name=name, lifetime="detached", num_cpus=0, max_concurrency=16
+    ).remote(size, conf, init_func, apply_func, signature)
+
+
+def build_udf_with_warm_pool(
+    ray_context,
+    init_func: Callable,
+    apply_func: Callable,
+    warm_pool_size: int,
+    signature: str,
+):
+    """
+    Deploys the model like `UDFBuilder.build`, but the workers are taken from the model's warm
+    pool when it has idle ones, only the missing workers are built. The pool is refilled in
+    the background.
+    """
+    conf = ray_context.conf()
+    udf_name = conf["UDF_CLIENT"]
+    num_workers = int(conf.get("maxConcurrency", "3"))
+    master_max_concurrency = int(conf.get("masterMaxConcurrency", "1000"))
+
+    try:
+        shutdown_master(ray.get_actor(udf_name))
+        for _ in range(30):
+            time.sleep(1)
+            ray.get_actor(udf_name)
+    except ValueError:
+        pass
+
+    pool = get_warm_pool(udf_name, warm_pool_size, conf, init_func, apply_func, signature)
+    warm_workers = ray.get(pool.take.remote(num_workers))
+    print_flush(
+        f"MODEL[{udf_name}] {len(warm_workers)} of {num_workers} workers are taken from the warm pool"
+    )
+
+    master = WarmUDFMaster.options(
+        name=udf_name, lifetime="detached", max_concurrency=master_max_concurrency
+    ).remote(num_workers - len(warm_workers), conf, init_func, apply_func)
+    ray.get(master.create_workers.remote(conf))
+    ray.get([worker.build_model.remote() for worker in ray.get(master.workers.remote())])
+    ray.get(master.attach_workers.remote(warm_workers))
+    pool.fill.remote()
+    ray_context.build_result([])
+
+
+def scale_up(udf_name: str, num_workers: int = 1) -> int:
+    """
+    Adds `num_workers` workers to a model deployed with a warm pool, idle pool workers are
+    attached right away and the rest is built. Returns the number of workers of the model.
+    """
+    master = ray.get_actor(udf_name)
+    pool = ray.get_actor(warm_pool_name(udf_name))
+    workers = ray.get(pool.take.remote(num_workers))
+    if len(workers) < num_workers:
+        workers += ray.get(pool.build.remote(num_workers - len(workers)))
+    total = ray.get(master.attach_workers.remote(workers))
+    pool.fill.remote()
+    return total
@@ -0,0 +1,167 @@
+import asyncio
+import concurrent.futures
+import sys
+import threading
+import uuid
+
+import pytest
+import ray
+
+from byzerllm.utils.client import AsyncByzerLLM, LLMRequest
+from byzerllm.utils.text_generator import simple_predict_func
+from byzerllm.utils.types import (
+    BlockVLLMStreamServer,
+    SingleOutput,
+    StreamOutputs,
+    create_stream_server,
+    get_stream_server,
+)
+
+
+class FakeModel:
+    def __init__(self):
+        # the embedding path of ByzerLLMGenerator looks up `embedding.model`
+        self.model = self
+
+    async def async_get_meta(self):
+        return [
+            {"model_deploy_type": "saas", "message_format": True, "support_stream": True}
+        ]
+
+    def embed_query(self, ins, extract_params={}):
+        return [float(len(ins)), 1.0]
+
+    async def async_stream_chat(self, tokenizer, ins, his=[], **kwargs):
+        if not kwargs.get("stream", False):
+            return [(ins.upper(), {"metadata": {}})]
+
+        server = get_stream_server("BLOCK_VLLM_STREAM_SERVER")
+        request_id = str(uuid.uuid4())
+        await server.add_item.remote(request_id, "RUNNING")
+        for word in ins.split(" "):
+            await server.add_item.remote(
+                request_id, StreamOutputs(outputs=[SingleOutput(text=word + " ")], delta=True)
+            )
+        await server.mark_done.remote(request_id)
+        return [
+            (
+                "",
+                {
+                    "metadata": {
+                        "request_id": request_id,
+                        "stream_server": "BLOCK_VLLM_STREAM_SERVER",
+                        "stream_server_shards": server.num_shards,
+                    }
+                },
+            )
+        ]
+
+
+@ray.remote(num_cpus=0)
+class FakeWorker:
+    async def async_apply(self, v):
+        return await simple_predict_func((FakeModel(), None), v)
+
+
+@ray.remote(num_cpus=0)
+class FakeUDFMaster:
+    def __init__(self, worker):
+        self.worker = worker
+
+    def stat(self):
+        return {"total_workers": 1, "worker_max_concurrency": "1000"}
+
+    def get(self, index=-1):
+        return [0, self.worker]
+
+    def give_back(self, index):
+        pass
+
+
+@pytest.fixture(scope="module")
+def model():
+    # the Ray workers can not import this test module, ship the fake actors by value
+    ray.cloudpickle.register_pickle_by_value(sys.modules[__name__])
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_async_byzerllm")
+    create_stream_server(BlockVLLMStreamServer, "BLOCK_VLLM_STREAM_SERVER", num_shards=1)
+    master = FakeUDFMaster.options(name="fake_async").remote(FakeWorker.remote())
+    yield "fake_async"
+    del master
+    ray.shutdown()
+
+
+def test_achat_oai_and_aemb(model):
+    llm = AsyncByzerLLM()
+
+    async def run():
+        meta = await llm.aget_meta(model)
+        responses = await asyncio.gather(
+            *[llm.achat_oai(f"hello {i}", model=model) for i in range(20)]
+        )
+        embeddings = await llm.aemb(model, LLMRequest(instruction=["ab", "abc"]))
+        return meta, responses, embeddings
+
+    meta, responses, embeddings = asyncio.run(run())
+    assert meta["support_stream"]
+    assert [r[0].output for r in responses] == [f"HELLO {i}" for i in range(20)]
+    assert [e.output for e in embeddings] == [[2.0, 1.0], [3.0, 1.0]]
+
+
+def test_astream_chat_oai(model):
+    llm = AsyncByzerLLM()
+
+    async def run():
+        return [
+            text
+            async for text, _ in llm.astream_chat_oai(
+                "a b c", model=model, delta_mode=True
+            )
+        ]
+
+    assert asyncio.run(run()) == ["a ", "b ", "c "]
+    assert "BLOCK_VLLM_STREAM_SERVER" in llm.actor_handles
+
+    # the blocking client shares the stream decoding
+    assert [text for text, _ in llm.stream_chat_oai("a b c", model=model)] == [
+        "a ",
+        "a b ",
+        "a b c ",
+    ]
+
+
+def test_achat_oai_applies_the_chat_template_off_the_event_loop(model):
+    llm = AsyncByzerLLM()
+    llm.meta_cache["templated"] = {"support_chat_template": True}
+    llm.mapping_auto_use_apply_chat_template["templated"] = True
+    threads = []
+
+    def apply_chat_template(model, s):
+        threads.append(threading.current_thread())
+        return "templated prompt"
+
+    llm.apply_chat_template = apply_chat_template
+
+    async def run():
+        return await llm.achat_oai("hello", model="templated", only_return_prompt=True)
+
+    prompts = asyncio.run(run())
+    assert prompts[0].metadata["instruction"] == "templated prompt"
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_identical_streams_are_not_coalesced(model):
+    llm = AsyncByzerLLM()
+    llm.setup_chat_coalescing(cache_ttl=60)
+
+    def read():
+        return [
+            text
+            for text, _ in llm.stream_chat_oai(
+                "a b c", model=model, delta_mode=True, llm_config={"temperature": 0}
+            )
+        ]
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        results = list(executor.map(lambda _: read(), range(2)))
+    assert results == [["a ", "b ", "c "]] * 2
+    assert [text for text in read()] == ["a ", "b ", "c "]
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+
+import pytest
+import ray
+
+from byzerllm.utils.client import ByzerLLM
+from byzerllm.utils.text_generator import simple_predict_func
+
+
+class FakeModel:
+    async def async_get_meta(self):
+        return [{"model_deploy_type": "saas", "message_format": True}]
+
+    async def async_stream_chat(self, tokenizer, ins, his=[], **kwargs):
+        if ins == "boom":
+            raise Exception("boom")
+        return [(ins.upper(), {"metadata": {"history_size": len(his)}})]
+
+
+@ray.remote(num_cpus=0)
+class FakeWorker:
+    def __init__(self):
+        self.calls = []
+
+    async def async_apply(self, v):
+        self.calls.append(len(v))
+        return await simple_predict_func((FakeModel(), None), v)
+
+    def get_calls(self):
+        return self.calls
+
+
+@ray.remote(num_cpus=0)
+class FakeUDFMaster:
+    def __init__(self, workers):
+        self.workers = workers
+
+    def stat(self):
+        return {"total_workers": len(self.workers), "worker_max_concurrency": "1"}
+
+    def get(self, index=-1):
+        return [max(index, 0), self.workers[max(index, 0)]]
+
+    def give_back(self, index):
+        pass
+
+
+@pytest.fixture(scope="module")
+def model():
+    # the Ray workers can not import this test module, ship the fake actors by value
+    ray.cloudpickle.register_pickle_by_value(sys.modules[__name__])
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_batch_chat_oai")
+    workers = [FakeWorker.remote() for _ in range(2)]
+    master = FakeUDFMaster.options(name="fake_chat").remote(workers)
+    yield "fake_chat", workers
+    del master
+    ray.shutdown()
+
+
+def test_batch_chat_oai_keeps_order_and_isolates_errors(model):
+    name, workers = model
+    llm = ByzerLLM()
+    conversations = ["a", "b", "boom", [{"role": "user", "content": "d"}], "e"]
+    responses = llm.batch_chat_oai(
+        conversations, model=name, enable_default_sys_message=False, batch_size=2
+    )
+
+    assert [r.output for r in responses] == ["A", "B", "", "D", "E"]
+    assert responses[2].metadata["error"] == "boom"
+    assert "error" not in responses[0].metadata
+
+    # one get_meta call, then 5 items over 2 workers in batches of at most 2
+    calls = ray.get([w.get_calls.remote() for w in workers])
+    assert sorted(sum(calls, [])) == [1, 1, 2, 2]
+
+
+def test_batch_chat_oai_empty(model):
+    llm = ByzerLLM()
+    assert llm.batch_chat_oai([], model=model[0]) == []
+
+
+class SyncModel:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def stream_chat(self, tokenizer, ins, his=[], **kwargs):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if ins == "boom":
+            raise Exception("boom")
+        return [(ins.upper(), {"metadata": {}})]
+
+
+def test_items_of_a_sync_backend_run_one_at_a_time():
+    items = [json.dumps({"instruction": s}) for s in ["a", "b", "c"]]
+    model = SyncModel()
+    result = json.loads(asyncio.run(simple_predict_func((model, None), items))["value"][0])
+    assert [r["predict"] for r in result] == ["A", "B", "C"]
+    assert model.max_running == 1
+
+    # batches too, an error only fails its own item
+    batch = [json.dumps({"instruction": s, "isolate_errors": True}) for s in ["a", "boom", "c"]]
+    model = SyncModel()
+    result = json.loads(asyncio.run(simple_predict_func((model, None), batch))["value"][0])
+    assert [r["predict"] for r in result] == ["A", "", "C"]
+    assert "error" in result[1]["metadata"]
+    assert model.max_running == 1
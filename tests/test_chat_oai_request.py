@@ -0,0 +1,72 @@
+import json
+
+from byzerllm.utils import nontext
+from byzerllm.utils.client import ByzerLLM, json_codec
+
+
+def chat_llm():
+    llm = ByzerLLM()
+    llm.meta_cache["m"] = {"model_deploy_type": "saas", "message_format": True}
+    llm.skip_nontext_check = False
+    sent = []
+
+    def _query(model, v):
+        _, new_input_value, _ = llm._encode_query(model, v)
+        sent.extend(json.loads(x) for x in new_input_value)
+        return [{"predict": "ok", "metadata": {}, "input": v[0]} for _ in v]
+
+    llm._query = _query
+    return llm, sent
+
+
+def test_chat_oai_does_not_change_the_conversation():
+    llm, sent = chat_llm()
+    conversations = [
+        {"role": "user", "content": "hi", "metadata": {"agent": "a"}},
+        {"role": "assistant", "content": "hello"},
+        {"role": "user", "content": "how are you"},
+    ]
+    before = json.loads(json.dumps(conversations))
+    llm.chat_oai(conversations=conversations, model="m")
+
+    assert conversations == before
+    assert sent[0]["instruction"] == "how are you"
+    assert sent[0]["history"] == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+
+
+def test_plain_text_skips_the_tag_extractors(monkeypatch):
+    llm, sent = chat_llm()
+    extracted = []
+    original = nontext.TagExtractor.extract
+
+    def extract(self):
+        extracted.append(self.text)
+        return original(self)
+
+    monkeypatch.setattr(nontext.TagExtractor, "extract", extract)
+
+    llm.chat_oai(conversations=[{"role": "user", "content": "x < y and <b>"}], model="m")
+    assert extracted == []
+    assert sent[-1]["instruction"] == "x < y and <b>"
+
+    image = "<_image_>data:image/png;base64,AAAA</_image_> what is it"
+    llm.chat_oai(conversations=[{"role": "user", "content": image}], model="m")
+    assert extracted
+    assert json.loads(sent[-1]["instruction"]) == [
+        {"image": "data:image/png;base64,AAAA"},
+        {"text": "what is it"},
+    ]
+
+
+def test_json_codec_matches_json():
+    for value in [
+        {"instruction": "你好 \"quoted\" \n", "history": [], "temperature": 0.1},
+        {1: "non string key"},
+        {"big": 2**70},
+    ]:
+        assert json.loads(json_codec.dumps(value)) == json.loads(
+            json.dumps(value, ensure_ascii=False)
+        )
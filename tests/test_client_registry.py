@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from byzerllm.utils.client import ByzerLLM, get_llm_client, invalidate_llm_clients
+from byzerllm.utils.client.client_registry import llm_registry
+
+
+@pytest.fixture
+def meta_calls(monkeypatch):
+    calls = []
+
+    def get_meta(self, model, llm_config={}):
+        if model not in self.meta_cache:
+            calls.append(model)
+            self.meta_cache[model] = {"model_deploy_type": "saas"}
+        return self.meta_cache[model]
+
+    monkeypatch.setattr(ByzerLLM, "get_meta", get_meta)
+    invalidate_llm_clients()
+    yield calls
+    invalidate_llm_clients()
+
+
+def test_clients_are_shared_per_model(meta_calls):
+    a = get_llm_client("model_a")
+    assert get_llm_client("model_a") is a
+    assert a.default_model_name == "model_a"
+    assert get_llm_client("model_b") is not a
+    assert get_llm_client("model_a", verbose=True) is not a
+    # one meta round trip per configured client
+    assert meta_calls == ["model_a", "model_b", "model_a"]
+
+
+def test_concurrent_callers_get_one_client(meta_calls):
+    clients = []
+    threads = [
+        threading.Thread(target=lambda: clients.append(get_llm_client("model_c")))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(c) for c in clients}) == 1
+    assert len(llm_registry) == 1
+
+
+def test_invalidate(meta_calls):
+    a = get_llm_client("model_a")
+    b = get_llm_client("model_b")
+    invalidate_llm_clients("model_a")
+    assert get_llm_client("model_a") is not a
+    assert get_llm_client("model_b") is b
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from byzerllm.utils.emb import EmbeddingMicroBatcher
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, extract_params):
+        self.batches.append(list(texts))
+        if "boom" in texts:
+            raise ValueError("boom")
+        return [[float(len(text)), extract_params.get("scale", 1.0)] for text in texts]
+
+
+def test_concurrent_requests_share_a_forward_pass():
+    encoder = FakeEncoder()
+    batcher = EmbeddingMicroBatcher(encoder, max_batch_size=4, max_wait_ms=20)
+
+    async def run():
+        texts = ["ccc", "a", "bb", "dddd", "eeeee", "f"]
+        return await asyncio.gather(*[batcher.embed(text) for text in texts])
+
+    vectors = asyncio.run(run())
+
+    assert [v[0] for v in vectors] == [3.0, 1.0, 2.0, 4.0, 5.0, 1.0]
+    # the first 4 texts fill a batch, the other 2 are flushed by the timer; sorted by length
+    assert encoder.batches == [["a", "bb", "ccc", "dddd"], ["f", "eeeee"]]
+    stats = batcher.stats()
+    assert (stats["batches"], stats["requests"]) == (2, 6)
+    assert stats["batch_size_histogram"]["<=2"] == 1
+    assert stats["batch_size_histogram"]["<=4"] == 1
+
+
+def test_extract_params_are_not_mixed():
+    encoder = FakeEncoder()
+    batcher = EmbeddingMicroBatcher(encoder, max_batch_size=8, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.embed("a"), batcher.embed("b", {"scale": 2.0}), batcher.embed("c")
+        )
+
+    vectors = asyncio.run(run())
+    assert [v[1] for v in vectors] == [1.0, 2.0, 1.0]
+    assert sorted(encoder.batches) == [["a", "c"], ["b"]]
+
+
+def test_errors_only_reach_the_requests_of_failing_texts():
+    encoder = FakeEncoder()
+    batcher = EmbeddingMicroBatcher(encoder, max_batch_size=8, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(
+            *[batcher.embed(text) for text in ["boom", "x", "yy", "zzz"]],
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], ValueError)
+    assert [v[0] for v in results[1:]] == [1.0, 2.0, 3.0]
+    # the failed batch is bisected, the half without the bad text is encoded together
+    assert encoder.batches == [["x", "yy", "zzz", "boom"], ["x", "yy"], ["zzz", "boom"], ["zzz"], ["boom"]]
+
+
+class FakeTokenizer:
+    padding_side = "right"
+
+    def __call__(self, text):
+        return {"input_ids": text.split(" ")}
+
+
+class FakeFeaturePipeline:
+    """Hidden state [position, token number] per token, batches padded with zeros."""
+
+    tokenizer = FakeTokenizer()
+
+    def __call__(self, texts, batch_size=1):
+        lengths = [len(self.tokenizer(text)["input_ids"]) for text in texts]
+        padded = max(lengths) if batch_size > 1 else None
+        return [
+            [[[float(i), 1.0] if i < n else [0.0, 0.0] for i in range(padded or n)]]
+            for n in lengths
+        ]
+
+
+def test_pipeline_vectors_do_not_depend_on_the_batch():
+    emb = pytest.importorskip("byzerllm.utils.emb")
+    if not hasattr(emb.ByzerLLMEmbeddings, "_pipeline_vectors"):
+        pytest.skip("needs torch and transformers")
+    embeddings = emb.ByzerLLMEmbeddings.__new__(emb.ByzerLLMEmbeddings)
+    embeddings.pipeline = FakeFeaturePipeline()
+    alone = embeddings._encode(["a b"])
+    batched = embeddings._encode(["a b", "a b c d e"])
+    assert alone == [[1.0, 1.0]]
+    assert batched == [[1.0, 1.0], [4.0, 1.0]]
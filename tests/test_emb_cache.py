@@ -0,0 +1,92 @@
+from byzerllm.utils.client import ByzerLLM, LLMRequest
+from byzerllm.utils.client.emb_cache import EmbeddingCache, emb_cache_key
+
+
+def fake_query(calls):
+    def _query(model, v):
+        calls.append([item["instruction"] for item in v])
+        return [
+            {"predict": [float(len(item["instruction"])), 0.5], "metadata": {}, "input": item}
+            for item in v
+        ]
+
+    return _query
+
+
+def test_emb_cache_key():
+    assert emb_cache_key("m", "café", {"a": 1, "b": 2}) == emb_cache_key(
+        "m", "café", {"b": 2, "a": 1}
+    )
+    assert emb_cache_key("m", "a", {}) != emb_cache_key("n", "a", {})
+    assert emb_cache_key("m", "a", {}) != emb_cache_key("m", "a", {"gen.x": 1})
+
+
+def test_lru_tier():
+    cache = EmbeddingCache(max_items=2)
+    cache.put_many([("a", ([1.0], {})), ("b", ([2.0], {}))])
+    assert cache.get_many(["a"]) == [([1.0], {})]
+    cache.put_many([("c", ([3.0], {}))])
+    # b is the least recently used one
+    assert cache.get_many(["a", "b", "c"]) == [([1.0], {}), None, ([3.0], {})]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["memory_items"]) == (3, 1, 2)
+
+
+def test_disk_tier(tmp_path):
+    path = str(tmp_path / "emb.db")
+    cache = EmbeddingCache(max_items=1, path=path)
+    cache.put_many([("a", ([0.1, 0.2], {"k": 1})), ("b", ([0.3], {}))])
+    cache.close()
+
+    cache = EmbeddingCache(max_items=1, path=path)
+    assert cache.get_many(["a", "b", "c"]) == [([0.1, 0.2], {"k": 1}), ([0.3], {}), None]
+    assert cache.stats()["disk_hits"] == 2
+    cache.close()
+
+
+def test_emb_only_sends_misses():
+    llm = ByzerLLM()
+    llm.setup_emb_cache(max_items=100)
+    calls = []
+    llm._query = fake_query(calls)
+
+    first = llm.emb("emb_model", LLMRequest(instruction=["a", "bb"]))
+    second = llm.emb("emb_model", LLMRequest(instruction=["bb", "ccc", "a"]))
+
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert [r.output for r in first] == [[1.0, 0.5], [2.0, 0.5]]
+    assert [r.output for r in second] == [[2.0, 0.5], [3.0, 0.5], [1.0, 0.5]]
+
+    # a caller changing its result does not change the cache
+    second[0].output.append(9.0)
+    assert llm.emb_query("bb", model="emb_model")[0].output == [2.0, 0.5]
+    assert len(calls) == 2
+    assert llm.emb_cache.stats()["hits"] == 3
+
+
+def test_failed_embeddings_are_not_cached():
+    llm = ByzerLLM()
+    llm.setup_emb_cache(max_items=100)
+    calls = []
+
+    def _query(model, v):
+        calls.append([item["instruction"] for item in v])
+        outputs = {"ok": [1.0], "err": [], "bad": "oops", "nested": [[1.0]]}
+        return [
+            {
+                "predict": outputs[item["instruction"]],
+                "metadata": {"error": "failed"} if item["instruction"] == "err" else {},
+                "input": item,
+            }
+            for item in v
+        ]
+
+    llm._query = _query
+    texts = ["ok", "err", "bad", "nested"]
+    first = llm.emb("emb_model", LLMRequest(instruction=texts))
+    assert [r.output for r in first] == [[1.0], [], "oops", [[1.0]]]
+    assert first[1].metadata == {"error": "failed"}
+
+    llm.emb("emb_model", LLMRequest(instruction=texts))
+    assert calls == [texts, ["err", "bad", "nested"]]
+    assert llm.emb_cache.stats()["memory_items"] == 1
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import numpy as np
+
+from byzerllm.utils.client import ByzerLLM, LLMRequest
+from byzerllm.utils.text_generator import _pack_results, simple_predict_func
+
+
+class FakeEmbeddingModel:
+    def __init__(self):
+        # the embedding path of ByzerLLMGenerator looks up `embedding.model`
+        self.model = self
+
+    def embed_query(self, ins, extract_params={}):
+        return [float(len(ins)), 0.25, -1.0]
+
+
+def local_llm():
+    llm = ByzerLLM()
+
+    def apply(model, worker_id, new_input_value):
+        return asyncio.run(simple_predict_func((FakeEmbeddingModel(), None), new_input_value))
+
+    llm._apply_with_udf_master = apply
+    return llm
+
+
+def test_pack_results():
+    results = [
+        {"predict": [1.0, 2.0], "metadata": {}, "input": {"binary_output": True}},
+        {"predict": np.array([3.0, 4.0]), "metadata": {}, "input": {}},
+        {"predict": [5.0, 6.0], "metadata": {}, "input": {"binary_output": True}},
+    ]
+    res = _pack_results(results)
+
+    assert res["embeddings"].dtype == np.float32
+    assert res["embeddings"].tolist() == [[1.0, 2.0], [5.0, 6.0]]
+    items = json.loads(res["value"][0])
+    assert [item["predict"] for item in items] == [None, [3.0, 4.0], None]
+    assert [item.get("embedding_row") for item in items] == [0, None, 1]
+
+
+def test_pack_results_without_binary_output():
+    res = _pack_results([{"predict": [1.0], "metadata": {}, "input": {}}])
+    assert "embeddings" not in res
+
+
+def test_emb_keeps_list_outputs():
+    llm = local_llm()
+    responses = llm.emb("emb_model", LLMRequest(instruction=["a", "bbb"]))
+    assert [r.output for r in responses] == [[1.0, 0.25, -1.0], [3.0, 0.25, -1.0]]
+    assert all(isinstance(r.output, list) for r in responses)
+
+
+def test_emb_array():
+    llm = local_llm()
+    matrix = llm.emb_array("emb_model", LLMRequest(instruction=["a", "bbb"]))
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (2, 3)
+    assert matrix[:, 0].tolist() == [1.0, 3.0]
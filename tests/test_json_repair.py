@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from byzerllm.utils.json_repaire import (
+    StreamingJSONParser,
+    iter_partial_json,
+    loads,
+    repair_json_str,
+)
+
+
+@pytest.mark.parametrize(
+    "broken,expected",
+    [
+        ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1, 2]}),
+        ("{name: John, age: 3}", {"name": "John", "age": 3}),
+        ("{'a': 'b'}", {"a": "b"}),
+        ('{"a": "x\\qy"}', {"a": "xqy"}),
+        ('```json\n{"a": true, "b": null, "c": -1.5}\n```', {"a": True, "b": None, "c": -1.5}),
+        ("[1, 2, 3,", [1, 2, 3]),
+        ("- - {}", {}),
+    ],
+)
+def test_repair(broken, expected):
+    assert loads(broken) == expected
+
+
+def test_repair_json_str_returns_the_repaired_text():
+    assert repair_json_str("{name: John, age: 3}") == '{"name": "John", "age": 3}'
+    assert repair_json_str('{"a": "x\\qy"}') == '{"a": "xqy"}'
+    assert repair_json_str('{"a": [1, 2 }') == '{"a": [1, 2 ]}'
+    assert json.loads(repair_json_str('{"a": "say "hi"", "b": 2}')) == {"a": 'say "hi"', "b": 2}
+
+
+def test_large_input_does_not_recurse():
+    # skipped characters used to recurse once per character
+    text = "#" * 200000 + "{" + ", ".join(f"k{i}: true" for i in range(20000)) + "}"
+    value = json.loads(repair_json_str(text)[200000:])
+    assert len(value) == 20000
+    assert value["k19999"] is True
+
+
+@pytest.mark.parametrize(
+    "prefix,expected",
+    [
+        ("Sure!\n```json\n", None),
+        ('{"name": "Jo', {"name": "Jo"}),
+        ('{"name": "Jo\\', {"name": "Jo"}),
+        ('{"name": "J\\u00', {"name": "J"}),
+        ('{"name": "Jo", "ag', {"name": "Jo"}),
+        ('{"name": "Jo", "age":', {"name": "Jo"}),
+        ('{"name": "Jo", "age": 3', {"name": "Jo", "age": 3}),
+        ('{"name": "Jo", "age": 3.', {"name": "Jo", "age": 3}),
+        ('{"name": "Jo", "ok": tr', {"name": "Jo"}),
+        ('{"tags": ["a", "b",', {"tags": ["a", "b"]}),
+        ('{"tags": ["a", {"x": [1, -', {"tags": ["a", {"x": [1]}]}),
+        ('{"a": 1} trailing text', {"a": 1}),
+    ],
+)
+def test_streaming_prefix(prefix, expected):
+    parser = StreamingJSONParser()
+    parser.feed(prefix)
+    assert parser.value() == expected
+
+
+def test_streaming_every_prefix_is_valid():
+    doc = {"answer": 'a "quoted" \\ value\n', "items": [{"id": i, "score": i / 3} for i in range(5)]}
+    text = "```json\n" + json.dumps(doc, indent=2) + "\n```"
+    parser = StreamingJSONParser()
+    for char in text:
+        parser.feed(char)
+        value = parser.value()
+        assert value is None or isinstance(value, dict)
+    assert parser.done
+    assert parser.value() == doc
+
+
+def test_iter_partial_json():
+    chunks = ['{"steps": ["plan"', ', "code"', ', "test"]}']
+    assert list(iter_partial_json(chunks)) == [
+        {"steps": ["plan"]},
+        {"steps": ["plan", "code"]},
+        {"steps": ["plan", "code", "test"]},
+    ]
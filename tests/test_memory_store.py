@@ -0,0 +1,88 @@
+from byzerllm.apps.agent.store import Message
+from byzerllm.apps.agent.store.memory_store import MemoryStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def message(id, content="hi"):
+    return Message(id=id, m={"content": content}, sender="a", receiver="b", timestamp=0.0)
+
+
+def contents(store, id):
+    return [m.m["content"] for m in store.get(id)]
+
+
+def test_messages_expire_after_ttl():
+    clock = FakeClock()
+    store = MemoryStore(ttl=10, clock=clock)
+    store.put(message("c1", "old"))
+    clock.now = 5
+    store.put(message("c2", "other"))
+    store.put(message("c1", "new"))
+
+    clock.now = 12
+    store.put(message("c3"))
+    assert contents(store, "c1") == ["new"]
+    assert contents(store, "c2") == ["other"]
+
+    clock.now = 16
+    store.put(message("c3"))
+    assert "c1" not in store.messages and "c2" not in store.messages
+    assert store.size == 2
+
+
+def test_memory_cap_evicts_oldest_first():
+    store = MemoryStore(max_messages=3, clock=FakeClock())
+    for i in range(5):
+        store.put(message(f"c{i % 2}", str(i)))
+    assert contents(store, "c0") == ["2", "4"]
+    assert contents(store, "c1") == ["3"]
+    assert store.size == 3
+
+
+def test_clear_and_end_marker():
+    clock = FakeClock()
+    store = MemoryStore(ttl=10, clock=clock)
+    store.put(message("c1", "a"))
+    store.clear("c1")
+    clock.now = 1
+    store.put(message("c1", "b"))
+    # the stale index entry of the cleared message must not expire the new one
+    clock.now = 10.5
+    store.put(message("c2"))
+    assert contents(store, "c1") == ["b"]
+
+    end = Message.model_construct(id="c1", m=None, sender="a", receiver="b", timestamp=0.0)
+    store.put(end)
+    assert len(store.get("c1")) == 2
+    assert store.get("c1") == []
+
+
+def test_clear_and_put_within_one_clock_tick():
+    store = MemoryStore(max_messages=2, clock=FakeClock())
+    store.put(message("c1", "a"))
+    store.put(message("c2", "x"))
+    store.clear("c1")
+    # same put time as the cleared message
+    store.put(message("c1", "b"))
+    store.put(message("c2", "y"))
+    # the stale entry of "a" must not evict "b", "x" is the oldest message
+    assert contents(store, "c1") == ["b"]
+    assert contents(store, "c2") == ["y"]
+    assert store.size == 2
+
+    for _ in range(3000):
+        store.put(message("c3"))
+        store.clear("c3")
+    # the compacted index keeps the live entries in put order
+    assert len(store.expiry_index) < 1100
+    store.put(message("c4"))
+    assert contents(store, "c1") == []
+    assert contents(store, "c2") == ["y"]
+    assert store.size == 2
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from byzerllm.model_cache import ModelCache, model_cache_key
+
+
+def make_model(path, weights=b"w" * 1000):
+    os.makedirs(os.path.join(path, "sub"), exist_ok=True)
+    with open(os.path.join(path, "config.json"), "w") as f:
+        f.write("{}")
+    with open(os.path.join(path, "sub", "weights.bin"), "wb") as f:
+        f.write(weights)
+
+
+def test_model_dir_is_copied_once_per_version(tmp_path):
+    model = str(tmp_path / "model")
+    make_model(model)
+    cache = ModelCache(str(tmp_path / "cache"))
+
+    first = cache.cache_model_dir(model)
+    second = cache.cache_model_dir(model)
+    assert first == second
+    with open(os.path.join(first, "sub", "weights.bin"), "rb") as f:
+        assert f.read() == b"w" * 1000
+
+    key = model_cache_key(model)
+    make_model(model, weights=b"v" * 999)
+    assert model_cache_key(model) != key
+    third = cache.cache_model_dir(model)
+    assert third != first
+    assert len(cache.entries()) == 2
+
+
+def test_failed_fill_is_not_cached(tmp_path):
+    cache = ModelCache(str(tmp_path / "cache"))
+
+    def fill(path):
+        os.makedirs(path)
+        raise RuntimeError("network is down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_create("k", fill)
+    assert cache.get("k") is None
+    assert cache.entries() == []
+
+    path = cache.get_or_create("k", lambda path: make_model(path))
+    assert os.path.exists(os.path.join(path, "config.json"))
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = ModelCache(str(tmp_path / "cache"))
+    for key in ["a", "b", "c"]:
+        cache.get_or_create(key, lambda path: make_model(path))
+    os.utime(cache.path_of("a"), (1, 1))
+    os.utime(cache.path_of("b"), (2, 2))
+
+    entry_size = cache.entries()[0]["bytes"]
+    assert cache.evict(max_bytes=entry_size * 2) == ["a"]
+    assert [entry["key"] for entry in cache.entries()] == ["b", "c"]
+
+
+def test_workers_restore_the_model_from_the_object_store_once(tmp_path, monkeypatch):
+    import byzerllm
+    import byzerllm.store
+
+    transfers = []
+
+    def transfer_from_ob(udf_name, model_refs, model_dir):
+        transfers.append(model_dir)
+        make_model(model_dir)
+
+    monkeypatch.setattr(byzerllm.store, "transfer_from_ob", transfer_from_ob)
+    monkeypatch.setattr(byzerllm, "transfer_from_ob", transfer_from_ob)
+    conf = {
+        "UDF_CLIENT": "chat",
+        "modelCacheKey": "k1",
+        "modelCacheDir": str(tmp_path / "cache"),
+    }
+    for worker in ["w1", "w2"]:
+        byzerllm.common_init_model([], conf, str(tmp_path / worker / "model"), is_load_from_local=False)
+        assert os.path.exists(str(tmp_path / worker / "model" / "config.json"))
+    assert len(transfers) == 1
+    assert os.path.realpath(str(tmp_path / "w1" / "model")) == os.path.realpath(str(tmp_path / "w2" / "model"))
+
+
+def test_deploy_sets_the_model_cache_key(tmp_path):
+    from byzerllm.utils.client import ByzerLLM
+
+    model = str(tmp_path / "model")
+    make_model(model)
+    llm = ByzerLLM.__new__(ByzerLLM)
+    llm.sys_conf = {"modelCache": "true"}
+    llm.context = type("Context", (), {})()
+    llm._setup_model_cache_key(model)
+    assert llm.sys_conf["modelCacheKey"] == model_cache_key(model)
+    assert llm.context.conf is llm.sys_conf
+
+    llm._setup_model_cache_key(str(tmp_path / "not_on_this_node"))
+    assert "modelCacheKey" not in llm.sys_conf
+
+    cache = ModelCache(str(tmp_path / "cache"))
+    assert cache.cache_model_dir(model, key="k") == cache.path_of("k")
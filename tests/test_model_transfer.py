@@ -0,0 +1,58 @@
+import os
+
+import pytest
+import ray
+from pyjava.storage import streaming_tar
+
+from byzerllm.store import pipelined_transfer_from_ob
+
+
+@pytest.fixture(scope="module")
+def ray_env():
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_model_transfer")
+    yield
+    ray.shutdown()
+
+
+def make_model(path):
+    os.makedirs(os.path.join(path, "sub"))
+    files = {
+        "config.json": b'{"a": 1}',
+        "sub/weights.bin": os.urandom(300 * 1024 + 7),
+        "empty.txt": b"",
+    }
+    for name, content in files.items():
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(content)
+    return files
+
+
+def test_restores_the_model(ray_env, tmp_path):
+    source = str(tmp_path / "source")
+    files = make_model(source)
+    refs = [ray.put(row) for row in streaming_tar.build_rows_from_file(source)]
+
+    target = str(tmp_path / "models" / "target")
+    stats = pipelined_transfer_from_ob("test", refs, target, prefetch_blocks=2, batch_size=2)
+
+    assert stats["blocks"] == len(refs)
+    assert stats["bytes"] > 300 * 1024
+    restored = {}
+    for root, _, names in os.walk(target):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as f:
+                restored[name] = f.read()
+    assert restored == {os.path.basename(k): v for k, v in files.items()}
+    assert os.listdir(str(tmp_path / "models")) == ["target"]
+
+
+def test_failed_transfer_leaves_no_model_dir(ray_env, tmp_path):
+    source = str(tmp_path / "source")
+    make_model(source)
+    rows = list(streaming_tar.build_rows_from_file(source))
+    refs = [ray.put(row) for row in rows[:2]] + [ray.put({"value": b"x" * 10})]
+
+    target = str(tmp_path / "models" / "target")
+    with pytest.raises(Exception):
+        pipelined_transfer_from_ob("test", refs, target, prefetch_blocks=1, batch_size=1)
+    assert os.listdir(str(tmp_path / "models")) == []
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from byzerllm.utils.nontext import Audio, Image, Tag, TagExtractor
+
+
+class CharTagExtractor(TagExtractor):
+    """The previous extract, which walks the text char by char."""
+
+    def extract(self):
+        if self.is_extracted:
+            return self.root_tag
+        while True:
+            if self.pos == self.len - 1:
+                break
+            if self.is_start_tag():
+                self.extract_start_tag()
+            elif self.is_end_tag():
+                self.extract_end_tag()
+            elif self.is_in_tag():
+                if self.is_tag_content():
+                    self.consume_blank()
+                    continue
+                else:
+                    self.extract_str_content()
+            elif self.is_not_in_tag_str():
+                self.extract_content_not_in_tag()
+        self.is_extracted = True
+        return self.root_tag
+
+
+def tree(tag):
+    if isinstance(tag, str):
+        return tag
+    content = tag.content
+    if isinstance(content, list):
+        content = [tree(item) for item in content]
+    elif isinstance(content, Tag):
+        content = tree(content)
+    return (tag.start_tag, tag.end_tag, content)
+
+
+PIECES = ["<_a_>", "</_a_>", "<_image_>", "</_image_>", "<_audio_>", "</_audio_>",
+          "text", "x", " ", "\n", "\t", "<", ">", "_", "/", "<b>", "a < b"]
+
+
+def test_extract_matches_the_char_level_extractor():
+    rnd = random.Random(7)
+    compared = 0
+    for _ in range(5000):
+        text = "".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 12)))
+        try:
+            expected = tree(CharTagExtractor(text).extract())
+        except IndexError:
+            # a trailing "<" or "</", which is text now
+            assert text.endswith("<") or text.endswith("</")
+            continue
+        except Exception:
+            # malformed text, e.g. an unclosed tag, fails both ways
+            with pytest.raises(ValueError):
+                TagExtractor(text).extract()
+            continue
+        assert tree(TagExtractor(text).extract()) == expected, text
+        compared += 1
+    assert compared > 1000
+
+
+def test_nested_tags():
+    text = "say <_a_> hi <_b_>\n bold </_b_> </_a_> bye"
+    root = TagExtractor(text).extract()
+    assert tree(root) == tree(CharTagExtractor(text).extract())
+    assert tree(root.content[0]) == ("<_a_>", "</_a_>", ["hi ", ("<_b_>", "</_b_>", "bold ")])
+
+
+def test_trailing_lt_is_text():
+    # the char level extractor raised IndexError here
+    assert tree(TagExtractor("<_image_>x.png</_image_> a <").extract()) == (
+        "<_ROOT_>", "</_ROOT_>", [("<_image_>", "</_image_>", "x.png")]
+    )
+
+
+def test_media_types_in_one_pass():
+    text = "<_image_>data:image/png;base64,AA</_image_><_audio_>data:audio/wav;base64,BB</_audio_> hi"
+    tags = TagExtractor(text)
+    assert tags.media_types() == ["image", "audio"]
+    assert Image.from_extracted(tags).to_content() == Image(text).to_content()
+    assert Audio.from_extracted(tags).has_audio()
+    assert TagExtractor("<_image_>not closed").media_types() == []
+    assert TagExtractor("plain <b>text</b>").media_types() == []
@@ -0,0 +1,72 @@
+import byzerllm
+from byzerllm.utils import (
+    format_prompt,
+    format_prompt_jinja2,
+    get_func_signature,
+    get_prompt_template,
+)
+
+
+def hello(name: str, items: list = []):
+    """
+    Hello {{ name }}!
+    {% for item in items %}- {{ item }}
+    {% endfor %}
+    """
+
+
+def hello_langchain(name: str):
+    """
+    Hello {name}!
+    """
+
+
+def test_template_is_compiled_once():
+    assert get_prompt_template(hello) is get_prompt_template(hello)
+    assert format_prompt_jinja2(hello, name="a", items=["x"]) == "\nHello a!\n- x\n"
+    assert format_prompt(hello_langchain, name="b") == "\nHello b!\n"
+    assert get_func_signature(hello) is get_func_signature(hello)
+
+
+class SlottedPrompt:
+    """
+    Slotted {{ name }}
+    """
+
+    __slots__ = ()
+
+    def __call__(self, name: str):
+        pass
+
+
+def test_callables_without_weakrefs_are_not_cached():
+    prompt = SlottedPrompt()
+    assert format_prompt_jinja2(prompt, name="a") == "\nSlotted a"
+    assert get_prompt_template(prompt) is not get_prompt_template(prompt)
+
+
+def test_reassigned_docstring_is_recompiled():
+    def greet(name: str):
+        """
+        Hi {{ name }}
+        """
+
+    assert format_prompt_jinja2(greet, name="a") == "\nHi a"
+    greet.__doc__ = """
+        Bye {{ name }}
+    """
+    assert format_prompt_jinja2(greet, name="a") == "\nBye a"
+
+
+class Agent:
+    @byzerllm.prompt()
+    def plan(self, goal: str) -> str:
+        """
+        Plan for {{ goal }}
+        """
+
+
+def test_prompt_decorator_renders_with_cache():
+    agent = Agent()
+    assert agent.plan.prompt("x") == "\nPlan for x"
+    assert agent.plan.prompt("y") == "\nPlan for y"
@@ -0,0 +1,118 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from byzerllm.utils.client import AsyncByzerLLM, ByzerLLM
+from byzerllm.utils.client.request_coalescer import RequestCoalescer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def chat_llm(cls=ByzerLLM, **kwargs):
+    llm = cls()
+    llm.meta_cache["m"] = {"model_deploy_type": "saas", "message_format": True}
+    llm.setup_chat_coalescing(**kwargs)
+    calls = []
+
+    def _query(model, v):
+        calls.append(v[0]["instruction"])
+        time.sleep(0.2)
+        return [{"predict": v[0]["instruction"].upper(), "metadata": {}, "input": v[0]} for _ in v]
+
+    async def _aquery(model, v):
+        calls.append(v[0]["instruction"])
+        await asyncio.sleep(0.2)
+        return [{"predict": v[0]["instruction"].upper(), "metadata": {}, "input": v[0]} for _ in v]
+
+    llm._query = _query
+    llm._aquery = _aquery
+    return llm, calls
+
+
+def test_identical_concurrent_requests_share_one_call():
+    llm, calls = chat_llm()
+
+    def chat(text):
+        return llm.chat_oai(text, model="m", llm_config={"temperature": 0})[0].output
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        outputs = list(executor.map(chat, ["plan"] * 6 + ["other"] * 2))
+
+    assert outputs == ["PLAN"] * 6 + ["OTHER"] * 2
+    assert sorted(calls) == ["other", "plan"]
+    stats = llm.chat_coalescer.stats()
+    assert (stats["executed"], stats["coalesced"], stats["inflight"]) == (2, 6, 0)
+
+
+def test_sampled_requests_are_not_coalesced():
+    llm, calls = chat_llm()
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda _: llm.chat_oai("plan", model="m"), range(4)))
+    assert len(calls) == 4
+
+
+def test_ttl_cache():
+    clock = FakeClock()
+    coalescer = RequestCoalescer(cache_ttl=10, max_items=2, clock=clock)
+    calls = []
+
+    def call(key):
+        return coalescer.run(key, lambda: calls.append(key) or {"v": key})
+
+    call("a")
+    result = call("a")
+    result["v"] = "changed"
+    assert call("a") == {"v": "a"}
+    call("b")
+    call("c")
+    # "a" was evicted by the LRU
+    call("a")
+    clock.now = 11
+    call("c")
+    assert calls == ["a", "b", "c", "a", "c"]
+    assert coalescer.stats()["cache_hits"] == 2
+
+
+def test_errors_reach_the_waiting_callers():
+    coalescer = RequestCoalescer()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        first = executor.submit(coalescer.run, "k", fail)
+        started.wait()
+        second = executor.submit(coalescer.run, "k", fail)
+        for future in [first, second]:
+            with pytest.raises(ValueError):
+                future.result()
+    # nothing is cached after a failure
+    assert coalescer.run("k", lambda: 1) == 1
+
+
+def test_achat_oai_coalesces():
+    llm, calls = chat_llm(AsyncByzerLLM, cache_ttl=60)
+
+    async def run():
+        return await asyncio.gather(
+            *[llm.achat_oai("plan", model="m", llm_config={"temperature": 0}) for _ in range(5)]
+        )
+
+    outputs = asyncio.run(run())
+    assert [r[0].output for r in outputs] == ["PLAN"] * 5
+    assert calls == ["plan"]
+    assert llm.chat_oai("plan", model="m", llm_config={"temperature": 0})[0].output == "PLAN"
+    assert calls == ["plan"]
+    assert llm.chat_coalescer.stats()["cache_hits"] == 1
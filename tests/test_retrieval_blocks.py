@@ -0,0 +1,93 @@
+import json
+import sys
+
+import pytest
+import ray
+
+import byzerllm.utils.object_store_ref_util as ref_utils
+from byzerllm.utils.retrieval import ByzerRetrieval, ByzerRetrievalProxy
+from byzerllm.utils.retrieval.blocks import iter_ndjson, pack_ndjson
+
+
+class FakeCluster:
+    """Stands in for the retrieval cluster, it only records the builds."""
+
+    def __init__(self):
+        self.builds = []
+
+    def clusterInfo(self):
+        return json.dumps(
+            {
+                "tableSettingsList": [
+                    {"database": "db", "table": "t", "schema": "", "location": "", "num_shards": 1}
+                ]
+            }
+        )
+
+    def buildFromRayObjectStore(self, database, table, data_ids, locations):
+        assert len(data_ids) == len(locations)
+        self.builds.append((database, table, len(data_ids)))
+        return True
+
+    def get_builds(self):
+        return self.builds
+
+
+class ProxyWithCluster(ByzerRetrievalProxy):
+    def __init__(self, cluster):
+        super().__init__()
+        self.launched = True
+        self.clusters["c"] = cluster
+
+
+@pytest.fixture
+def ray_env():
+    ray.cloudpickle.register_pickle_by_value(sys.modules[__name__])
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_retrieval_blocks")
+    yield
+    ray.shutdown()
+
+
+def rows(n):
+    return [{"_id": i, "content": f"第{i}行\n\"quoted\"", "vector": [0.5, i]} for i in range(n)]
+
+
+def test_pack_ndjson_round_trip():
+    blocks = list(pack_ndjson(rows(25), block_rows=10))
+    assert len(blocks) == 3
+    docs = [json.loads(doc) for block in blocks for doc in iter_ndjson(block)]
+    assert docs == rows(25)
+    assert list(pack_ndjson([], block_rows=10)) == []
+    with pytest.raises(ValueError):
+        list(pack_ndjson(rows(1), block_rows=0))
+
+
+def test_build_from_dicts_builds_per_block(ray_env, monkeypatch):
+    cluster = ray.remote(FakeCluster).options(num_cpus=0).remote()
+    proxy = ProxyWithCluster(cluster)
+
+    sent = []
+    get_object_ids = ref_utils.get_object_ids
+
+    def record(refs):
+        sent.extend(ray.get(refs))
+        return get_object_ids(refs)
+
+    monkeypatch.setattr(ref_utils, "get_object_ids", record)
+
+    assert proxy.build_from_dicts("c", "db", "t", rows(25), block_rows=10)
+    assert ray.get(cluster.get_builds.remote()) == [("db", "t", 10), ("db", "t", 10), ("db", "t", 5)]
+    # the cluster reads one JSON document (a str) per object, as before
+    assert [json.loads(doc) for doc in sent] == rows(25)
+
+    with pytest.raises(Exception, match="not exists"):
+        proxy.build_from_dicts("c", "db", "missing", rows(1))
+
+
+def test_pure_client_sends_blocks_to_the_proxy(ray_env):
+    cluster = ray.remote(FakeCluster).options(num_cpus=0).remote()
+    retrieval = ByzerRetrieval(pure_client=True)
+    retrieval.retrieval_proxy = ray.remote(ProxyWithCluster).options(num_cpus=0).remote(cluster)
+
+    assert retrieval.build_from_dicts("c", "db", "t", rows(7), block_rows=3)
+    assert [n for _, _, n in ray.get(cluster.get_builds.remote())] == [3, 3, 1]
@@ -0,0 +1,62 @@
+import json
+import sys
+
+import pytest
+import ray
+
+from byzerllm.records import SearchQuery
+from byzerllm.utils.retrieval import ByzerRetrievalProxy
+from byzerllm.utils.retrieval.fusion import reciprocal_rank_fusion
+
+
+def test_rrf_merges_and_deduplicates():
+    a = [{"_id": 1, "v": "a1"}, {"_id": 2}, {"_id": 3}]
+    b = [{"_id": 3}, {"_id": 1, "v": "b1"}, {"_id": 4}]
+    merged = reciprocal_rank_fusion([a, b], k=60)
+    assert [x["_id"] for x in merged] == [1, 3, 2, 4]
+    assert merged[0]["_rrf_score"] == pytest.approx(1 / 61 + 1 / 62)
+    # the first copy of a document is kept, the inputs are not changed
+    assert merged[0]["v"] == "a1"
+    assert "_rrf_score" not in a[0]
+
+    assert [x["_id"] for x in reciprocal_rank_fusion([a, b], limit=2)] == [1, 3]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_rrf_without_ids_uses_the_content():
+    merged = reciprocal_rank_fusion([[{"t": "x"}, {"t": "y"}], [{"t": "y"}]])
+    assert [x["t"] for x in merged] == ["y", "x"]
+
+
+class FakeCluster:
+    def search(self, query_json):
+        queries = json.loads(query_json)
+        assert len(queries) == 1
+        keyword = queries[0]["keyword"]
+        return json.dumps([{"_id": f"{keyword}-{i}"} for i in range(queries[0]["limit"])])
+
+
+@pytest.fixture
+def ray_env():
+    ray.cloudpickle.register_pickle_by_value(sys.modules[__name__])
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_retrieval_fusion")
+    yield
+    ray.shutdown()
+
+
+def test_search_many_keeps_the_results_of_each_query(ray_env):
+    proxy = ByzerRetrievalProxy()
+    proxy.launched = True
+    proxy.clusters["c"] = ray.remote(FakeCluster).options(num_cpus=0).remote()
+
+    queries = [
+        SearchQuery("db", "t", filters={}, keyword=k, fields=["content"], vector=[], vectorField=None, limit=2)
+        for k in ["a", "b", "c"]
+    ]
+    assert proxy.search_many("c", queries) == [
+        [{"_id": "a-0"}, {"_id": "a-1"}],
+        [{"_id": "b-0"}, {"_id": "b-1"}],
+        [{"_id": "c-0"}, {"_id": "c-1"}],
+    ]
+    with pytest.raises(Exception):
+        proxy.search_many("c", [])
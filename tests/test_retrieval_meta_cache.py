@@ -0,0 +1,124 @@
+import json
+import sys
+
+import pytest
+import ray
+
+from byzerllm.records import TableSettings
+from byzerllm.utils.retrieval import ByzerRetrievalProxy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCluster:
+    def __init__(self):
+        self.tables = [{"database": "db", "table": "t", "schema": "", "location": "", "num_shards": 1}]
+        self.info_calls = 0
+
+    def clusterInfo(self):
+        self.info_calls += 1
+        return json.dumps({"tableSettingsList": self.tables})
+
+    def createTable(self, settings):
+        self.tables.append(json.loads(settings))
+        return True
+
+    def commit(self, database, table):
+        return True
+
+    def get_info_calls(self):
+        return self.info_calls
+
+
+class FakeGateway:
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.get_calls = 0
+
+    def getCluster(self, name):
+        self.get_calls += 1
+        return self.cluster
+
+    def shutdownCluster(self, name):
+        return True
+
+    def get_get_calls(self):
+        return self.get_calls
+
+
+@pytest.fixture
+def ray_env():
+    ray.cloudpickle.register_pickle_by_value(sys.modules[__name__])
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_retrieval_meta_cache")
+    yield
+    ray.shutdown()
+
+
+def make_proxy(ttl=60):
+    clock = FakeClock()
+    cluster = ray.remote(FakeCluster).options(num_cpus=0).remote()
+    gateway = ray.remote(FakeGateway).options(num_cpus=0).remote(cluster)
+    proxy = ByzerRetrievalProxy(meta_cache_ttl=ttl, clock=clock)
+    proxy.launched = True
+    proxy.retrieval_gateway = gateway
+    return proxy, cluster, gateway, clock
+
+
+def test_table_checks_are_cached(ray_env):
+    proxy, cluster, gateway, clock = make_proxy()
+    for _ in range(5):
+        assert proxy.commit("c", "db", "t")
+    assert ray.get(cluster.get_info_calls.remote()) == 1
+    assert ray.get(gateway.get_get_calls.remote()) == 1
+    stats = proxy.meta_cache_stats()
+    assert stats["table_loads"] == 1 and stats["table_hits"] == 4
+    assert stats["round_trips_saved"] == stats["cluster_hits"] + stats["table_hits"]
+
+    # both expire after the ttl
+    clock.now = 61
+    assert proxy.check_table_exists("c", "db", "t")
+    assert ray.get(cluster.get_info_calls.remote()) == 2
+    assert ray.get(gateway.get_get_calls.remote()) == 2
+
+
+def test_cache_is_invalidated(ray_env):
+    proxy, cluster, gateway, clock = make_proxy()
+    assert not proxy.check_table_exists("c", "db", "t2")
+    proxy.create_table("c", TableSettings("db", "t2", "", "", 1))
+    calls = ray.get(cluster.get_info_calls.remote())
+    assert proxy.check_table_exists("c", "db", "t2")
+    assert ray.get(cluster.get_info_calls.remote()) == calls + 1
+
+    # a table created by another client is found, the cache is reloaded once
+    ray.get(cluster.createTable.remote(TableSettings("db", "t3", "", "", 1).json()))
+    assert proxy.check_table_exists("c", "db", "t3")
+
+    proxy.shutdown_cluster("c")
+    assert "c" not in proxy.clusters
+    proxy.cluster("c")
+    assert ray.get(gateway.get_get_calls.remote()) == 2
+
+
+def test_ttl_zero_disables_the_table_cache(ray_env):
+    proxy, cluster, gateway, clock = make_proxy(ttl=0)
+    for _ in range(3):
+        assert proxy.check_table_exists("c", "db", "t")
+    assert ray.get(cluster.get_info_calls.remote()) == 3
+    # the handle is kept, as before
+    assert ray.get(gateway.get_get_calls.remote()) == 1
+
+
+def test_invalidating_all_handles_drops_handles_without_cached_tables(ray_env):
+    proxy, cluster, gateway, clock = make_proxy()
+    proxy.cluster("c")
+    assert "c" in proxy.clusters and "c" not in proxy.table_settings_cache
+    proxy.invalidate_meta_cache(handle=True)
+    assert proxy.clusters == {}
+    proxy.cluster("c")
+    assert ray.get(gateway.get_get_calls.remote()) == 2
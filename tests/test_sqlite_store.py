@@ -0,0 +1,102 @@
+import time
+
+import pytest
+import ray
+
+from byzerllm.apps.agent.store import Message
+from byzerllm.apps.agent.store.memory_store import MemoryStore
+from byzerllm.apps.agent.store.sqlite_store import SqliteStore
+from byzerllm.apps.agent.store.stores import Stores, start_message_store
+
+
+def message(id, content):
+    return Message(id=id, m={"content": content}, sender="a", receiver="b", timestamp=time.monotonic())
+
+
+def contents(messages):
+    return [m.m["content"] for m in messages]
+
+
+def test_group_commit_and_restart(tmp_path):
+    path = str(tmp_path / "messages.db")
+    store = SqliteStore(path, flush_interval_ms=200)
+    for i in range(50):
+        store.put(message(f"c{i % 2}", str(i)))
+    store.flush()
+    assert store.commits <= 2
+
+    assert contents(store.get("c0")) == [str(i) for i in range(0, 50, 2)]
+    store.put(message("c0", "tail"))
+    # served from the cache, before the put was written
+    assert contents(store.get("c0"))[-1] == "tail"
+    store.close()
+
+    store = SqliteStore(path)
+    assert len(store.get("c0")) == 26
+    assert contents(store.get("c1"))[:2] == ["1", "3"]
+    store.close()
+
+
+def test_clear_and_end_marker(tmp_path):
+    store = SqliteStore(str(tmp_path / "messages.db"))
+    store.put(message("c1", "a"))
+    store.clear("c1")
+    assert store.get("c1") == []
+
+    store.put(message("c1", "b"))
+    store.put(Message.model_construct(id="c1", m=None, sender="a", receiver="b", timestamp=0.0))
+    assert len(store.get("c1")) == 2
+    assert store.get("c1") == []
+    store.close()
+
+
+@pytest.fixture
+def ray_env():
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_message_store")
+    yield
+    ray.shutdown()
+
+
+def test_stores_batches_puts_to_an_actor(ray_env):
+    actor = start_message_store("TEST_MESSAGE_STORE", MemoryStore)
+    try:
+        stores = Stores("TEST_MESSAGE_STORE", batch_size=3, batch_wait_ms=50)
+        for i in range(4):
+            stores.put(message("c1", str(i)))
+        # 3 messages went out as one batch, the 4th one is buffered
+        assert len(stores.buffer) == 1
+        assert contents(stores.get("c1")) == ["0", "1", "2", "3"]
+
+        stores.put(message("c1", "4"))
+        time.sleep(0.5)
+        assert stores.buffer == []
+        assert contents(ray.get(actor.get.remote("c1")))[-1] == "4"
+    finally:
+        ray.kill(actor)
+
+
+def test_stores_batches_puts_to_a_sqlite_actor(ray_env, tmp_path):
+    actor = start_message_store("TEST_SQLITE_MESSAGE_STORE", SqliteStore, path=str(tmp_path / "messages.db"))
+    try:
+        stores = Stores("TEST_SQLITE_MESSAGE_STORE", batch_size=2, batch_wait_ms=1000)
+        assert stores.put(message("c1", "0")) is None
+        ref = stores.put(message("c1", "1"))
+        # the store is not sent back as the result of the batch
+        assert ray.get(ref) is None
+        assert contents(stores.get("c1")) == ["0", "1"]
+    finally:
+        ray.kill(actor)
+
+
+def test_stores_put_right_away_by_default(ray_env):
+    actor = start_message_store("TEST_UNBATCHED_MESSAGE_STORE", MemoryStore)
+    try:
+        stores = Stores("TEST_UNBATCHED_MESSAGE_STORE")
+        ray.get(stores.put(message("c1", "0")))
+        assert stores.buffer == []
+        # a fresh client sees the message without any flush
+        assert contents(Stores("TEST_UNBATCHED_MESSAGE_STORE").get("c1")) == ["0"]
+        stores.clear("c1")
+        assert Stores("TEST_UNBATCHED_MESSAGE_STORE").get("c1") == []
+    finally:
+        ray.kill(actor)
@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip("jieba")
+
+from byzerllm.apps.byzer_storage.simple_api import ByzerStorage
+from byzerllm.utils.client import LLMResponse
+
+
+class FakeLLM:
+    default_emb_model_name = "emb"
+
+    def __init__(self):
+        self.requests = []
+
+    def emb(self, model, request):
+        self.requests.append(request.instruction)
+        texts = request.instruction if isinstance(request.instruction, list) else [request.instruction]
+        return [LLMResponse(output=[float(len(s))], metadata={}, input=s) for s in texts]
+
+
+class FakeRetrieval:
+    def __init__(self):
+        self.calls = []
+
+    def search_many(self, cluster_name, search_queries):
+        self.calls.append(search_queries)
+        return [
+            [{"_id": f"{q.vector[0]:.0f}"}, {"_id": "common"}] for q in search_queries
+        ]
+
+
+def make_storage():
+    storage = ByzerStorage.__new__(ByzerStorage)
+    storage.cluster_name = "c"
+    storage.database = "db"
+    storage.table = "t"
+    storage.llm = FakeLLM()
+    storage.retrieval = FakeRetrieval()
+    return storage
+
+
+def test_query_variants_are_searched_in_one_request():
+    storage = make_storage()
+    variants = ["a", "bb", "ccc"]
+    docs = (
+        storage.query_builder()
+        .set_search_query(variants, fields="content")
+        .set_vector_query(variants, fields="vector")
+        .set_limit(3)
+        .execute()
+    )
+    # one embedding request and one search request for all the variants
+    assert storage.llm.requests == [variants]
+    assert len(storage.retrieval.calls) == 1
+    queries = storage.retrieval.calls[0]
+    assert [q.vector for q in queries] == [[1.0], [2.0], [3.0]]
+    assert [q.keyword for q in queries] == [storage.tokenize(v) for v in variants]
+    assert [d["_id"] for d in docs] == ["common", "1", "2"]
+
+
+def test_query_variants_must_match():
+    storage = make_storage()
+    builder = (
+        storage.query_builder()
+        .set_search_query(["a", "b"], fields="content")
+        .set_vector_query(["a", "b", "c"], fields="vector")
+    )
+    with pytest.raises(ValueError):
+        builder.execute()
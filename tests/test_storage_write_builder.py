@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+pytest.importorskip("jieba")
+
+from byzerllm.apps.byzer_storage.simple_api import ByzerStorage
+from byzerllm.utils.client import LLMResponse
+
+
+class FakeLLM:
+    default_emb_model_name = "emb"
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def emb(self, model, request):
+        with self.lock:
+            self.batches.append(list(request.instruction))
+        return [
+            LLMResponse(output=[float(len(s))], metadata={}, input=s)
+            for s in request.instruction
+        ]
+
+
+class FakeRetrieval:
+    def __init__(self):
+        self.built = []
+
+    def build_from_dicts(self, cluster_name, database, table, data):
+        self.built.extend(data)
+        return True
+
+
+def make_storage():
+    storage = ByzerStorage.__new__(ByzerStorage)
+    storage.cluster_name = "c"
+    storage.database = "db"
+    storage.table = "t"
+    storage.llm = FakeLLM()
+    storage.retrieval = FakeRetrieval()
+    return storage
+
+
+def test_execute_embeds_in_batches():
+    storage = make_storage()
+    items = [{"_id": i, "content": "x" * (i % 100), "raw": "你好 世界"} for i in range(150)]
+    builder = storage.write_builder().set_emb_batch_size(32).set_emb_concurrency(3)
+    builder.add_items(items, vector_fields=["content"], search_fields=["raw"])
+    # nothing is embedded before execute
+    assert storage.llm.batches == []
+
+    assert builder.execute()
+    # 100 distinct texts, each embedded once
+    assert sorted(len(b) for b in storage.llm.batches) == [4, 32, 32, 32]
+    assert storage.retrieval.built == items
+    assert items[7]["content"] == [7.0]
+    assert items[0]["raw"] == storage.tokenize("你好 世界")
+    assert builder.stats["emb"]["items"] == 100
+    assert builder.stats["tokenize"]["items"] == 150
+    assert builder.stats["write"]["items"] == 150
+
+
+def test_add_item_requires_fields():
+    with pytest.raises(ValueError):
+        make_storage().write_builder().add_item({"_id": 1})
@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+
+from byzerllm.utils.types import (
+    BlockBinaryStreamServer,
+    BlockVLLMStreamServer,
+    VLLMStreamServer,
+    StreamOutputs,
+    SingleOutput,
+    SingleOutputMeta,
+    stream_server_shard_name,
+)
+from byzerllm.utils.client.byzerllm_client import _StreamText
+
+
+def _output(text, delta=False):
+    return StreamOutputs(outputs=[SingleOutput(text=text)], delta=delta)
+
+
+def test_block_vllm_long_poll_coalesces_to_latest():
+    server = BlockVLLMStreamServer()
+    server.add_item("r1", "RUNNING")
+    assert server.get_items_since("r1", 0, timeout=0.05) == (0, [], False)
+
+    server.add_item("r1", _output("a"))
+    server.add_item("r1", _output("ab"))
+    offset, items, done = server.get_items_since("r1", 0)
+    assert offset == 2 and not done
+    assert [i.outputs[0].text for i in items] == ["ab"]
+
+    # the placeholder must not overwrite chunks which are already there
+    server.add_item("r1", "RUNNING")
+    server.mark_done("r1")
+    assert server.get_items_since("r1", offset) == (2, [], True)
+    assert server.get_items_since("r1", offset) == (2, [], True)
+
+
+def test_block_vllm_long_poll_wakes_up_on_new_item():
+    server = BlockVLLMStreamServer()
+    server.add_item("r1", "RUNNING")
+
+    def producer():
+        time.sleep(0.05)
+        server.add_item("r1", _output("hello"))
+
+    threading.Thread(target=producer).start()
+    start = time.monotonic()
+    offset, items, done = server.get_items_since("r1", 0, timeout=5)
+    assert time.monotonic() - start < 1
+    assert offset == 1 and items[0].outputs[0].text == "hello"
+
+
+def test_block_vllm_delta_chunks_are_appended_and_trimmed():
+    server = BlockVLLMStreamServer()
+    server.add_item("r1", "RUNNING")
+    server.add_item("r1", _output("he", delta=True))
+    server.add_item("r1", _output("llo", delta=True))
+    offset, items, done = server.get_items_since("r1", 0)
+    assert offset == 2
+    assert "".join(i.outputs[0].text for i in items) == "hello"
+
+    server.add_item("r1", _output(" world", delta=True))
+    # chunks before the reader's offset are acknowledged and released
+    assert len(server.cache["r1"].chunks) == 3
+    offset, items, done = server.get_items_since("r1", offset)
+    assert [i.outputs[0].text for i in items] == [" world"]
+    assert len(server.cache["r1"].chunks) == 1
+
+
+def test_binary_stream_returns_all_pending_chunks():
+    server = BlockBinaryStreamServer()
+    server.add_item("r1", "RUNNING")
+    for chunk in [b"a", b"b", b"c"]:
+        server.add_item("r1", _output(chunk))
+    offset, items, done = server.get_items_since("r1", 0)
+    assert offset == 3
+    assert [i.outputs[0].text for i in items] == [b"a", b"b", b"c"]
+
+    server.add_item("r1", _output(b"d"))
+    server.mark_done("r1")
+    offset, items, done = server.get_items_since("r1", offset)
+    assert (offset, done) == (4, True)
+    assert [i.outputs[0].text for i in items] == [b"d"]
+
+
+def test_binary_stream_legacy_get_item():
+    server = BlockBinaryStreamServer()
+    server.add_item("r1", "RUNNING")
+    assert server.get_item("r1") == "RUNNING"
+    server.add_item("r1", _output(b"a"))
+    server.mark_done("r1")
+    assert server.get_item("r1").outputs[0].text == b"a"
+    assert server.get_item("r1") is None
+
+
+def test_legacy_get_item_merges_deltas():
+    server = BlockVLLMStreamServer()
+    server.add_item("r1", "RUNNING")
+    server.add_item("r1", _output("He", delta=True))
+    server.add_item("r1", _output("llo", delta=True))
+    assert server.get_item("r1").outputs[0].text == "Hello"
+    server.add_item("r1", _output(" world", delta=True))
+    assert server.get_item("r1").outputs[0].text == "Hello world"
+    assert server.stats()["bytes_held"] == len("Hello world")
+    server.mark_done("r1")
+    item = server.get_item("r1")
+    assert item.outputs[0].text == "Hello world" and not item.delta
+    assert server.get_item("r1") is None
+
+
+def test_async_vllm_stream_server():
+    async def run():
+        server = VLLMStreamServer()
+        await server.add_item("r1", "RUNNING")
+
+        async def producer():
+            await asyncio.sleep(0.05)
+            await server.add_item("r1", _output("x"))
+            await server.mark_done("r1")
+
+        asyncio.get_running_loop().create_task(producer())
+        offset, items, done = await server.get_items_since("r1", 0, timeout=5)
+        assert offset == 1 and items[0].outputs[0].text == "x"
+        if not done:
+            offset, items, done = await server.get_items_since("r1", offset, timeout=5)
+        assert done
+
+    asyncio.run(run())
+
+
+def test_stream_server_shard_name():
+    assert stream_server_shard_name("BLOCK_VLLM_STREAM_SERVER", "abc", 1) == "BLOCK_VLLM_STREAM_SERVER"
+    names = {
+        stream_server_shard_name("BLOCK_VLLM_STREAM_SERVER", f"req-{i}", 4)
+        for i in range(200)
+    }
+    assert names == {
+        "BLOCK_VLLM_STREAM_SERVER",
+        "BLOCK_VLLM_STREAM_SERVER_1",
+        "BLOCK_VLLM_STREAM_SERVER_2",
+        "BLOCK_VLLM_STREAM_SERVER_3",
+    }
+    # producers and readers live in different processes, the mapping must be stable
+    assert stream_server_shard_name("S", "req-1", 4) == stream_server_shard_name("S", "req-1", 4)
+
+
+def test_abandoned_streams_expire_after_ttl():
+    server = BlockVLLMStreamServer(ttl=0.05)
+    server.add_item("abandoned", _output("x" * 10))
+    server.mark_done("abandoned")
+    time.sleep(0.1)
+    server.add_item("r2", _output("y"))
+    stats = server.stats()
+    assert "abandoned" not in server.cache
+    assert stats["live_streams"] == 1
+    assert stats["evicted_streams"] == 1
+    assert stats["evicted_bytes"] == 10
+    assert stats["bytes_held"] == 1
+
+
+def test_byte_budget_evicts_least_recently_written():
+    server = BlockBinaryStreamServer(max_bytes=10)
+    server.add_item("r1", _output(b"12345", delta=True))
+    server.add_item("r2", _output(b"12345", delta=True))
+    server.add_item("r1", _output(b"6", delta=True))
+    assert server.stats()["bytes_held"] == 11 - 5
+    assert list(server.cache.keys()) == ["r1"]
+
+    # a reader acknowledging chunks releases their bytes
+    offset, items, done = server.get_items_since("r1", 0)
+    server.get_items_since("r1", offset, timeout=0.01)
+    assert server.stats()["bytes_held"] == 0
+
+
+def _usage_output(text, input_tokens_count, generated_tokens_count):
+    return StreamOutputs(
+        outputs=[SingleOutput(text=text, metadata=SingleOutputMeta(input_tokens_count, generated_tokens_count))],
+        delta=True,
+    )
+
+
+def test_stream_text_yields_the_usage_of_an_empty_last_delta():
+    for delta_mode, texts in [(True, ["he", "llo", ""]), (False, ["he", "hello", "hello"])]:
+        stream_text = _StreamText(lambda s: s, delta_mode=delta_mode)
+        chunks = [
+            stream_text.feed(output)
+            for output in [
+                _output("", delta=True),
+                _output("he", delta=True),
+                _output("llo", delta=True),
+                _usage_output("", 3, 2),
+                _usage_output("", 3, 2),
+            ]
+        ]
+        assert chunks[0] is None and chunks[-1] is None
+        assert [text for text, _ in chunks[1:-1]] == texts
+        meta = chunks[-2][1]
+        assert (meta.input_tokens_count, meta.generated_tokens_count) == (3, 2)
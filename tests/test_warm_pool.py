@@ -0,0 +1,97 @@
+import sys
+import time
+
+import pytest
+import ray
+
+from byzerllm.warm_pool import build_udf_with_warm_pool, scale_up, warm_pool_name
+
+
+def init_model(model_refs, conf):
+    time.sleep(0.5)
+    return {"pid": "loaded"}
+
+
+def apply_func(model, v):
+    return {"value": [model["pid"]]}
+
+
+class FakeRayContext:
+    def __init__(self, conf):
+        self._conf = conf
+
+    def conf(self):
+        return self._conf
+
+    def build_result(self, v):
+        pass
+
+
+@pytest.fixture
+def ray_env():
+    ray.cloudpickle.register_pickle_by_value(sys.modules[__name__])
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_warm_pool")
+    yield
+    ray.shutdown()
+
+
+def wait_idle(pool, n):
+    for _ in range(200):
+        if ray.get(pool.stat.remote())["idle_workers"] == n:
+            return
+        time.sleep(0.1)
+    raise AssertionError(ray.get(pool.stat.remote()))
+
+
+def test_deploy_scale_up_and_redeploy(ray_env):
+    conf = {"UDF_CLIENT": "warm_model", "maxConcurrency": 1, "num_cpus": 0, "num_gpus": 0}
+    context = FakeRayContext(conf)
+
+    build_udf_with_warm_pool(context, init_model, apply_func, 1, "v1")
+    master = ray.get_actor("warm_model")
+    pool = ray.get_actor(warm_pool_name("warm_model"))
+    wait_idle(pool, 1)
+
+    assert scale_up("warm_model", 1) == 2
+    workers = list(ray.get(master.workers.remote()))
+    assert ray.get([w.apply.remote([]) for w in workers]) == [{"value": ["loaded"]}] * 2
+
+    # a redeploy with the same signature starts from the (refilled) pool
+    wait_idle(pool, 1)
+    build_udf_with_warm_pool(context, init_model, apply_func, 1, "v1")
+    assert ray.get(pool.stat.remote())["taken"] == 2
+    master = ray.get_actor("warm_model")
+    assert ray.get(master.stat.remote())["total_workers"] == 1
+    # the workers of the previous deployment were shut down with it
+    for worker in workers:
+        with pytest.raises(ray.exceptions.RayActorError):
+            ray.get(worker.stat.remote())
+    index, worker = ray.get(master.get.remote())
+    assert ray.get(worker.apply.remote([])) == {"value": ["loaded"]}
+
+    ray.get(pool.shutdown.remote())
+    ray.kill(pool)
+    ray.kill(master)
+
+
+def test_undeploy_shuts_down_pool_workers_from_any_client(ray_env, monkeypatch):
+    from byzerllm.utils.client import ByzerLLM, byzerllm_client
+
+    shut_down = []
+    real_shutdown_master = byzerllm_client.shutdown_master
+
+    def shutdown_master(master):
+        shut_down.append(master)
+        real_shutdown_master(master)
+
+    monkeypatch.setattr(byzerllm_client, "shutdown_master", shutdown_master)
+
+    conf = {"UDF_CLIENT": "warm_model_2", "maxConcurrency": 1, "num_cpus": 0, "num_gpus": 0}
+    build_udf_with_warm_pool(FakeRayContext(conf), init_model, apply_func, 1, "v1")
+    wait_idle(ray.get_actor(warm_pool_name("warm_model_2")), 1)
+
+    # this client never called setup_warm_pool, the deployment decides
+    ByzerLLM().undeploy("warm_model_2", force=True)
+    assert len(shut_down) == 1
+    with pytest.raises(ValueError):
+        ray.get_actor("warm_model_2")
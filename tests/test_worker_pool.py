@@ -0,0 +1,109 @@
+import json
+import sys
+import threading
+
+import pytest
+import ray
+
+from byzerllm.utils.client import ByzerLLM
+from byzerllm.utils.client.worker_pool import ModelWorkerPool
+
+
+@ray.remote
+class FakeWorker:
+    def __init__(self, index):
+        self.index = index
+        self.calls = 0
+
+    async def async_apply(self, v):
+        self.calls += 1
+        item = json.loads(v[0])
+        return {
+            "value": [
+                json.dumps(
+                    [{"predict": f"worker-{self.index}", "input": item["instruction"]}]
+                )
+            ]
+        }
+
+    def get_calls(self):
+        return self.calls
+
+
+@ray.remote
+class FakeUDFMaster:
+    def __init__(self, num):
+        self.workers = [FakeWorker.remote(i) for i in range(num)]
+        self.leases = 0
+
+    def stat(self):
+        return {"total_workers": len(self.workers), "worker_max_concurrency": "2"}
+
+    def get(self, index=-1):
+        if index == -1:
+            self.leases += 1
+            index = 0
+        return [index, self.workers[index]]
+
+    def give_back(self, index):
+        pass
+
+    def get_leases(self):
+        return self.leases
+
+
+@pytest.fixture(scope="module")
+def model():
+    # the Ray workers can not import this test module, ship the fake actors by value
+    ray.cloudpickle.register_pickle_by_value(sys.modules[__name__])
+    ray.init(ignore_reinit_error=True, include_dashboard=False, namespace="test_worker_pool")
+    master = FakeUDFMaster.options(name="fake_model").remote(3)
+    yield "fake_model"
+    del master
+    ray.shutdown()
+
+
+def test_least_loaded_lease_and_release(model):
+    pool = ModelWorkerPool(model)
+    assert len(pool) == 3
+    leased = [pool.lease()[0] for _ in range(3)]
+    assert sorted(leased) == [0, 1, 2]
+    pool.release(1)
+    # worker 1 has the most credits left now
+    assert pool.lease()[0] == 1
+    assert pool.lease(2)[0] == 2
+    assert pool.stat()["credits"] == [1, 1, 0]
+
+
+def test_round_robin_lease(model):
+    pool = ModelWorkerPool(model, load_balance="round_robin")
+    assert [pool.lease()[0] for _ in range(4)] == [0, 1, 2, 0]
+
+
+def test_lease_waits_for_a_credit(model):
+    pool = ModelWorkerPool(model, lease_timeout=0.1)
+    for _ in range(6):
+        pool.lease()
+    assert pool.try_lease() is None
+    with pytest.raises(TimeoutError):
+        pool.lease()
+    assert pool.stat()["credits"] == [0, 0, 0]
+
+    threading.Timer(0.05, pool.release, args=(1,)).start()
+    pool.lease_timeout = 5
+    assert pool.lease()[0] == 1
+    assert pool.stat()["credits"] == [0, 0, 0]
+
+
+def test_client_dispatch_skips_udf_master(model):
+    llm = ByzerLLM()
+    llm.setup_client_dispatch()
+    outputs = {
+        llm.tokenize(model, f"hello {i}")[0].output for i in range(6)
+    }
+    assert outputs == {"worker-0", "worker-1", "worker-2"}
+    master = ray.get_actor(model)
+    assert ray.get(master.get_leases.remote()) == 0
+
+    llm.setup_reset()
+    assert llm.worker_pools.pools == {}
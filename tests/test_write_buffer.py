@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+
+import pytest
+
+from byzerllm.utils.retrieval.write_buffer import DELETED, WriteBehindBuffer
+
+
+class Recorder:
+    def __init__(self):
+        self.groups = []
+        self.fail = False
+
+    def __call__(self, puts, deletes):
+        if self.fail:
+            raise RuntimeError("store is down")
+        self.groups.append((dict(puts), list(deletes)))
+
+
+def test_writes_are_grouped_by_size():
+    store = Recorder()
+    buffer = WriteBehindBuffer(store, max_items=3, max_delay=0)
+    buffer.put("a", 1)
+    buffer.put("a", 2)
+    buffer.delete("b")
+    assert store.groups == []
+    assert buffer.lookup("a") == (True, 2)
+    assert buffer.lookup("b") == (True, DELETED)
+    assert buffer.lookup("c") == (False, None)
+
+    buffer.put_many([("c", 3)])
+    assert store.groups == [({"a": 2, "c": 3}, ["b"])]
+    assert len(buffer) == 0 and buffer.lookup("a") == (False, None)
+    assert buffer.flush() == 0
+    assert buffer.stats == {"writes": 4, "flushes": 1, "flushed_keys": 3, "failed_flushes": 0}
+
+
+def test_writes_are_flushed_after_the_delay():
+    flushed = threading.Event()
+    store = Recorder()
+
+    def write(puts, deletes):
+        store(puts, deletes)
+        flushed.set()
+
+    buffer = WriteBehindBuffer(write, max_items=100, max_delay=0.05)
+    buffer.put("a", 1)
+    buffer.put("b", 2)
+    assert flushed.wait(5)
+    assert store.groups == [({"a": 1, "b": 2}, [])]
+
+
+def test_failed_groups_are_kept_and_newer_writes_win():
+    store = Recorder()
+    buffer = WriteBehindBuffer(store, max_items=100, max_delay=0)
+    buffer.put("a", 1)
+    buffer.put("b", 1)
+    store.fail = True
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert buffer.lookup("a") == (True, 1)
+
+    buffer.put("b", 2)
+    store.fail = False
+    assert buffer.flush() == 2
+    assert store.groups == [({"a": 1, "b": 2}, [])]
+
+
+def test_failed_groups_are_retried_by_a_timer():
+    flushed = threading.Event()
+    store = Recorder()
+    store.fail = True
+
+    def write(puts, deletes):
+        store(puts, deletes)
+        flushed.set()
+
+    buffer = WriteBehindBuffer(write, max_items=100, max_delay=0.05)
+    buffer.put("a", 1)
+    # the timed flush fails, the retry succeeds without any other write
+    time.sleep(0.08)
+    assert buffer.stats["failed_flushes"] >= 1
+    store.fail = False
+    assert flushed.wait(5)
+    assert store.groups == [({"a": 1}, [])]
+    assert len(buffer) == 0
+
+
+def test_reads_see_the_group_being_written():
+    seen = []
+    buffer = None
+
+    def write(puts, deletes):
+        seen.append(buffer.lookup("a"))
+        seen.append(dict(buffer.items()))
+
+    buffer = WriteBehindBuffer(write, max_items=100, max_delay=0)
+    buffer.put("a", 1)
+    buffer.flush()
+    assert seen == [(True, 1), {"a": 1}]
+
+
+class FakeSimpleRetrieval:
+    def __init__(self):
+        self.docs = {}
+        self.commits = 0
+
+    def save_doc(self, data, owner=None):
+        for item in data:
+            self.docs[(item["collection"], item["doc_id"])] = item
+
+    def delete_docs(self, doc_ids, collection):
+        for doc_id in doc_ids:
+            self.docs.pop((collection, doc_id), None)
+
+    def commit_doc(self):
+        self.commits += 1
+
+    def get_doc(self, doc_id, collection):
+        return self.docs.get((collection, doc_id))
+
+    def get_docs_by_collection(self, collection):
+        return [doc for (c, _), doc in self.docs.items() if c == collection]
+
+
+def make_kv_store(flush_size):
+    byzerai_kvstore = pytest.importorskip("byzerllm.apps.llama_index.byzerai_kvstore")
+    store = byzerai_kvstore.ByzerAIKVStore.__new__(byzerai_kvstore.ByzerAIKVStore)
+    store._retrieval = FakeSimpleRetrieval()
+    store._buffer = WriteBehindBuffer(store._write, max_items=flush_size, max_delay=0)
+    return store
+
+
+def test_kv_store_commits_once_per_group():
+    store = make_kv_store(flush_size=10)
+    for i in range(10):
+        store.put(f"k{i}", {"i": i})
+    assert store._retrieval.commits == 1
+
+    store.put("k0", {"i": 100})
+    store.delete("k1")
+    assert store.get("k0") == {"i": 100}
+    assert store.get("k1") is None
+    assert store.get("k2") == {"i": 2}
+    all_values = store.get_all()
+    assert len(all_values) == 9 and all_values["k0"] == {"i": 100}
+
+    store.flush()
+    assert store._retrieval.commits == 2
+    assert store.get_all() == all_values
+    assert json.loads(store._retrieval.docs[("data", "k0")]["json_data"]) == {"i": 100}